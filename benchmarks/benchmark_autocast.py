@@ -0,0 +1,86 @@
+"""Compares float32 with bfloat16 CPU autocast (as enabled by ``Config.autocast_dtype``) for the RTGN models,
+reporting the throughput of inference as performed when sampling, of training forward and backward passes,
+and the deviation of the log probabilities and values computed under autocast from the float32 ones.
+
+bfloat16 is only faster on CPUs with native support (AVX-512 BF16 or AMX), elsewhere it is emulated and slower.
+
+Usage::
+
+    $ python benchmarks/benchmark_autocast.py
+"""
+import time
+
+import numpy as np
+import torch
+
+from conformer_rl.environments.environments import GibbsScorePruningEnv
+from conformer_rl.models import RTGN, RTGNRecurrent, RTGNGat, RTGNGatRecurrent, PackedObservations
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+from conformer_rl.molecule_generation.generate_molecule_config import config_from_rdkit
+
+BATCH_SIZE = 64
+NUM_REPEATS = 3
+
+
+def observations() -> PackedObservations:
+    env = GibbsScorePruningEnv(config_from_rdkit(generate_branched_alkane(14), num_conformers=4))
+    obs = [env.reset()]
+    for _ in range(BATCH_SIZE - 1):
+        obs.append(env.step(np.random.randint(6, size=len(env.nonring)))[0])
+        if len(obs) % 4 == 0:
+            env.reset()
+    return PackedObservations(obs)
+
+
+def predict(network: torch.nn.Module, obs: PackedObservations, action: torch.Tensor = None) -> dict:
+    if isinstance(network, (RTGNRecurrent, RTGNGatRecurrent)):
+        return network(obs, None, action)[0]
+    return network(obs, action)
+
+
+def throughput(fn) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(NUM_REPEATS):
+        fn()
+    return NUM_REPEATS * BATCH_SIZE / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    torch.set_num_threads(1)
+    torch.manual_seed(0)
+    obs = observations()
+    networks = {
+        'RTGN': RTGN(6, 128, edge_dim=6, node_dim=5),
+        'RTGNRecurrent': RTGNRecurrent(6, 128, edge_dim=6, node_dim=5),
+        'RTGNGat': RTGNGat(6, 128, node_dim=5),
+        'RTGNGatRecurrent': RTGNGatRecurrent(6, 128, node_dim=5),
+    }
+    print(f'batch of {BATCH_SIZE} observations, throughput in observations/s')
+    for name, network in networks.items():
+        with torch.no_grad():
+            reference = predict(network, obs)
+        results = {}
+        for dtype in [torch.float32, torch.bfloat16]:
+            def autocast():
+                return torch.autocast('cpu', dtype=dtype, enabled=dtype != torch.float32)
+
+            def infer():
+                with torch.no_grad(), autocast():
+                    return predict(network, obs, reference['a'])
+
+            def train():
+                with autocast():
+                    prediction = predict(network, obs, reference['a'])
+                loss = -prediction['log_pi_a'].mean() + prediction['v'].pow(2).mean()
+                network.zero_grad()
+                loss.backward()
+
+            prediction = infer()
+            log_pi_error = (prediction['log_pi_a'] - reference['log_pi_a']).abs().max().item()
+            v_error = (prediction['v'] - reference['v']).abs().max().item()
+            results[dtype] = (throughput(infer), throughput(train), log_pi_error, v_error)
+
+        for dtype, (infer_rate, train_rate, log_pi_error, v_error) in results.items():
+            print(f'{name:>16} {str(dtype):>14} | inference {infer_rate:8.1f} | training {train_rate:8.1f} '
+                f'| max error log_pi_a {log_pi_error:.2e}, v {v_error:.2e}')
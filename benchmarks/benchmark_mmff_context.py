@@ -0,0 +1,58 @@
+"""Measures the per-step cost of conformer energy evaluation with and without a cached
+:class:`~conformer_rl.utils.chem_utils.MMFFContext` for alkane, lignin and xor gate molecules.
+
+Usage::
+
+    $ python benchmarks/benchmark_mmff_context.py
+"""
+import time
+
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+from conformer_rl.utils import get_conformer_energy, MMFFContext
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+
+NUM_STEPS = 200
+
+
+def _molecules():
+    mols = {'alkane': generate_branched_alkane(14)}
+
+    # lignin and xor gate generation require the optional 'generate_molecules' dependencies
+    try:
+        from conformer_rl.molecule_generation.generate_lignin import generate_lignin
+        mols['lignin'] = generate_lignin(3)
+    except ImportError as e:
+        print(f'skipping lignin: {e}')
+    try:
+        from conformer_rl.molecule_generation.generate_xor_gate import generate_xor_gate
+        mols['xorgate'] = generate_xor_gate(gate_complexity=2, num_gates=3)
+    except ImportError as e:
+        print(f'skipping xorgate: {e}')
+    return mols
+
+
+def benchmark(mol: Chem.Mol) -> None:
+    mol = Chem.AddHs(mol)
+    AllChem.EmbedMolecule(mol, randomSeed=0, useRandomCoords=True)
+    AllChem.MMFFOptimizeMolecule(mol, maxIters=500, nonBondedThresh=10.)
+
+    start = time.perf_counter()
+    for _ in range(NUM_STEPS):
+        get_conformer_energy(mol)
+    uncached = (time.perf_counter() - start) / NUM_STEPS
+
+    context = MMFFContext(mol)
+    start = time.perf_counter()
+    for _ in range(NUM_STEPS):
+        get_conformer_energy(mol, mmff_context=context)
+    cached = (time.perf_counter() - start) / NUM_STEPS
+
+    print(f'{mol.GetNumAtoms():>6} atoms | uncached {uncached * 1e6:10.1f} us/step | cached {cached * 1e6:10.1f} us/step | speedup {uncached / cached:6.1f}x')
+
+
+if __name__ == '__main__':
+    for name, mol in _molecules().items():
+        print(f'{name:>8}: ', end='')
+        benchmark(mol)
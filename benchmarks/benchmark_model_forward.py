@@ -0,0 +1,77 @@
+"""Measures the forward latency of the RTGN models for batches of 8 to 512 branched alkane observations,
+and the part of it spent preparing the inputs, comparing the previous per-graph loop computing the torsion
+offsets with :func:`~conformer_rl.models.packed_observations.graph_inputs`.
+
+Usage::
+
+    $ python benchmarks/benchmark_model_forward.py
+"""
+import time
+
+import numpy as np
+import torch
+from torch_geometric.data import Batch
+
+from conformer_rl.environments.environments import GibbsScorePruningEnv
+from conformer_rl.models import RTGN, RTGNRecurrent, RTGNGat, RTGNGatRecurrent, graph_inputs
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+from conformer_rl.molecule_generation.generate_molecule_config import config_from_rdkit
+
+BATCH_SIZES = [8, 32, 128, 512]
+NUM_REPEATS = 3
+device = torch.device('cpu')
+
+
+def loop_inputs(obs: list, device: torch.device) -> tuple:
+    # the input preparation previously performed by each model
+    data_list = []
+    nr_list = []
+    for b, nr in obs:
+        data_list += b.to_data_list() if isinstance(b, Batch) else [b]
+        nr_list.append(torch.LongTensor(nr))
+
+    data = Batch.from_data_list(data_list).to(device)
+    so_far = 0
+    torsion_batch_idx = []
+    torsion_list_sizes = []
+    for i in range(data.num_graphs):
+        nr_list[i] += so_far
+        so_far += int((data.batch == i).sum())
+        torsion_batch_idx.extend([i] * int(nr_list[i].shape[0]))
+        torsion_list_sizes += [nr_list[i].shape[0]]
+    return data, torch.cat(nr_list).to(device), torch.LongTensor(torsion_batch_idx).to(device), torsion_list_sizes
+
+
+def observations(num_obs: int) -> list:
+    obs = []
+    for num_atoms in [8, 14, 20]:
+        env = GibbsScorePruningEnv(config_from_rdkit(generate_branched_alkane(num_atoms), num_conformers=4))
+        obs.append(env.reset())
+    return [obs[i % len(obs)] for i in range(num_obs)]
+
+
+def timed(fn) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(NUM_REPEATS):
+        fn()
+    return (time.perf_counter() - start) / NUM_REPEATS
+
+
+if __name__ == '__main__':
+    torch.set_num_threads(1)
+    networks = {
+        'RTGN': RTGN(6, 128, edge_dim=6, node_dim=5),
+        'RTGNRecurrent': RTGNRecurrent(6, 128, edge_dim=6, node_dim=5),
+        'RTGNGat': RTGNGat(6, 128, node_dim=5),
+        'RTGNGatRecurrent': RTGNGatRecurrent(6, 128, node_dim=5),
+    }
+    for batch_size in BATCH_SIZES:
+        obs = observations(batch_size)
+        loop = timed(lambda: loop_inputs(obs, device))
+        vectorized = timed(lambda: graph_inputs(obs, device))
+        print(f'batch {batch_size:>3} | inputs: loop {loop * 1e3:7.2f} ms, vectorized {vectorized * 1e3:7.2f} ms ({loop / vectorized:5.1f}x)')
+        with torch.no_grad():
+            for name, network in networks.items():
+                forward = timed(lambda: network(obs))
+                print(f'          | {name:>16} forward: {forward * 1e3:8.2f} ms')
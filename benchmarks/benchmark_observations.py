@@ -0,0 +1,76 @@
+"""Compares the cost of building graph observations with PyTorch Geometric's ``Center`` and ``NormalizeRotation``
+transforms and a single-graph ``Batch`` per observation, against
+:func:`~conformer_rl.environments.environment_components.obs_mixins.normalize_positions` and plain ``Data`` observations,
+for branched alkanes with 10 to 200 heavy atoms.
+
+For each path, the time for building one observation and for collating a batch of observations
+in the way the models do it is reported.
+
+Usage::
+
+    $ python benchmarks/benchmark_observations.py
+"""
+import time
+
+import numpy as np
+import torch
+from rdkit import Chem
+from rdkit.Chem import AllChem
+from torch_geometric.data import Data, Batch
+from torch_geometric.transforms import Center, NormalizeRotation
+
+from conformer_rl.environments.environment_components.molecule_features import GraphTopology
+from conformer_rl.environments.environment_components.obs_mixins import normalize_positions
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+
+NUM_STEPS = 200
+BATCH_SIZE = 16
+
+
+def transforms_obs(topology: GraphTopology, conf: Chem.Conformer) -> Batch:
+    pos = torch.from_numpy(topology.heavy_atom_positions(conf))
+    data = Data(x=torch.cat([topology.atom_types, pos], dim=1), edge_index=topology.edge_index, edge_attr=topology.edge_attr, pos=pos)
+    data = Center()(data)
+    data = NormalizeRotation()(data)
+    data.x[:, -3:] = data.pos
+    return Batch.from_data_list([data])
+
+
+def numpy_obs(topology: GraphTopology, conf: Chem.Conformer) -> Data:
+    pos = normalize_positions(topology.heavy_atom_positions(conf))
+    return Data(x=torch.cat([topology.atom_types, pos], dim=1), edge_index=topology.edge_index, edge_attr=topology.edge_attr, pos=pos)
+
+
+def collate(obs: list) -> Batch:
+    data_list = []
+    for b in obs:
+        data_list += b.to_data_list() if isinstance(b, Batch) else [b]
+    return Batch.from_data_list(data_list)
+
+
+def benchmark(num_atoms: int) -> None:
+    mol = Chem.AddHs(generate_branched_alkane(num_atoms))
+    AllChem.EmbedMolecule(mol, randomSeed=0, useRandomCoords=True, maxAttempts=10)
+    conf = mol.GetConformer()
+    topology = GraphTopology(mol)
+
+    results = []
+    for obs_fn in [transforms_obs, numpy_obs]:
+        start = time.perf_counter()
+        obs = [obs_fn(topology, conf) for _ in range(NUM_STEPS)]
+        build = (time.perf_counter() - start) / NUM_STEPS
+
+        start = time.perf_counter()
+        for i in range(0, NUM_STEPS, BATCH_SIZE):
+            collate(obs[i:i + BATCH_SIZE])
+        collation = (time.perf_counter() - start) / (NUM_STEPS / BATCH_SIZE)
+        results.append((build, collation))
+
+    (old_build, old_collate), (new_build, new_collate) = results
+    print(f'{len(topology.heavy_atoms):>4} heavy atoms | build: transforms {old_build * 1e6:7.1f} us, numpy {new_build * 1e6:7.1f} us ({old_build / new_build:4.1f}x) '
+        f'| collate {BATCH_SIZE}: transforms {old_collate * 1e3:6.2f} ms, numpy {new_collate * 1e3:6.2f} ms ({old_collate / new_collate:4.1f}x)')
+
+
+if __name__ == '__main__':
+    for num_atoms in [10, 25, 50, 100, 200]:
+        benchmark(num_atoms)
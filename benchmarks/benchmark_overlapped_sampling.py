@@ -0,0 +1,98 @@
+"""Compares the wall-clock throughput of :class:`~conformer_rl.agents.PPO.PPO_agent.PPOAgent` with sequential and
+overlapped (``Config.overlapped_sampling``) sampling and training.
+
+The agent steps environments in a :class:`~conformer_rl.environments.thread_vec_env.ThreadVecEnv` whose steps sleep,
+emulating relaxations that release the GIL, and trains a small policy for a number of epochs chosen so that sampling and
+training take comparable time. Sequential iterations take the sum of the sampling and training times, whereas overlapped
+iterations should take close to the maximum of the two.
+
+Usage::
+
+    $ python benchmarks/benchmark_overlapped_sampling.py
+"""
+import tempfile
+import time
+
+import torch
+
+from conformer_rl.agents import PPOAgent
+from conformer_rl.config import Config
+from conformer_rl.environments.thread_vec_env import ThreadVecEnv
+from conformer_rl.utils import timed
+
+NUM_ENVS = 4
+ROLLOUT_LENGTH = 16
+STEP_DURATION = 0.005
+NUM_ITERATIONS = 10
+OBS_DIM = 64
+ACTION_DIM = 6
+NUM_TORSIONS = 4
+
+
+class SleepEnv:
+    def step(self, action):
+        time.sleep(STEP_DURATION)
+        return torch.randn(OBS_DIM), 0., False, {}
+
+    def reset(self):
+        return torch.randn(OBS_DIM)
+
+    def close(self):
+        pass
+
+
+class Policy(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.actor = torch.nn.Sequential(torch.nn.Linear(OBS_DIM, 512), torch.nn.ReLU(), torch.nn.Linear(512, NUM_TORSIONS * ACTION_DIM))
+        self.critic = torch.nn.Sequential(torch.nn.Linear(OBS_DIM, 512), torch.nn.ReLU(), torch.nn.Linear(512, 1))
+
+    def forward(self, obs, action=None):
+        obs = torch.stack(list(obs))
+        dist = torch.distributions.Categorical(logits=self.actor(obs).view(len(obs), NUM_TORSIONS, ACTION_DIM))
+        if action is None:
+            action = dist.sample()
+        return {'a': action, 'log_pi_a': dist.log_prob(action), 'ent': dist.entropy(), 'v': self.critic(obs)}
+
+
+def timed_method(agent: PPOAgent, name: str, timings: dict) -> None:
+    method = getattr(agent, name)
+    def wrapper(*args):
+        with timed(timings, name):
+            return method(*args)
+    setattr(agent, name, wrapper)
+
+
+def steps_per_second(overlapped: bool, timings: dict) -> float:
+    torch.manual_seed(0)
+    config = Config()
+    config.tag = 'benchmark'
+    config.data_dir = tempfile.mkdtemp()
+    config.use_tensorboard = False
+    config.network = Policy()
+    config.optimizer_fn = lambda params: torch.optim.Adam(params, lr=1e-4)
+    config.train_env = ThreadVecEnv([SleepEnv for _ in range(NUM_ENVS)], num_threads=NUM_ENVS)
+    config.rollout_length = ROLLOUT_LENGTH
+    config.optimization_epochs = 8
+    config.mini_batch_size = 16
+    config.overlapped_sampling = overlapped
+
+    agent = PPOAgent(config)
+    agent.step()
+    if not overlapped:
+        timed_method(agent, '_sample_rollout', timings)
+        timed_method(agent, '_train', timings)
+    start = time.perf_counter()
+    for _ in range(NUM_ITERATIONS):
+        agent.step()
+    elapsed = time.perf_counter() - start
+    config.train_env.close()
+    return NUM_ITERATIONS * ROLLOUT_LENGTH * NUM_ENVS / elapsed
+
+
+if __name__ == '__main__':
+    timings = {}
+    for name, overlapped in [('sequential', False), ('overlapped', True)]:
+        print(f'{name:>10}: {steps_per_second(overlapped, timings):8.1f} steps/s')
+    bound = NUM_ITERATIONS * ROLLOUT_LENGTH * NUM_ENVS / max(timings.values())
+    print(f'sampling {timings["_sample_rollout"]:.2f} s, training {timings["_train"]:.2f} s, overlapped bound {bound:.1f} steps/s')
@@ -0,0 +1,62 @@
+"""Compares step throughput and reward fidelity of the MMFF relaxation settings in
+:class:`~conformer_rl.config.mol_config.MolConfig`.
+
+For each setting, random discrete actions are applied to a branched alkane and the time per step,
+the fraction of converged relaxations and the mean absolute deviation of the published energy
+from the exact energy are reported.
+
+Usage::
+
+    $ python benchmarks/benchmark_relaxation.py
+"""
+import time
+
+import numpy as np
+
+from conformer_rl.environments.environments import DiscreteActionEnv
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+from conformer_rl.config import MolConfig
+from conformer_rl.utils import get_conformer_energy
+
+NUM_STEPS = 100
+
+SETTINGS = {
+    'fast (default)': {},
+    'fast, 100 iters': {'relax_max_iters': 100},
+    'fast, 50 iters, loose tol': {'relax_max_iters': 50, 'relax_force_tol': 1e-2, 'relax_energy_tol': 1e-4},
+    'fast, restrained': {'relax_restrain_torsions': True},
+    'fast, cutoff energy': {'relax_cutoff_energy': True},
+    'exact': {'relax_mode': 'exact'},
+}
+
+
+def benchmark(mol, settings: dict) -> None:
+    mol_config = MolConfig()
+    mol_config.mol = mol
+    mol_config.num_conformers = NUM_STEPS
+    mol_config.seed = 0
+    for key, val in settings.items():
+        setattr(mol_config, key, val)
+    env = DiscreteActionEnv(mol_config)
+    rng = np.random.default_rng(0)
+
+    elapsed, converged, error = 0., [], []
+    for _ in range(NUM_STEPS):
+        action = rng.integers(6, size=len(env.nonring))
+        start = time.perf_counter()
+        env.step(action)
+        elapsed += time.perf_counter() - start
+
+        converged.append(env.step_info['converged'])
+        error.append(abs(env.step_info['energy'] - get_conformer_energy(env.mol)))
+
+    print(f'{elapsed / NUM_STEPS * 1e3:8.2f} ms/step | {np.mean(converged):5.2f} converged | {np.mean(error):8.4f} kcal/mol energy error')
+
+
+if __name__ == '__main__':
+    for num_atoms in [14, 40]:
+        print(f'branched alkane with {num_atoms} carbons')
+        mol = generate_branched_alkane(num_atoms)
+        for name, settings in SETTINGS.items():
+            print(f'  {name:>26}: ', end='')
+            benchmark(mol, settings)
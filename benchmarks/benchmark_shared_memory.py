@@ -0,0 +1,60 @@
+"""Compares the size of the messages sent from the workers of
+:class:`~conformer_rl.environments.shared_memory_vec_env.SharedMemoryVecEnv` with the size of the pickled
+observations sent by ``SubprocVecEnv``, together with the time per vector step.
+
+Usage::
+
+    $ python benchmarks/benchmark_shared_memory.py
+"""
+import multiprocessing as mp
+import pickle
+import time
+
+import numpy as np
+
+from conformer_rl.environments.environments import GibbsScorePruningEnv
+from conformer_rl.environments.shared_memory_vec_env import SharedMemoryVecEnv, _ObservationEncoder
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+from conformer_rl.config import MolConfig
+
+NUM_ENVS = 4
+NUM_STEPS = 50
+
+
+def env_fn(num_atoms: int, seed: int):
+    def _thunk():
+        mol_config = MolConfig()
+        mol_config.mol = generate_branched_alkane(num_atoms)
+        mol_config.num_conformers = 200
+        mol_config.seed = seed
+        return GibbsScorePruningEnv(mol_config)
+    return _thunk
+
+
+def message_sizes(num_atoms: int) -> None:
+    env = env_fn(num_atoms, 0)()
+    encoder = _ObservationEncoder(mp.RawArray('f', 1 << 16))
+    obs = env.reset()
+    encoder.encode(obs)
+    obs, rew, done, info = env.step(np.zeros(len(env.nonring), dtype=int))
+    pickled = len(pickle.dumps((obs, rew, done, info)))
+    shared = len(pickle.dumps((encoder.encode(obs), rew, done, info)))
+    print(f'  {pickled:8d} bytes pickled | {shared:8d} bytes with shared memory')
+
+
+def step_time(num_atoms: int) -> None:
+    vec_env = SharedMemoryVecEnv([env_fn(num_atoms, seed) for seed in range(NUM_ENVS)])
+    obs = vec_env.reset()
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for _ in range(NUM_STEPS):
+        obs, _, _, _ = vec_env.step([rng.integers(6, size=len(o[1])) for o in obs])
+    print(f'  {(time.perf_counter() - start) / NUM_STEPS * 1e3:8.2f} ms per step of {NUM_ENVS} environments')
+    vec_env.close()
+
+
+if __name__ == '__main__':
+    for num_atoms in [14, 40]:
+        print(f'branched alkane with {num_atoms} carbons')
+        message_sizes(num_atoms)
+        step_time(num_atoms)
@@ -0,0 +1,66 @@
+"""Compares synchronous and straggler-tolerant collection of environment steps when the
+step costs of the environments are skewed.
+
+A :class:`~conformer_rl.environments.thread_vec_env.ThreadVecEnv` steps environments whose
+steps sleep for a duration drawn from a long-tailed distribution, emulating molecules whose
+relaxations occasionally take much longer. Synchronous collection waits for the slowest
+environment at every step, whereas straggler-tolerant collection (as used by
+``Config.straggler_tolerant_sampling``) immediately restarts each environment whose step has
+finished with :meth:`step_wait_any`. Since sleeping releases the GIL, the comparison reflects
+the scheduling of the steps independently of the number of CPUs.
+
+Usage::
+
+    $ python benchmarks/benchmark_straggler_sampling.py
+"""
+import time
+
+import numpy as np
+
+from conformer_rl.environments.thread_vec_env import ThreadVecEnv
+
+NUM_ENVS = [4, 8, 16]
+NUM_STEPS = 20
+
+
+class SkewedSleepEnv:
+    def __init__(self, seed: int):
+        self.rng = np.random.default_rng(seed)
+
+    def step(self, action):
+        time.sleep(0.002 * self.rng.pareto(1.5))
+        return 0., 0., False, {}
+
+    def reset(self):
+        return 0.
+
+    def close(self):
+        pass
+
+
+def synchronous(vec_env: ThreadVecEnv) -> None:
+    for _ in range(NUM_STEPS):
+        vec_env.step([0] * vec_env.num_envs)
+
+
+def straggler_tolerant(vec_env: ThreadVecEnv) -> None:
+    remaining = NUM_STEPS * vec_env.num_envs
+    vec_env.step_async([0] * vec_env.num_envs)
+    remaining -= vec_env.num_envs
+    while vec_env.pending:
+        indices = vec_env.step_wait_any()[0]
+        restart = indices[:max(remaining, 0)]
+        vec_env.step_async([0] * len(restart), restart)
+        remaining -= len(restart)
+
+
+if __name__ == '__main__':
+    for num_envs in NUM_ENVS:
+        print(f'{num_envs} environments')
+        for name, collect in [('synchronous', synchronous), ('straggler-tolerant', straggler_tolerant)]:
+            vec_env = ThreadVecEnv([lambda i=i: SkewedSleepEnv(i) for i in range(num_envs)], num_threads=num_envs)
+            start = time.perf_counter()
+            collect(vec_env)
+            elapsed = time.perf_counter() - start
+            vec_env.close()
+            print(f'  {name:>18}: {NUM_STEPS * num_envs / elapsed:8.1f} steps/s')
@@ -0,0 +1,45 @@
+"""Compares the time for setting all rotatable torsions of a conformer with a loop over
+``rdMolTransforms.SetDihedralDeg`` and with :class:`~conformer_rl.utils.chem_utils.TorsionDriver`
+for branched alkanes with increasing numbers of torsions.
+
+Usage::
+
+    $ python benchmarks/benchmark_torsion_driver.py
+"""
+import time
+
+import numpy as np
+from rdkit import Chem
+from rdkit.Chem import AllChem, TorsionFingerprints, rdMolTransforms
+
+from conformer_rl.utils import TorsionDriver
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+
+NUM_STEPS = 200
+
+
+def benchmark(mol: Chem.Mol) -> None:
+    mol = Chem.AddHs(mol)
+    AllChem.EmbedMolecule(mol, randomSeed=0, useRandomCoords=True)
+    conf = mol.GetConformer()
+    nonring = [list(atoms[0]) for atoms, ang in TorsionFingerprints.CalculateTorsionLists(mol)[0]]
+    actions = np.random.default_rng(0).uniform(-180., 180., (NUM_STEPS, len(nonring)))
+
+    start = time.perf_counter()
+    for action in actions:
+        for tors, angle in zip(nonring, action):
+            rdMolTransforms.SetDihedralDeg(conf, *tors, float(angle))
+    loop = (time.perf_counter() - start) / NUM_STEPS
+
+    driver = TorsionDriver(mol, nonring)
+    start = time.perf_counter()
+    for action in actions:
+        driver.set_torsions(conf, action)
+    vectorized = (time.perf_counter() - start) / NUM_STEPS
+
+    print(f'{len(nonring):>4} torsions | {mol.GetNumAtoms():>5} atoms | SetDihedralDeg {loop * 1e6:9.1f} us/step | TorsionDriver {vectorized * 1e6:9.1f} us/step | speedup {loop / vectorized:5.2f}x')
+
+
+if __name__ == '__main__':
+    for num_atoms in [8, 16, 32, 64, 128]:
+        benchmark(generate_branched_alkane(num_atoms))
@@ -0,0 +1,54 @@
+"""Compares the step throughput of the vector environment backends of
+:func:`~conformer_rl.environments.environment_wrapper.Task` for 8, 16 and 32 environments.
+
+For each backend and number of environments, random discrete actions are applied to
+branched alkanes and the number of environment steps per second is reported, together
+with the time needed for constructing the vector environment.
+
+Usage::
+
+    $ python benchmarks/benchmark_vec_envs.py
+"""
+import os
+import time
+
+import numpy as np
+
+from conformer_rl.environments import Task
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+from conformer_rl.molecule_generation.generate_molecule_config import config_from_rdkit
+
+NUM_STEPS = 20
+NUM_ENVS = [8, 16, 32]
+BACKENDS = ['subproc', 'shared_memory', 'threads', 'simple']
+
+
+def benchmark(mol_config, backend: str, num_envs: int) -> None:
+    start = time.perf_counter()
+    try:
+        env = Task('GibbsScorePruningEnv-v0', backend=backend, num_envs=num_envs, mol_config=mol_config, disable_env_checker=True)
+        obs = env.reset()
+    except Exception as e:
+        print(f'unavailable ({type(e).__name__}: {e})'.splitlines()[0])
+        return
+    startup = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    num_torsions = len(obs[0][1])
+    start = time.perf_counter()
+    for _ in range(NUM_STEPS):
+        env.step(rng.integers(6, size=(num_envs, num_torsions)))
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    print(f'{NUM_STEPS * num_envs / elapsed:8.1f} steps/s | {startup:6.2f} s startup')
+
+
+if __name__ == '__main__':
+    print(f'{os.cpu_count()} CPUs')
+    mol_config = config_from_rdkit(generate_branched_alkane(14), num_conformers=200, calc_normalizers=False)
+    for num_envs in NUM_ENVS:
+        print(f'{num_envs} environments')
+        for backend in BACKENDS:
+            print(f'  {backend:>13}: ', end='', flush=True)
+            benchmark(mol_config, backend, num_envs)
@@ -0,0 +1,62 @@
+"""Trains an agent on samples collected by actor processes, which can run on other hosts.
+
+Start the learner, which prints a random authentication key and waits for the given number of actors::
+
+    $ python examples/actor_learner_example.py learner --host <learner host> --port 6000 --num-actors 4
+
+and then start each actor with the printed key, on the same host or on other hosts::
+
+    $ python examples/actor_learner_example.py actor --host <learner host> --port 6000 --authkey <key>
+
+The learner and the actors exchange pickled messages, which can run arbitrary code when received, so the learner host should be the
+address of an interface only reachable from trusted hosts, such as that of a private network, and the key must be kept secret.
+"""
+import argparse
+
+import numpy as np
+import torch
+
+from conformer_rl import utils
+from conformer_rl.agents import ActorLearnerPPOAgent, ActorPool, run_actor
+from conformer_rl.config import Config
+from conformer_rl.environments import Task
+from conformer_rl.models import RTGNGat
+
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+from conformer_rl.molecule_generation.generate_molecule_config import config_from_rdkit
+
+import logging
+logging.basicConfig(level=logging.INFO)
+
+def make_network():
+    return RTGNGat(6, 128, node_dim=5)
+
+def make_task():
+    mol_config = config_from_rdkit(generate_branched_alkane(14), num_conformers=200, calc_normalizers=True, save_file='alkane')
+    return Task('GibbsScorePruningEnv-v0', backend='threads', num_envs=5, seed=np.random.randint(0, 1e5), mol_config=mol_config)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('role', choices=['learner', 'actor'])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6000)
+    parser.add_argument('--num-actors', type=int, default=2)
+    parser.add_argument('--authkey', help='authentication key printed by the learner, in hexadecimal')
+    args = parser.parse_args()
+    if args.role == 'actor' and args.authkey is None:
+        parser.error('actors require the --authkey printed by the learner')
+    utils.set_one_thread()
+
+    if args.role == 'actor':
+        run_actor((args.host, args.port), make_task, make_network, authkey=bytes.fromhex(args.authkey))
+    else:
+        config = Config()
+        config.tag = 'actor_learner_example'
+        config.network = make_network()
+        config.train_env = ActorPool((args.host, args.port), num_actors=args.num_actors)
+        print(f'authentication key: {config.train_env.authkey.hex()}')
+        config.rollout_length = 20
+        config.importance_weight_clip = 1.0
+
+        agent = ActorLearnerPPOAgent(config)
+        agent.run_steps()
@@ -4,7 +4,6 @@ import gym
 
 import conformer_rl
 from conformer_rl.environments import ConformerEnv
-from conformer_rl.utils import get_conformer_energy
 
 class CustomEnv1(ConformerEnv):
     def __init__(self, mol_config: conformer_rl.config.MolConfig, max_steps: int):
@@ -23,7 +22,7 @@ class CustomEnv1(ConformerEnv):
         return super().reset()
 
     def _reward(self):
-        energy = get_conformer_energy(self.mol)
+        energy = self._get_energy()
         self.step_info['energy'] = energy # log energy
 
         reward = 1. if energy < self.energy_thresh else 0.
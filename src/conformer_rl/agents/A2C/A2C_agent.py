@@ -69,8 +69,8 @@ class A2CAgent(BaseACAgent):
         log_prob = storage.order('log_pi_a')
         value = storage.order('v')
         entropy = storage.order('ent')
-        returns = torch.stack(self.returns, 1).view(self.num_workers * config.rollout_length, -1)
-        advantages = torch.stack(self.advantages, 1).view(self.num_workers * config.rollout_length, -1)
+        returns = self.returns.transpose(0, 1).reshape(self.num_workers * config.rollout_length, -1)
+        advantages = self.advantages.transpose(0, 1).reshape(self.num_workers * config.rollout_length, -1)
 
         entropy_loss = entropy.mean()
         policy_loss = -(log_prob * advantages).mean()
@@ -75,8 +75,8 @@ class A2CRecurrentAgent(BaseACAgentRecurrent):
         storage = self.storage
 
         actions = storage.order('a')
-        returns = torch.stack(self.returns, 1).view(self.num_workers * config.rollout_length, -1)
-        advantages = torch.stack(self.advantages, 1).view(self.num_workers * config.rollout_length, -1)
+        returns = self.returns.transpose(0, 1).reshape(self.num_workers * config.rollout_length, -1)
+        advantages = self.advantages.transpose(0, 1).reshape(self.num_workers * config.rollout_length, -1)
 
         recurrent_states = [storage.order(f'recurrent_states_{i}') for i in range(self.num_recurrent_units)]
         states = storage.order('states')
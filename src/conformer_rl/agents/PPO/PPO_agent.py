@@ -6,11 +6,14 @@ import numpy as np
 import torch
 import torch.nn as nn
 
+import copy
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from conformer_rl.agents.base_ac_agent import BaseACAgent
 from conformer_rl.utils import to_np
 from conformer_rl.agents.storage import Storage
+from conformer_rl.models.inference import InferenceMixin
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
 class PPOAgent(BaseACAgent):
@@ -46,6 +49,7 @@ class PPOAgent(BaseACAgent):
     * value_loss_coefficient
     * gradient_clip
     * ppo_ratio_clip
+    * overlapped_sampling
     * data_dir
     * use_tensorboard
 
@@ -59,6 +63,9 @@ class PPOAgent(BaseACAgent):
     * episodic_return_eval (total rewards per episode for eval episodes)
     * episodic_return_train (total rewards per episode for training episodes)
 
+    If ``overlapped_sampling`` is set in the config, the samples of the next iteration are collected while training on the
+    samples of the current iteration (see :meth:`_overlapped_step`).
+
     References
     ----------
     .. [1] `PPO Paper <https://arxiv.org/abs/1707.06347>`_
@@ -68,24 +75,104 @@ class PPOAgent(BaseACAgent):
         """Performs one iteration of acquiring samples on the environment
         and then trains on the acquired samples.
         """
+        if self.config.overlapped_sampling:
+            self._overlapped_step()
+            return
+        self._sample_rollout()
+        self._calculate_advantages()
+        self._train()
+
+    def _sample_rollout(self) -> None:
+        """Empties the storage and collects the samples of one iteration without recording gradients.
+        """
         self.storage.reset()
-        with torch.no_grad():
+        with torch.no_grad(), self._autocast():
             self._sample()
+
+    def _overlapped_step(self) -> None:
+        """Trains on the samples in storage while a background thread collects the samples of the next iteration.
+
+        The samples of the next iteration are collected by :attr:`behavior_network`, a copy of the network holding the weights
+        preceding the update, into a second storage, and the weights of the copy are updated once both the training and the
+        sampling are done. The actions are therefore predicted by weights that are one update behind those being trained,
+        which the PPO ratio accounts for since it is computed against the stored log probabilities of the behavior policy.
+        The samples of the first iteration are collected before training, and the samples collected in the last iteration
+        are not trained on.
+        """
+        if self.behavior_network is None:
+            self._create_behavior_network()
+            self._sample_rollout()
+
         self._calculate_advantages()
-        self._train()
-        
+        batch = self._training_batch()
+        # the batch may hold views of the buffers of the storage, so the next samples are collected into the other storage
+        self.storage, self.spare_storage = self.spare_storage, self.storage
+        sampling = self.sampler.submit(self._sample_rollout)
+        try:
+            self._optimize(batch)
+        finally:
+            sampling.result()
+        self.behavior_network.load_state_dict(self.network.state_dict())
+
+    def _create_behavior_network(self) -> None:
+        """Creates the behavior network, the second storage and the sampling thread of overlapped sampling.
+        """
+        self.behavior_network = copy.deepcopy(self.network)
+        if self.config.compile_inference and isinstance(self.behavior_network, InferenceMixin):
+            self.behavior_network.compile_inference()
+        self.spare_storage = Storage(self.config.rollout_length, self.num_workers)
+        self.sampler = ThreadPoolExecutor(max_workers=1)
+
+    def state_dict(self) -> dict:
+        """Returns the complete state of the agent (see :meth:`~conformer_rl.agents.base_ac_agent.BaseACAgent.state_dict`), including
+        the samples collected for the next iteration with overlapped sampling.
+        """
+        state = super().state_dict()
+        if self.behavior_network is not None:
+            state['storage'] = self.storage
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        if 'storage' in state and self.behavior_network is None:
+            self._create_behavior_network()
+        super().load_state_dict(state)
+        if 'storage' in state:
+            self.storage = state['storage']
+
+    def _importance_weights(self) -> torch.Tensor:
+        """Returns the weights correcting the advantages of the samples for having been collected by a different policy
+        than the one the PPO ratio is computed against, ordered like the samples in :meth:`_train`, or ``None`` if
+        the samples were collected by that policy.
+        """
+        return None
+
     def _train(self) -> None:
+        self._optimize(self._training_batch())
+
+    def _training_batch(self) -> dict:
+        """Gathers the samples in storage with their returns and normalized advantages for :meth:`_optimize`, ordered by worker.
+        """
         config = self.config
         storage = self.storage
 
         actions = storage.order('a')
         log_probs_old = storage.order('log_pi_a')
-        returns = torch.stack(self.returns, 1).view(self.num_workers * config.rollout_length, -1)
-        advantages = torch.stack(self.advantages, 1).view(self.num_workers * config.rollout_length, -1)
-        states = storage.order('states')
+        returns = self.returns.transpose(0, 1).reshape(self.num_workers * config.rollout_length, -1)
+        advantages = self.advantages.transpose(0, 1).reshape(self.num_workers * config.rollout_length, -1)
+        states = self._ordered_states()
 
         self.train_logger.add_scalar('advantages', advantages.mean(), self.total_steps)
         advantages = (advantages - advantages.mean()) / advantages.std()
+        importance_weights = self._importance_weights()
+        if importance_weights is not None:
+            advantages = importance_weights * advantages
+        return {'states': states, 'a': actions, 'log_pi_a': log_probs_old, 'returns': returns, 'advantages': advantages}
+
+    def _optimize(self, batch: dict) -> None:
+        """Performs the PPO updates on a batch from :meth:`_training_batch`.
+        """
+        config = self.config
+        states, actions, log_probs_old, returns, advantages = (batch[key] for key in ('states', 'a', 'log_pi_a', 'returns', 'advantages'))
 
         ############################################################################################
         #Training Loop
@@ -103,9 +190,10 @@ class PPOAgent(BaseACAgent):
                 sampled_returns = returns[starting_indices]
                 sampled_advantages = advantages[starting_indices]
 
-                sampled_states = [states[j] for j in (starting_indices)]
+                sampled_states = self._minibatch_states(states, starting_indices)
 
-                prediction = self.network(sampled_states, sampled_actions)
+                with self._autocast():
+                    prediction = self.network(sampled_states, sampled_actions)
 
                 entropy = prediction['ent'].mean()
                 prediction['log_pi_a'] = prediction['log_pi_a']
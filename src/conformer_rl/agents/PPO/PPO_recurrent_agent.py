@@ -9,6 +9,7 @@ import torch.nn as nn
 
 from conformer_rl.agents.base_ac_agent_recurrent import BaseACAgentRecurrent
 from conformer_rl.config import Config
+from conformer_rl.models import RTGNRecurrent, RTGNGatRecurrent
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
 class PPORecurrentAgent(BaseACAgentRecurrent):
@@ -37,6 +38,7 @@ class PPORecurrentAgent(BaseACAgentRecurrent):
     * eval_interval
     * eval_episodes
     * recurrence
+    * recurrent_sequence_training
     * optimization_epochs
     * mini_batch_size
     * discount
@@ -69,17 +71,25 @@ class PPORecurrentAgent(BaseACAgentRecurrent):
         assert config.rollout_length % self.recurrence == 0
         assert config.mini_batch_size % self.recurrence == 0
 
+    def _sequence_training(self) -> bool:
+        """Returns whether all steps of the sampled sequences are evaluated with a single call to the network (see
+        ``recurrent_sequence_training`` in :class:`~conformer_rl.config.agent_config.Config`). Other networks than
+        :class:`~conformer_rl.models.RTGN_recurrent.RTGNRecurrent` and :class:`~conformer_rl.models.RTGN_GAT_recurrent.RTGNGatRecurrent`
+        are called once for each step, since they may not accept several steps for each recurrent state.
+        """
+        return self.config.recurrent_sequence_training and isinstance(self.network, (RTGNRecurrent, RTGNGatRecurrent))
+
     def _train(self) -> None:
         config = self.config
         storage = self.storage
 
         actions = storage.order('a')
         log_probs_old = storage.order('log_pi_a')
-        returns = torch.stack(self.returns, 1).view(self.num_workers * config.rollout_length, -1)
-        advantages = torch.stack(self.advantages, 1).view(self.num_workers * config.rollout_length, -1)
+        returns = self.returns.transpose(0, 1).reshape(self.num_workers * config.rollout_length, -1)
+        advantages = self.advantages.transpose(0, 1).reshape(self.num_workers * config.rollout_length, -1)
 
         recurrent_states = [storage.order(f'recurrent_states_{i}') for i in range(self.num_recurrent_units)]
-        states = storage.order('states')
+        states = self._ordered_states()
 
         self.train_logger.add_scalar('advantages', advantages.mean(), self.total_steps)
         advantages = (advantages - advantages.mean()) / advantages.std()
@@ -94,52 +104,38 @@ class PPORecurrentAgent(BaseACAgentRecurrent):
             num_indices = config.mini_batch_size // self.recurrence
             starting_batch_indices = [indices[i:i+num_indices] for i in range(0, len(indices), num_indices)]
             for starting_indices in starting_batch_indices:
-                batch_entropy = 0
-                batch_value_loss = 0
-                batch_policy_loss = 0
-                batch_loss = 0
-
-                sampled_recurrent_states = (recurrent_states[i][:, starting_indices]for i in range(self.num_recurrent_units))
-
-                for i in range(self.recurrence):
-                    sampled_actions = actions[starting_indices + i]
-                    sampled_log_probs_old = log_probs_old[starting_indices + i]
-                    sampled_returns = returns[starting_indices + i]
-                    sampled_advantages = advantages[starting_indices + i]
-
-                    sampled_states = [states[j] for j in (starting_indices + i)]
-
-                    prediction, sampled_recurrent_states = self.network(sampled_states, sampled_recurrent_states, sampled_actions)
-
-
-                    entropy = prediction['ent'].mean()
-
-                    ratio = (prediction['log_pi_a'] - sampled_log_probs_old).exp()
-
-                    obj = ratio * sampled_advantages
-                    obj_clipped = ratio.clamp(1.0 - self.config.ppo_ratio_clip,
-                                            1.0 + self.config.ppo_ratio_clip) * sampled_advantages
-
-                    policy_loss = -torch.min(obj, obj_clipped).mean() - config.entropy_weight * entropy
-
-                    value_loss = 0.5 * (sampled_returns - prediction['v']).pow(2).mean()
-
-                    loss = policy_loss + config.value_loss_weight * value_loss
-
-                    batch_entropy += entropy.item()
-                    batch_policy_loss += policy_loss.item()
-                    batch_value_loss += value_loss.item()
-                    batch_loss += loss
-
-                    if i < self.recurrence - 1:
-                        for rstate_id, rstate in enumerate(recurrent_states):
-                            rstate[:, starting_indices + i + 1] = sampled_recurrent_states[rstate_id].detach()
-
-
-                batch_entropy /= self.recurrence
-                batch_policy_loss /= self.recurrence
-                batch_value_loss /= self.recurrence
-                batch_loss /= self.recurrence
+                sampled_recurrent_states = tuple(recurrent_states[i][:, starting_indices] for i in range(self.num_recurrent_units))
+
+                if self._sequence_training():
+                    # all steps of the sampled sequences in a single pass, ordered first by step and then by sequence
+                    sequence_indices = (starting_indices + np.arange(self.recurrence)[:, None]).reshape(-1)
+                    with self._autocast():
+                        prediction, _ = self.network(self._minibatch_states(states, sequence_indices), sampled_recurrent_states, actions[sequence_indices])
+                    batch_loss, entropy, policy_loss, value_loss = self._losses(prediction, log_probs_old[sequence_indices],
+                        returns[sequence_indices], advantages[sequence_indices])
+                    batch_entropy, batch_policy_loss, batch_value_loss = entropy.item(), policy_loss.item(), value_loss.item()
+                else:
+                    batch_entropy = 0
+                    batch_value_loss = 0
+                    batch_policy_loss = 0
+                    batch_loss = 0
+
+                    for i in range(self.recurrence):
+                        sampled_states = self._minibatch_states(states, starting_indices + i)
+                        with self._autocast():
+                            prediction, sampled_recurrent_states = self.network(sampled_states, sampled_recurrent_states, actions[starting_indices + i])
+                        loss, entropy, policy_loss, value_loss = self._losses(prediction, log_probs_old[starting_indices + i],
+                            returns[starting_indices + i], advantages[starting_indices + i])
+
+                        batch_entropy += entropy.item()
+                        batch_policy_loss += policy_loss.item()
+                        batch_value_loss += value_loss.item()
+                        batch_loss += loss
+
+                    batch_entropy /= self.recurrence
+                    batch_policy_loss /= self.recurrence
+                    batch_value_loss /= self.recurrence
+                    batch_loss /= self.recurrence
 
                 self.train_logger.add_scalar('entropy_loss', batch_entropy, self.total_steps)
                 self.train_logger.add_scalar('policy_loss', batch_policy_loss, self.total_steps)
@@ -149,4 +145,23 @@ class PPORecurrentAgent(BaseACAgentRecurrent):
                 self.optimizer.zero_grad()
                 batch_loss.backward()
                 nn.utils.clip_grad_norm_(self.network.parameters(), config.gradient_clip)
-                self.optimizer.step()
\ No newline at end of file
+                self.optimizer.step()
+
+    def _losses(self, prediction: dict, log_probs_old: torch.Tensor, returns: torch.Tensor, advantages: torch.Tensor) -> tuple:
+        """Returns the total loss, the entropy, the policy loss and the value loss of the `prediction` for a minibatch of samples.
+        """
+        config = self.config
+        entropy = prediction['ent'].mean()
+
+        ratio = (prediction['log_pi_a'] - log_probs_old).exp()
+
+        obj = ratio * advantages
+        obj_clipped = ratio.clamp(1.0 - config.ppo_ratio_clip,
+                                1.0 + config.ppo_ratio_clip) * advantages
+
+        policy_loss = -torch.min(obj, obj_clipped).mean() - config.entropy_weight * entropy
+
+        value_loss = 0.5 * (returns - prediction['v']).pow(2).mean()
+
+        loss = policy_loss + config.value_loss_weight * value_loss
+        return loss, entropy, policy_loss, value_loss
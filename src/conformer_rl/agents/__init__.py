@@ -2,4 +2,5 @@ from .A2C import A2CAgent, A2CRecurrentAgent
 from .PPO import PPOAgent, PPORecurrentAgent
 
 from .curriculum_agents import A2CExternalCurriculumAgent, A2CRecurrentExternalCurriculumAgent
-from .curriculum_agents import PPOExternalCurriculumAgent, PPORecurrentExternalCurriculumAgent
\ No newline at end of file
+from .curriculum_agents import PPOExternalCurriculumAgent, PPORecurrentExternalCurriculumAgent
+from .actor_learner import ActorLearnerPPOAgent, ActorPool, run_actor
@@ -0,0 +1,358 @@
+"""
+Actor_learner
+=============
+
+Agents whose samples are collected by actor processes, possibly running on other hosts, which
+communicate with the learner over TCP or Unix sockets.
+"""
+import bisect
+import logging
+import pickle
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener, wait
+
+import numpy as np
+import torch
+
+from conformer_rl.agents.base_agent import BaseAgent
+from conformer_rl.agents.PPO.PPO_agent import PPOAgent
+from conformer_rl.config import Config
+from conformer_rl.utils import to_np
+
+from typing import Any, Callable, Tuple, Union
+
+Address = Union[Tuple[str, int], str]
+
+# messages are pickled explicitly instead of with Connection.send, since the latter would share the memory of tensors
+# through file descriptors, which only works between processes on the same host
+def _send(conn: Connection, message: Any) -> None:
+    conn.send_bytes(pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL))
+
+def _recv(conn: Connection) -> Any:
+    return pickle.loads(conn.recv_bytes())
+
+def run_actor(address: Address, task_fn: Callable[[], Any], network_fn: Callable[[], torch.nn.Module], authkey: bytes) -> None:
+    """Runs an actor collecting samples for an :class:`ActorPool`, until the pool is closed.
+
+    The actor connects to the pool listening on `address`, receives the rollout length and the weights of the
+    network from the learner, and then repeatedly collects ``rollout_length`` steps on each of its environments and
+    sends them to the learner, together with the version of the weights used for predicting the actions.
+    While the learner processes a rollout, the actor already collects the next one with the weights it has,
+    and it only waits for the learner to acknowledge the previous rollout, with the latest weights if they changed,
+    before sending the next one. The actions of a rollout are therefore predicted by weights that are at most a
+    couple of updates behind those of the learner.
+
+    The messages received from the learner are deserialized with pickle, which can run arbitrary code, so the actor must only
+    connect to a trusted learner over a trusted network.
+
+    Parameters
+    ----------
+    address : 2-tuple of str and int, or str
+        The ``(host, port)`` TCP address or the Unix socket path the pool listens on.
+    task_fn : callable returning a wrapper for environments from :func:`~conformer_rl.environments.environment_wrapper.Task`
+        Function constructing the environments of the actor.
+    network_fn : callable returning torch.nn.Module
+        Function constructing the network of the actor, with the same architecture as the network of the learner.
+    authkey : bytes
+        The secret authentication key of the pool, see the ``authkey`` attribute of :class:`ActorPool`.
+    """
+    conn = Client(address, authkey=authkey)
+    sender = ThreadPoolExecutor(max_workers=1)
+    task = task_fn()
+    network = network_fn()
+    version = None
+
+    def handle(message: tuple) -> str:
+        nonlocal version
+        if message[0] == 'env_method':
+            task.env_method(message[1], *message[2], **message[3])
+        elif message[0] in ('start', 'ack') and message[-1] is not None:
+            version = message[-2]
+            network.load_state_dict(message[-1])
+        return message[0]
+
+    try:
+        _send(conn, ('hello', task.num_envs))
+        while True:
+            message = _recv(conn)
+            if handle(message) == 'start':
+                rollout_length = message[1]
+                break
+            if message[0] == 'close':
+                return
+        states = task.reset()
+        total_rewards = np.zeros(task.num_envs)
+        sent = None
+
+        while True:
+            trajectories = [[] for _ in range(task.num_envs)]
+            step_timings = [[] for _ in range(task.num_envs)]
+            episodic_returns = []
+            with torch.no_grad():
+                for _ in range(rollout_length):
+                    prediction = network(states)
+                    next_states, rewards, terminals, infos = task.step(to_np(prediction['a']))
+                    BaseAgent._record_step_timings(step_timings, range(task.num_envs), infos)
+                    total_rewards += np.asarray(rewards)
+                    for i in range(task.num_envs):
+                        transition_prediction = {key: prediction[key][i:i + 1] for key in ('a', 'log_pi_a')}
+                        trajectories[i].append((transition_prediction, states[i], rewards[i], terminals[i]))
+                        if terminals[i]:
+                            episodic_returns.append(total_rewards[i])
+                            total_rewards[i] = 0.
+                    states = next_states
+
+            # at most one rollout is unacknowledged, so that the weights of the actor lag behind by at most a couple of updates
+            if sent is not None:
+                sent.result()
+                while True:
+                    message = _recv(conn)
+                    if handle(message) == 'ack':
+                        break
+                    if message[0] == 'close':
+                        return
+            sent = sender.submit(_send, conn, ('rollout', version, trajectories, list(states), episodic_returns, step_timings))
+    except (EOFError, OSError):
+        logging.info('actor disconnected from the learner')
+    finally:
+        sender.shutdown(wait=False)
+        conn.close()
+        task.close()
+
+class ActorPool:
+    """Learner side of the connections to the actors running :func:`run_actor`.
+
+    Replaces the vector environment of the training environment of an :class:`ActorLearnerPPOAgent`, with one worker for each
+    environment of each actor.
+
+    The messages received from the actors are deserialized with pickle, which can run arbitrary code, so only actors knowing the
+    authentication key are accepted. The key must be kept secret, and the pool must only listen on addresses reachable from trusted
+    networks, such as a Unix socket, ``localhost`` or the address of a private network interface shared with the hosts of the actors.
+
+    Parameters
+    ----------
+    address : 2-tuple of str and int, or str
+        The ``(host, port)`` TCP address or the Unix socket path to listen on.
+    num_actors : int
+        The number of actors to wait for in :meth:`accept`.
+    authkey : bytes, optional
+        The secret authentication key shared with the actors. If not specified, a random key is generated.
+
+    Attributes
+    ----------
+    address : 2-tuple of str and int, or str
+        The address the pool listens on, with the port chosen by the system if port 0 was given.
+    authkey : bytes
+        The secret authentication key to pass to :func:`run_actor`.
+    num_envs : int
+        The total number of environments of the actors, available after :meth:`accept`.
+    version : int
+        The version of the latest weights published with :meth:`set_weights`.
+    """
+    def __init__(self, address: Address, num_actors: int, authkey: bytes = None):
+        self.authkey = secrets.token_bytes(32) if authkey is None else authkey
+        self.listener = Listener(address, authkey=self.authkey)
+        self.address = self.listener.address
+        self.num_actors = num_actors
+        self.connections = []
+        # messages to each actor are sent by a thread of its own, so that the learner does not wait for actors busy collecting samples
+        self.senders = []
+        self.actor_num_envs = []
+        self.num_envs = None
+        self.version = 0
+        self._state_dict = None
+        self._actor_versions = []
+
+    def accept(self) -> None:
+        """Waits until all actors have connected.
+        """
+        while len(self.connections) < self.num_actors:
+            conn = self.listener.accept()
+            _, num_envs = _recv(conn)
+            self.connections.append(conn)
+            self.senders.append(ThreadPoolExecutor(max_workers=1))
+            self.actor_num_envs.append(num_envs)
+            self._actor_versions.append(None)
+            logging.info(f'actor {len(self.connections) - 1} connected with {num_envs} environments')
+        self.num_envs = sum(self.actor_num_envs)
+
+    def start(self, rollout_length: int, network: torch.nn.Module) -> None:
+        """Sends the rollout length and the current weights of `network` to all actors, which then start collecting samples.
+        """
+        self.set_weights(network)
+        for i, (conn, sender) in enumerate(zip(self.connections, self.senders)):
+            sender.submit(_send, conn, ('start', rollout_length, self.version, self._state_dict))
+            self._actor_versions[i] = self.version
+
+    def set_weights(self, network: torch.nn.Module, version: int = None) -> None:
+        """Publishes the current weights of `network`, which are sent to each actor with the acknowledgement of its next rollout.
+
+        The weights are serialized once, and only sent to actors whose weights are outdated.
+        """
+        self.version = self.version if version is None else version
+        self._state_dict = {key: value.detach().cpu().clone() for key, value in network.state_dict().items()}
+        self._ack_bytes = pickle.dumps(('ack', self.version, self._state_dict), protocol=pickle.HIGHEST_PROTOCOL)
+        self._no_weights_ack_bytes = pickle.dumps(('ack', self.version, None))
+
+    def receive(self) -> Tuple[int, int, list, list, list, list]:
+        """Waits for the next rollout from any actor and acknowledges it.
+
+        Returns
+        -------
+        actor : int
+            The index of the actor.
+        version : int
+            The version of the weights that predicted the actions of the rollout.
+        trajectories : list of lists of tuples
+            The trajectory of each environment of the actor, as a list of ``(prediction, state, reward, done)`` transitions.
+        next_states : list
+            The states following the trajectories.
+        episodic_returns : list of float
+            The returns of the episodes completed during the rollout.
+        step_timings : list of lists of dicts
+            The step timings reported by each environment of the actor during the rollout
+            (see :meth:`~conformer_rl.environments.conformer_env.ConformerEnv.step`).
+        """
+        conn = wait(self.connections)[0]
+        actor = self.connections.index(conn)
+        _, version, trajectories, next_states, episodic_returns, step_timings = _recv(conn)
+        if self._actor_versions[actor] == self.version:
+            self.senders[actor].submit(conn.send_bytes, self._no_weights_ack_bytes)
+        else:
+            self.senders[actor].submit(conn.send_bytes, self._ack_bytes)
+            self._actor_versions[actor] = self.version
+        return actor, version, trajectories, next_states, episodic_returns, step_timings
+
+    def reset(self) -> list:
+        """Returns placeholder states, since the states of the environments are kept by the actors.
+        """
+        return [None] * self.num_envs
+
+    def env_method(self, method_name: str, *method_args, indices: list = None, **method_kwargs) -> list:
+        """Calls the method with the given name on the environments with the given `indices` (all environments if not specified),
+        without waiting for the results. The environments are numbered across the actors, in the order in which the actors connected.
+
+        Returns
+        -------
+        list
+            ``None`` for each of the environments, in place of the results.
+        """
+        if indices is None:
+            for conn, sender in zip(self.connections, self.senders):
+                sender.submit(_send, conn, ('env_method', method_name, method_args, method_kwargs))
+            return [None] * self.num_envs
+
+        offsets = np.cumsum([0] + self.actor_num_envs)
+        for i in indices:
+            actor = bisect.bisect_right(offsets, i) - 1
+            kwargs = dict(method_kwargs, indices=[int(i - offsets[actor])])
+            self.senders[actor].submit(_send, self.connections[actor], ('env_method', method_name, method_args, kwargs))
+        return [None] * len(indices)
+
+    def close(self) -> None:
+        for conn, sender in zip(self.connections, self.senders):
+            sender.submit(_send, conn, ('close',))
+            sender.shutdown()
+            conn.close()
+        self.connections, self.senders = [], []
+        self.listener.close()
+
+class ActorLearnerPPOAgent(PPOAgent):
+    """PPO agent training on samples collected asynchronously by remote actors.
+
+    The training environment in the config must be an :class:`ActorPool`, to which ``num_actors`` processes running
+    :func:`run_actor` connect, on the same host or on other hosts. In each iteration the learner trains on ``num_envs``
+    trajectories of ``rollout_length`` steps from whichever actors deliver them first, so that slow actors do not hold up
+    training, and publishes its updated weights to the actors.
+
+    Since the actors keep collecting samples while the learner trains, the actions of a rollout may have been predicted by older
+    weights than the current ones. Following decoupled PPO [1]_, the learner therefore recomputes the log probabilities and values
+    of the received samples with its current weights, which serve as the reference policy of the PPO ratio, and weights the
+    advantages by the ratio of the probabilities under the reference and the behavior policy, truncated at
+    ``importance_weight_clip`` [2]_. The difference between the version of the learner and the version that predicted each
+    rollout is logged as ``policy_lag``.
+
+    Parameters
+    ----------
+    config : :class:`~conformer_rl.config.agent_config.Config`
+        Configuration object for the agent. Requires the parameters of :class:`~conformer_rl.agents.PPO.PPO_agent.PPOAgent`
+        and ``importance_weight_clip``.
+
+    References
+    ----------
+    .. [1] `Batch size-invariance for policy optimization <https://arxiv.org/abs/2110.00641>`_
+    .. [2] `IMPALA paper <https://arxiv.org/abs/1802.01561>`_
+    """
+    def __init__(self, config: Config):
+        config.train_env.accept()
+        super().__init__(config)
+        self.version = 0
+        self.pending_trajectories = []
+        self.task.start(config.rollout_length, self.network)
+
+    def step(self) -> None:
+        """Trains on the next batch of trajectories from the actors and publishes the updated weights.
+        """
+        super().step()
+        self.version += 1
+        self.task.set_weights(self.network, self.version)
+
+    def state_dict(self) -> dict:
+        """Returns the state of the learner, including the version of its weights and the trajectories carried over to the next
+        iteration. The states of the actors, which keep sampling asynchronously, are not included.
+        """
+        state = super().state_dict()
+        state['version'] = self.version
+        state['pending_trajectories'] = self.pending_trajectories
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        """Restores the state of the learner returned by :meth:`state_dict` and publishes the restored weights to the actors.
+        """
+        super().load_state_dict(state)
+        self.version = state['version']
+        self.pending_trajectories = state['pending_trajectories']
+        self.task.set_weights(self.network, self.version)
+
+    def _sample(self) -> None:
+        """Collects ``num_workers`` trajectories from the actors and stores them with the predictions of the current weights
+        (see :meth:`_stored_prediction`).
+
+        Trajectories beyond ``num_workers`` are carried over to the next iteration. The step timings reported by the environments
+        of the actors are logged like for :meth:`~conformer_rl.agents.base_ac_agent.BaseACAgent._sample`, with the workers numbered
+        consecutively over the environments of the actors.
+        """
+        lanes = self.pending_trajectories
+        step_timings = [[] for _ in range(sum(self.task.actor_num_envs))]
+        while len(lanes) < self.num_workers:
+            actor, version, trajectories, next_states, episodic_returns, actor_step_timings = self.task.receive()
+            offset = sum(self.task.actor_num_envs[:actor])
+            for i, timings in enumerate(actor_step_timings):
+                step_timings[offset + i] += timings
+            self.total_steps += sum(len(trajectory) for trajectory in trajectories)
+            self.train_logger.add_scalar('policy_lag', self.version - version, self.total_steps)
+            for episodic_return in episodic_returns:
+                logging.info(f'logging episodic return train... {self.total_steps}')
+                self.train_logger.add_scalar('episodic_return_train', episodic_return, self.total_steps)
+            lanes += zip(trajectories, next_states)
+        self._log_step_timings(step_timings)
+        self.pending_trajectories = lanes[self.num_workers:]
+        trajectories, next_states = zip(*lanes[:self.num_workers])
+        self._store_trajectories(trajectories, next_states)
+
+    def _stored_prediction(self, predictions: list, states: list) -> dict:
+        """Recomputes the log probabilities and values of the sampled actions with the current weights, keeping the log probabilities
+        of the behavior policy as ``log_pi_behavior``.
+        """
+        behavior = self._merge_predictions(predictions)
+        prediction = self._predict(states, behavior['a'])
+        prediction['log_pi_behavior'] = behavior['log_pi_a']
+        return prediction
+
+    def _importance_weights(self) -> torch.Tensor:
+        """Returns the ratios of the probabilities of the actions under the current weights and under the weights that predicted them,
+        truncated at ``importance_weight_clip``.
+        """
+        log_ratio = self.storage.order('log_pi_a') - self.storage.order('log_pi_behavior')
+        return log_ratio.exp().clamp(max=self.config.importance_weight_clip)
@@ -6,8 +6,10 @@ import torch
 import numpy as np
 import logging
 import time
-from conformer_rl.utils import current_time, load_model, save_model, mkdir, to_np
+from typing import Union
+from conformer_rl.utils import current_time, discounted_reverse_cumsum, load_model, save_model, mkdir, to_np
 from conformer_rl.config import Config
+from conformer_rl.models.packed_observations import PackedObservations
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
 from conformer_rl.agents.base_agent import BaseAgent
@@ -29,13 +31,18 @@ class BaseACAgent(BaseAgent):
         self.states = self.task.reset()
         self.prediction = None
 
+        # incomplete trajectories and running steps of the workers, carried over between iterations of straggler-tolerant sampling
+        self.worker_trajectories = [[] for _ in range(self.num_workers)]
+        self.in_flight = {}
+
     def step(self) -> None:
         """Performs one iteration of acquiring samples on the environment
         and then trains on the acquired samples.
         """
         self.storage.reset()
         sample_start = time.time()
-        self._sample()
+        with self._autocast():
+            self._sample()
         logging.debug(f'sample time: {time.time() - sample_start} seconds')
         train_start = time.time()
         self._calculate_advantages()
@@ -45,9 +52,17 @@ class BaseACAgent(BaseAgent):
     def _sample(self) -> None:
         """Collects samples from the training environment.
         """
+        if self.config.straggler_tolerant_sampling:
+            self._sample_straggler_tolerant()
+            return
+        if self.config.double_buffer_sampling and self.num_workers > 1:
+            self._sample_double_buffered()
+            return
+
         config = self.config
         states = self.states
         storage = self.storage
+        step_timings = [[] for _ in range(self.num_workers)]
         ##############################################################################################
         #Sampling Loop
         ##############################################################################################
@@ -55,10 +70,11 @@ class BaseACAgent(BaseAgent):
             self.total_steps += self.num_workers
 
             #run the neural net once to get prediction
-            prediction = self.network(states)
+            prediction = self._predict(states)
 
             #step the environment with the action determined by the prediction
-            next_states, rewards, terminals, _ = self.task.step(to_np(prediction['a']))
+            next_states, rewards, terminals, infos = self.task.step(to_np(prediction['a']))
+            self._record_step_timings(step_timings, range(self.num_workers), infos)
             self.total_rewards += np.asarray(rewards)
 
             for idx, done in enumerate(terminals):
@@ -78,35 +94,273 @@ class BaseACAgent(BaseAgent):
             states = next_states
 
 
+        self._log_step_timings(step_timings)
+        self.states = states
+
+        prediction = self._predict(states)
+        self.prediction = prediction
+
+        storage.append(prediction)
+
+    def _sample_double_buffered(self) -> None:
+        """Collects samples from the training environment while overlapping inference with environment steps.
+
+        The workers are split into two groups. Each group is stepped with ``step_async`` as soon as its actions have been
+        predicted, and its results are only collected with ``step_wait`` right before its next prediction, so that the network runs on
+        the observations of one group while the environments of the other group are being stepped. The collected samples are the same
+        as for :meth:`_sample`, except that the actions are sampled separately for each group.
+        """
+        config = self.config
+        storage = self.storage
+        step_timings = [[] for _ in range(self.num_workers)]
+        groups = self._worker_groups()
+        states = list(self.states)
+        rewards = np.zeros(self.num_workers)
+        terminals = np.zeros(self.num_workers, dtype=bool)
+        prediction = None
+
+        for step in range(config.rollout_length + 1):
+            next_states = list(states)
+            group_predictions = []
+            for indices in groups:
+                if step > 0:
+                    obs, rewards[indices], terminals[indices], infos = self.task.step_wait(indices)
+                    self._record_step_timings(step_timings, indices, infos)
+                    for i, o in zip(indices, obs):
+                        next_states[i] = o
+                if step < config.rollout_length:
+                    group_predictions.append(self._predict([next_states[i] for i in indices]))
+                    self.task.step_async(to_np(group_predictions[-1]['a']), indices)
+
+            if step > 0:
+                self.total_steps += self.num_workers
+                self.total_rewards += rewards
+                for idx, done in enumerate(terminals):
+                    if done:
+                        logging.info(f'logging episodic return train... {self.total_steps}')
+                        self.train_logger.add_scalar('episodic_return_train', self.total_rewards[idx], self.total_steps)
+                        self.total_rewards[idx] = 0.
+
+                storage.append(prediction)
+                storage.append({
+                    'states': states,
+                    'terminals': torch.tensor(terminals).unsqueeze(-1).to(device),
+                    'r': torch.tensor(rewards).unsqueeze(-1).to(device),
+                    'm': torch.tensor(1 - terminals).unsqueeze(-1).to(device)
+                    })
+            if step < config.rollout_length:
+                prediction = self._merge_predictions(group_predictions)
+            states = next_states
+
+        self._log_step_timings(step_timings)
+        self.states = states
+
+        prediction = self._predict(states)
+        self.prediction = prediction
+
+        storage.append(prediction)
+
+    def _sample_straggler_tolerant(self) -> None:
+        """Collects samples from the training environment from whichever workers finish their steps first.
+
+        Each worker is stepped independently with ``step_async``, and as soon as ``step_wait_any`` returns its results, the network
+        predicts its next action. The transitions of each worker are grouped into trajectories of ``rollout_length`` consecutive steps,
+        and sampling stops once ``num_workers`` trajectories are complete. The storage then holds the same number of samples in the same
+        layout as for :meth:`_sample`, with one trajectory in place of each worker, so that :meth:`~conformer_rl.agents.storage.Storage.order`
+        and advantage estimation work unchanged. Faster workers contribute more trajectories.
+
+        Incomplete trajectories are carried over to the next sampling iteration. Workers that are idle at the end are stepped again right
+        away, so that they keep running while the agent trains, and the steps still running are collected in the next sampling iteration.
+        Their actions were therefore predicted before the latest update of the network.
+
+        Since the predictions are carried over between updates of the network, sampling must run without gradients, as done by
+        :class:`~conformer_rl.agents.PPO.PPO_agent.PPOAgent`.
+        """
+        if torch.is_grad_enabled():
+            raise ValueError('Straggler-tolerant sampling requires sampling without gradients')
+        config = self.config
+        states = list(self.states)
+        step_timings = [[] for _ in range(self.num_workers)]
+        trajectories, next_states = [], []
+
+        def commit(i: int) -> None:
+            while len(trajectories) < self.num_workers and len(self.worker_trajectories[i]) >= config.rollout_length:
+                trajectory = self.worker_trajectories[i]
+                trajectories.append(trajectory[:config.rollout_length])
+                next_states.append(trajectory[config.rollout_length][1] if len(trajectory) > config.rollout_length else states[i])
+                self.worker_trajectories[i] = trajectory[config.rollout_length:]
+
+        def step_idle_workers() -> None:
+            idle = [i for i in range(self.num_workers) if i not in self.in_flight]
+            if idle:
+                prediction = self._predict([states[i] for i in idle])
+                self.task.step_async(to_np(prediction['a']), idle)
+                for k, i in enumerate(idle):
+                    self.in_flight[i] = ({key: val[k:k + 1] for key, val in prediction.items()}, states[i])
+
+        for i in range(self.num_workers):
+            commit(i)
+        while len(trajectories) < self.num_workers:
+            step_idle_workers()
+            indices, obs, rewards, terminals, infos = self.task.step_wait_any()
+            self._record_step_timings(step_timings, indices, infos)
+            self._record_in_flight(indices, obs, rewards, terminals, states)
+            for i in indices:
+                commit(i)
+        step_idle_workers()
+
+        self._log_step_timings(step_timings)
         self.states = states
+        self._store_trajectories(trajectories, next_states)
 
-        prediction = self.network(states)
+    def _record_in_flight(self, indices: list, obs: tuple, rewards: np.ndarray, terminals: np.ndarray, states: list) -> None:
+        """Appends the transitions of the finished environment steps of the workers with the given `indices`, which were started by
+        :meth:`_sample_straggler_tolerant`, to the incomplete trajectories of the workers, and updates their `states` to the new observations.
+        """
+        for i, o, reward, done in zip(indices, obs, rewards, terminals):
+            prediction, state = self.in_flight.pop(i)
+            self.total_steps += 1
+            self.total_rewards[i] += reward
+            if done:
+                logging.info(f'logging episodic return train... {self.total_steps}')
+                self.train_logger.add_scalar('episodic_return_train', self.total_rewards[i], self.total_steps)
+                self.total_rewards[i] = 0.
+
+            self.worker_trajectories[i].append((prediction, state, reward, done))
+            states[i] = o
+
+    def _drain_in_flight(self) -> None:
+        """Waits for the environment steps still running after :meth:`_sample_straggler_tolerant` and adds their transitions to the
+        incomplete trajectories of the workers, which are used by the next sampling iteration.
+        """
+        if self.in_flight:
+            indices = sorted(self.in_flight)
+            obs, rewards, terminals, _ = self.task.step_wait(indices)
+            states = list(self.states)
+            self._record_in_flight(indices, obs, rewards, terminals, states)
+            self.states = states
+
+    def _store_trajectories(self, trajectories: list, next_states: list) -> None:
+        """Appends trajectories of ``rollout_length`` transitions to the storage, one trajectory in place of each worker, followed by
+        the prediction of the network for the states following the trajectories.
+
+        Each transition is a tuple ``(prediction, state, reward, done)``, where `prediction` holds the prediction of the network
+        for the single `state`.
+        """
+        storage = self.storage
+        for step in range(self.config.rollout_length):
+            transitions = [trajectory[step] for trajectory in trajectories]
+            states = [transition[1] for transition in transitions]
+            terminals = np.array([transition[3] for transition in transitions])
+            storage.append(self._stored_prediction([transition[0] for transition in transitions], states))
+            storage.append({
+                'states': states,
+                'terminals': torch.tensor(terminals).unsqueeze(-1).to(device),
+                'r': torch.tensor(np.array([transition[2] for transition in transitions])).unsqueeze(-1).to(device),
+                'm': torch.tensor(1 - terminals).unsqueeze(-1).to(device)
+                })
+
+        prediction = self._predict(next_states)
         self.prediction = prediction
 
         storage.append(prediction)
 
+    def _stored_prediction(self, predictions: list, states: list) -> dict:
+        """Returns the prediction stored by :meth:`_store_trajectories` for one step of the trajectories, given the predictions
+        made for each of the `states` when sampling them.
+        """
+        return self._merge_predictions(predictions)
+
+    def _worker_groups(self) -> list:
+        """Splits the workers into the two groups used by :meth:`_sample_double_buffered`.
+        """
+        return [list(indices) for indices in np.array_split(np.arange(self.num_workers), 2)]
+
+    @staticmethod
+    def _merge_predictions(predictions: list) -> dict:
+        """Concatenates the predictions of the network for consecutive groups of workers.
+
+        Tensors whose second dimension differs between groups, such as the actions of molecules with different numbers
+        of torsions, are padded with zeros.
+        """
+        merged = {}
+        for key in predictions[0]:
+            tensors = [prediction[key] for prediction in predictions]
+            if tensors[0].dim() > 1:
+                width = max(tensor.shape[1] for tensor in tensors)
+                tensors = [torch.nn.functional.pad(tensor, (0, 0) * (tensor.dim() - 2) + (0, width - tensor.shape[1])) for tensor in tensors]
+            merged[key] = torch.cat(tensors)
+        return merged
+
     def _train(self) -> None:
         raise NotImplementedError
 
+    def state_dict(self) -> dict:
+        """Returns the complete state of the agent (see :meth:`~conformer_rl.agents.base_agent.BaseAgent.state_dict`), including the
+        current observations, the returns of the running episodes and the incomplete trajectories of straggler-tolerant sampling.
+
+        Environment steps started by straggler-tolerant sampling that are still running are first waited for and added to the incomplete
+        trajectories (see :meth:`_drain_in_flight`), since their results cannot be saved otherwise.
+        """
+        self._drain_in_flight()
+        state = super().state_dict()
+        state.update({
+            'states': self.states,
+            'total_rewards': self.total_rewards,
+            'prediction': None if self.prediction is None else {key: value.detach() for key, value in self.prediction.items()},
+            'worker_trajectories': self.worker_trajectories,
+        })
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        self.states = state['states']
+        self.total_rewards = state['total_rewards']
+        self.prediction = state['prediction']
+        self.worker_trajectories = state['worker_trajectories']
+
+    def _ordered_states(self) -> Union[PackedObservations, list]:
+        """Returns the observations in storage ordered by :meth:`~conformer_rl.agents.storage.Storage.order`. Graph observations
+        are collated once into :class:`~conformer_rl.models.packed_observations.PackedObservations`, from which minibatches
+        are gathered by :meth:`_minibatch_states` without collating the graphs again.
+        """
+        states = self.storage.order('states')
+        return PackedObservations(states) if PackedObservations.can_pack(states) else states
+
+    @staticmethod
+    def _minibatch_states(states: Union[PackedObservations, list], indices: np.ndarray) -> Union[PackedObservations, list]:
+        """Returns the observations at `indices` of observations returned by :meth:`_ordered_states`.
+        """
+        if isinstance(states, PackedObservations):
+            return states[indices]
+        return [states[j] for j in indices]
+
     def _calculate_advantages(self) -> None:
         """Performs advantage estimation.
 
         Uses either SARSA or generalized advantage estimation (GAE) for estimating advantages,
-        depending on the config.
+        depending on the config. The advantages and returns of all steps and workers are computed at once
+        as tensors of shape ``(rollout_length, num_workers, 1)`` and dtype ``config.advantage_dtype``.
         """
         config = self.config
-        storage = self.storage
+        rollout = config.rollout_length
 
-        self.advantages, self.returns = [None] * config.rollout_length, [None] * config.rollout_length
-        adv = torch.zeros((self.num_workers, 1), dtype=torch.float64).to(device)
-        ret = self.prediction['v'].squeeze(0)
-
-        for i in reversed(range(config.rollout_length)):
-            ret = storage['r'][i] + config.discount * storage['m'][i] * ret
-            if not config.use_gae:
-                adv = ret - storage['v'][i].detach()
-            else:
-                td_error = storage['r'][i] + config.discount * storage['m'][i] * storage['v'][i + 1] - storage['v'][i]
-                adv = adv * config.gae_lambda * config.discount * storage['m'][i] + td_error
-            self.advantages[i] = adv.detach()
-            self.returns[i] = ret.detach()
\ No newline at end of file
+        rewards = self._rollout_tensor('r', rollout)
+        discounts = config.discount * self._rollout_tensor('m', rollout)
+        final_value = self.prediction['v'].squeeze(0).detach().to(rewards.dtype)
+        returns = discounted_reverse_cumsum(rewards, discounts, final_value)
+        if not config.use_gae:
+            advantages = returns - self._rollout_tensor('v', rollout)
+        else:
+            values = self._rollout_tensor('v', rollout + 1)
+            td_errors = rewards + discounts * values[1:] - values[:-1]
+            advantages = discounted_reverse_cumsum(td_errors, config.gae_lambda * discounts, torch.zeros_like(final_value))
+        self.advantages, self.returns = advantages, returns
+
+    def _rollout_tensor(self, key: str, length: int) -> torch.Tensor:
+        """Returns the first `length` items in storage with the given `key` as a single detached tensor of dtype ``config.advantage_dtype``.
+        """
+        items = self.storage[key][:length]
+        if not torch.is_tensor(items):
+            items = torch.stack(items)
+        return items.detach().to(self.config.advantage_dtype)
\ No newline at end of file
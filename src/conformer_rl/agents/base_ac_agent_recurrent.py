@@ -23,24 +23,47 @@ class BaseACAgentRecurrent(BaseACAgent, BaseAgentRecurrent):
         Configuration object for the agent. See notes for a list of config
         parameters used by specific pre-built agents.
 
+    Raises
+    ------
+    ValueError
+        If ``straggler_tolerant_sampling`` is set in the config, since the recurrent states of the workers must be stepped in lockstep.
     """
     def __init__(self, config: Config):
+        if config.straggler_tolerant_sampling:
+            raise ValueError('Recurrent agents do not support straggler-tolerant sampling')
         super().__init__(config)
 
         with torch.no_grad():
-            _, self.recurrent_states = self.network(self.states)
+            _, self.recurrent_states = self._predict(self.states)
             self.num_recurrent_units = len(self.recurrent_states)
         for state in self.recurrent_states:
             state.zero_()
 
         self.recurrence = self.config.recurrence
-        
+
+    def state_dict(self) -> dict:
+        """Returns the complete state of the agent (see :meth:`~conformer_rl.agents.base_ac_agent.BaseACAgent.state_dict`), including
+        the recurrent states of the network for the current observations.
+        """
+        state = super().state_dict()
+        state['recurrent_states'] = tuple(recurrent_state.detach() for recurrent_state in self.recurrent_states)
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        self.recurrent_states = tuple(recurrent_state.clone() for recurrent_state in state['recurrent_states'])
+
     def _sample(self) -> None:
         """Collects samples from the training environment.
         """
+        if self.config.double_buffer_sampling and self.num_workers > 1:
+            self._sample_double_buffered()
+            return
+
         config = self.config
         states = self.states
         storage = self.storage
+        step_timings = [[] for _ in range(self.num_workers)]
 
         with torch.no_grad():
         ##############################################################################################
@@ -53,10 +76,11 @@ class BaseACAgentRecurrent(BaseACAgent, BaseAgentRecurrent):
                 storage.append({f'recurrent_states_{i}' : rstate for i, rstate in enumerate(self.recurrent_states)})
 
                 #run the neural net once to get prediction
-                prediction, self.recurrent_states = self.network(states, self.recurrent_states)
+                prediction, self.recurrent_states = self._predict(states, self.recurrent_states)
 
                 #step the environment with the action determined by the prediction
-                next_states, rewards, terminals, _ = self.task.step(to_np(prediction['a']))
+                next_states, rewards, terminals, infos = self.task.step(to_np(prediction['a']))
+                self._record_step_timings(step_timings, range(self.num_workers), infos)
 
                 self.total_rewards += np.asarray(rewards)
 
@@ -81,9 +105,82 @@ class BaseACAgentRecurrent(BaseACAgent, BaseAgentRecurrent):
                 states = next_states
 
 
+        self._log_step_timings(step_timings)
+        self.states = states
+
+        prediction, _ = self._predict(states, self.recurrent_states)
+        self.prediction = prediction
+
+        storage.append(prediction)
+
+    def _sample_double_buffered(self) -> None:
+        """Collects samples from the training environment while overlapping inference with environment steps.
+
+        Same as :meth:`~conformer_rl.agents.base_ac_agent.BaseACAgent._sample_double_buffered`, with the recurrent states of
+        each group of workers propagated separately.
+        """
+        config = self.config
+        storage = self.storage
+        step_timings = [[] for _ in range(self.num_workers)]
+        groups = self._worker_groups()
+        states = list(self.states)
+        rewards = np.zeros(self.num_workers)
+        terminals = np.zeros(self.num_workers, dtype=bool)
+        prediction = None
+
+        with torch.no_grad():
+            for step in range(config.rollout_length + 1):
+                next_states = list(states)
+                group_predictions = []
+                next_recurrent_states = tuple(torch.empty_like(rstate) for rstate in self.recurrent_states)
+                for indices in groups:
+                    if step > 0:
+                        obs, rewards[indices], terminals[indices], infos = self.task.step_wait(indices)
+                        self._record_step_timings(step_timings, indices, infos)
+                        for i, o in zip(indices, obs):
+                            next_states[i] = o
+                        # zero out lstm states for finished environments
+                        for idx in indices:
+                            if terminals[idx]:
+                                for rstate in self.recurrent_states:
+                                    rstate[:, idx].zero_()
+                    if step < config.rollout_length:
+                        group_prediction, group_recurrent_states = self._predict(
+                            [next_states[i] for i in indices],
+                            tuple(rstate[:, indices] for rstate in self.recurrent_states)
+                        )
+                        for rstate, group_rstate in zip(next_recurrent_states, group_recurrent_states):
+                            rstate[:, indices] = group_rstate
+                        group_predictions.append(group_prediction)
+                        self.task.step_async(to_np(group_prediction['a']), indices)
+
+                if step > 0:
+                    self.total_steps += self.num_workers
+                    self.total_rewards += rewards
+                    for idx, done in enumerate(terminals):
+                        if done:
+                            logging.info(f'logging episodic return train... {self.total_steps}')
+                            self.train_logger.add_scalar('episodic_return_train', self.total_rewards[idx], self.total_steps)
+                            self.total_rewards[idx] = 0.
+
+                    storage.append(prediction)
+                    storage.append({
+                        'states': states,
+                        'terminals': torch.tensor(terminals).unsqueeze(-1).to(device),
+                        'r': torch.tensor(rewards).unsqueeze(-1).to(device),
+                        'm': torch.tensor(1 - terminals).unsqueeze(-1).to(device)
+                        })
+                if step < config.rollout_length:
+                    #add recurrent states (lstm hidden and lstm cell states) to storage
+                    storage.append({f'recurrent_states_{i}' : rstate for i, rstate in enumerate(self.recurrent_states)})
+                    prediction = self._merge_predictions(group_predictions)
+                    self.recurrent_states = next_recurrent_states
+                states = next_states
+
+        self._log_step_timings(step_timings)
         self.states = states
 
-        prediction, _ = self.network(states, self.recurrent_states)
+        prediction, _ = self._predict(states, self.recurrent_states)
         self.prediction = prediction
 
-        storage.append(prediction)
\ No newline at end of file
+        storage.append(prediction)
@@ -5,11 +5,17 @@ Base_agent
 import torch
 import time
 import logging
+import copy
+import random
 import numpy as np
-from conformer_rl.utils import current_time, load_model, save_model, mkdir, to_np
+from concurrent.futures import ThreadPoolExecutor
+from conformer_rl.utils import current_time, load_model, save_model, load_state, save_state, mkdir, to_np
 from conformer_rl.logging import TrainLogger, EnvLogger
 from conformer_rl.agents.storage import Storage
 from conformer_rl.config import Config
+from conformer_rl.models.inference import InferenceMixin
+
+from typing import Any
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
 class BaseAgent:
@@ -36,12 +42,23 @@ class BaseAgent:
         Total number of environment interactions/steps taken by the agent.
     storage : :class:`~conformer_rl.agents.storage.Storage`
         Used to save environment samples, analogous to a replay buffer.
+    behavior_network : torch.nn.Module or None
+        A copy of the network predicting the actions in place of the trained network when sampling and evaluating, for agents
+        sampling with earlier weights while training. ``None`` if the actions are predicted by the trained network.
+    checkpoint_path : str
+        The file to which checkpoints are saved every ``checkpoint_interval`` steps, which does not depend on the time
+        the training session was started, so that a restarted session can resume from it with :meth:`load_checkpoint`.
 
     """
+    behavior_network = None
+
     def __init__(self, config: Config):
         self.config = config
         self.task = config.train_env # gym environment wrapper
         self.num_workers = self.task.num_envs
+        if config.lite_train_info:
+            # training infos are not logged, so avoid copying and transferring the conformers of each episode
+            self.task.env_method('set_info_mode', 'lite')
 
         self.dir = config.data_dir
         self.unique_tag = f'{config.tag}_{current_time()}'
@@ -53,40 +70,107 @@ class BaseAgent:
 
         self.network = config.network
         self.optimizer = config.optimizer_fn(self.network.parameters())
+        if config.compile_inference and isinstance(self.network, InferenceMixin):
+            self.network.compile_inference()
+
+        self.checkpoint_path = self.dir + '/' + 'checkpoints' + '/' + config.tag + '.checkpoint'
+        self.checkpoint_writer = ThreadPoolExecutor(max_workers=1)
+        self.pending_checkpoint = None
 
     def run_steps(self) -> None:
         """ Trains the agent.
 
         Trains the agent until the maximum number of steps (specified by config) is reached.
-        Also periodically saves neural network parameters and performs evaluations on the agent,
+        Also periodically saves checkpoints and neural network parameters and performs evaluations on the agent,
         if specified in the config.
         """
         config = self.config
+        # the number of steps before the previous iteration, so that the periodic actions below are performed whenever the number of steps
+        # reaches or passes a multiple of their interval, since some agents take a varying number of steps in each iteration
+        previous_steps = self.total_steps - 1
 
         while self.total_steps < config.max_steps:
-            if config.save_interval > 0 and self.total_steps % config.save_interval == 0:
+            if self._interval_reached(config.checkpoint_interval, previous_steps):
+                self.save_checkpoint(self.checkpoint_path)
+
+            if self._interval_reached(config.save_interval, previous_steps):
                 path = self.dir + '/' + 'models' + '/' + self.unique_tag
                 mkdir(path)
                 self.save(path + '/' +  str(self.total_steps) + '.model')
 
-            if config.eval_interval > 0 and self.total_steps % config.eval_interval == 0:
+            if self._interval_reached(config.eval_interval, previous_steps):
                 eval_start = time.time()
                 self.evaluate()
                 logging.debug(f'Eval at step {self.total_steps}, eval duration: {time.time() - eval_start} seconds')
 
+            previous_steps = self.total_steps
             step_start = time.time()
             logging.debug(f'Starting agent step {self.total_steps}')
             self.step()
             logging.debug(f'agent step completed in {time.time() - step_start} seconds')
 
+        self.wait_for_checkpoint()
         self.task.close()
 
+    def _interval_reached(self, interval: int, previous_steps: int) -> bool:
+        """Returns whether a periodic action with the given `interval` (in steps) is due, which is the case if a multiple of `interval`
+        lies between `previous_steps` (exclusive) and the current number of steps (inclusive). Actions with an `interval` of 0 are never due.
+        """
+        return interval > 0 and self.total_steps // interval > previous_steps // interval
+
     def step(self) -> None:
         """Performs one iteration of acquiring samples on the environment
         and then trains on the acquired samples.
         """
         raise NotImplementedError
 
+    def _autocast(self) -> torch.autocast:
+        """Returns a context manager running the network under autocast with ``config.autocast_dtype`` on the device of the agent,
+        which is disabled if ``config.autocast_dtype`` is ``None``.
+        """
+        dtype = self.config.autocast_dtype
+        return torch.autocast(device.type, dtype=dtype, enabled=dtype is not None)
+
+    def _predict(self, *args: Any) -> Any:
+        """Runs the network on `args` for sampling or evaluation.
+
+        The network is :attr:`behavior_network` if there is one, and the trained network otherwise. When gradients are disabled and
+        the network is a :class:`~conformer_rl.models.inference.InferenceMixin`, the network is run through its inference fast path,
+        otherwise its forward pass is called directly.
+        """
+        network = self.network if self.behavior_network is None else self.behavior_network
+        if not torch.is_grad_enabled() and isinstance(network, InferenceMixin):
+            return network.inference(*args)
+        return network(*args)
+
+    @staticmethod
+    def _record_step_timings(step_timings: list, indices: list, infos: tuple) -> None:
+        """Appends the step timings reported in the info dicts of the workers with the given `indices` to their lists in `step_timings`
+        (see :meth:`~conformer_rl.environments.conformer_env.ConformerEnv.step`). Info dicts without step timings are ignored.
+        """
+        for i, info in zip(indices, infos):
+            timings = info.get('step_info', {}).get('timings') if isinstance(info, dict) else None
+            if timings:
+                step_timings[i].append(timings)
+
+    def _log_step_timings(self, step_timings: list) -> None:
+        """Logs the percentiles of the step timings collected by :meth:`_record_step_timings` during a sampling iteration.
+
+        For each phase of the steps, the percentiles over the steps of all workers are logged as ``step_time/<phase>``, and for
+        each worker, the percentiles of the total time of its steps are logged as ``step_time/worker_<index>``, so that expensive
+        phases and slow workers can be identified.
+        """
+        phases = {}
+        for i, worker_timings in enumerate(step_timings):
+            if not worker_timings:
+                continue
+            for timings in worker_timings:
+                for phase, elapsed in timings.items():
+                    phases.setdefault(phase, []).append(elapsed)
+            self.train_logger.add_percentiles(f'step_time/worker_{i}', [timings.get('total', 0.) for timings in worker_timings], self.total_steps)
+        for phase, values in phases.items():
+            self.train_logger.add_percentiles(f'step_time/{phase}', values, self.total_steps)
+
     def _eval_episode(self) -> dict:
         """Evalutes the agent on a single episode of the evaluation environment.
 
@@ -103,7 +187,7 @@ class BaseAgent:
 
         with torch.no_grad():
             while not done:
-                prediction = self.network(state)
+                prediction = self._predict(state)
                 action = prediction['a']
                 state, reward, done, info = env.step(to_np(action))
                 self.eval_logger.log_step(info[0]['step_info'])
@@ -113,17 +197,25 @@ class BaseAgent:
         """Evaluates the agent on the evaluation environment.
 
         Information dict returned by the environment's :meth:`conformer_rl.environments.conformer_env.ConformerEnv.step` method
-        is logged by the `eval_logger` and saved.
-        """
-        returns = []
-        for ep in range(self.config.eval_episodes):
-            ep_info = self._eval_episode()
-            returns.append(ep_info["total_rewards"])
-            
-            self.eval_logger.log_episode(ep_info)
-            path = f'agent_step_{self.total_steps}' + '/' + f'ep_{ep}'
-            self.eval_logger.save_episode(path, save_molecules=True)
-            self.train_logger.add_scalar('episodic_return_eval', np.mean(returns), self.total_steps)
+        is logged by the `eval_logger` and saved. If ``lite_train_info`` is set in the config, the evaluation environment is set to the ``'full'``
+        info mode (see :meth:`conformer_rl.environments.conformer_env.ConformerEnv.set_info_mode`) during the evaluation and then restored to its
+        previous mode, so that an evaluation environment shared with training returns to the ``'lite'`` info mode.
+        """
+        eval_env = self.config.eval_env
+        previous_modes = eval_env.env_method('set_info_mode', 'full') if self.config.lite_train_info else []
+        try:
+            returns = []
+            for ep in range(self.config.eval_episodes):
+                ep_info = self._eval_episode()
+                returns.append(ep_info["total_rewards"])
+
+                self.eval_logger.log_episode(ep_info)
+                path = f'agent_step_{self.total_steps}' + '/' + f'ep_{ep}'
+                self.eval_logger.save_episode(path, save_molecules=True)
+                self.train_logger.add_scalar('episodic_return_eval', np.mean(returns), self.total_steps)
+        finally:
+            for i, mode in enumerate(previous_modes):
+                eval_env.env_method('set_info_mode', mode, indices=[i])
 
     def load(self, filename: str) -> None:
         """Loads the neural network with weights.
@@ -134,6 +226,83 @@ class BaseAgent:
             The path where the neural network weights are saved.
         """
         load_model(self.network, filename)
+        if self.behavior_network is not None:
+            self.behavior_network.load_state_dict(self.network.state_dict())
+
+    def state_dict(self) -> dict:
+        """Returns the complete state of the agent, from which :meth:`load_state_dict` resumes training exactly.
+
+        The state consists of the weights of the network, the state of the optimizer, the number of steps, the states of the random
+        number generators and the states of the training environments (see
+        :meth:`~conformer_rl.environments.conformer_env.ConformerEnv.get_state`). Subclasses add the state they carry over between
+        iterations, such as the current observations. The returned state refers to the tensors of the agent rather than copying them.
+        """
+        return {
+            'network': self.network.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'total_steps': self.total_steps,
+            'random_states': {
+                'python': random.getstate(),
+                'numpy': np.random.get_state(),
+                'torch': torch.get_rng_state(),
+                'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+            },
+            'envs': self.task.env_method('get_state'),
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        """Restores the state of the agent returned by :meth:`state_dict`, for an agent created with the same configuration.
+        """
+        self.network.load_state_dict(state['network'])
+        if self.behavior_network is not None:
+            self.behavior_network.load_state_dict(self.network.state_dict())
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.total_steps = state['total_steps']
+        # vector environments whose environments run elsewhere, such as remote actors, return None in place of their states
+        for i, env_state in enumerate(state['envs']):
+            if env_state is not None:
+                self.task.env_method('set_state', env_state, indices=[i])
+
+        # restored last, since environments in the same process share the global Numpy random number generator
+        random_states = state['random_states']
+        random.setstate(random_states['python'])
+        np.random.set_state(random_states['numpy'])
+        torch.set_rng_state(random_states['torch'])
+        if random_states['cuda'] is not None and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(random_states['cuda'])
+
+    def save_checkpoint(self, filename: str) -> None:
+        """Saves the complete state of the agent (see :meth:`state_dict`) to a file from a background thread.
+
+        The state is copied before returning, so that training continues while it is written. The file is written
+        atomically with :func:`~conformer_rl.utils.misc_utils.save_state`, so that it always holds a complete checkpoint even if
+        training is interrupted while writing. A previous checkpoint still being written is waited for first.
+
+        Parameters
+        ----------
+        filename : str
+            The path where the checkpoint is saved.
+        """
+        self.wait_for_checkpoint()
+        state = copy.deepcopy(self.state_dict())
+        self.pending_checkpoint = self.checkpoint_writer.submit(save_state, state, filename)
+
+    def wait_for_checkpoint(self) -> None:
+        """Waits until the checkpoint being written by :meth:`save_checkpoint`, if any, is saved, raising any error from writing it.
+        """
+        if self.pending_checkpoint is not None:
+            pending_checkpoint, self.pending_checkpoint = self.pending_checkpoint, None
+            pending_checkpoint.result()
+
+    def load_checkpoint(self, filename: str) -> None:
+        """Resumes the agent from a checkpoint saved by :meth:`save_checkpoint`.
+
+        Parameters
+        ----------
+        filename : str
+            The path where the checkpoint is saved.
+        """
+        self.load_state_dict(load_state(filename))
 
     def save(self, filename: str) -> None:
         """ Saves the neural network weights to a file.
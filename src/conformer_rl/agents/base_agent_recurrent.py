@@ -43,7 +43,7 @@ class BaseAgentRecurrent(BaseAgent):
 
         """
         with torch.no_grad():
-            prediction, rstates = self.network(state, rstates)
+            prediction, rstates = self._predict(state, rstates)
 
             return prediction['a'], rstates
 
@@ -47,7 +47,8 @@ class ExternalCurriculumAgentMixin():
         # sample 
         self.storage.reset()
         sample_start = time.time()
-        self._sample()
+        with self._autocast():
+            self._sample()
         logging.debug(f'sample time: {time.time() - sample_start} seconds')
 
         # update curriculum
@@ -59,6 +60,18 @@ class ExternalCurriculumAgentMixin():
         self._train()
         logging.debug(f'train time: {time.time() - train_start} seconds')
 
+    def state_dict(self) -> dict:
+        """Returns the complete state of the agent, including the rewards of the episodes since the last change of the curriculum level.
+        The curriculum levels themselves are part of the states of the environments.
+        """
+        state = super().state_dict()
+        state['reward_buffer'] = list(self.reward_buffer)
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        self.reward_buffer = deque(state['reward_buffer'], maxlen=self.curriculum_buffer_len)
+
     def update_curriculum(self) -> None:
         """Evaluates the current performance of the agent and signals the environment to
         increase the level (difficulty) or decrease it depending on the agent's performance.
@@ -71,8 +84,8 @@ class ExternalCurriculumAgentMixin():
         to increase the difficulty of the curriculum. This is done by calling the ``increase_level`` method of the environment.
         If the ratio is less than the ``curriculum_agent_fail_rate`` parameter, the environment is told to decrease the difficulty.
         """
-        current_terminals = torch.cat(self.storage['terminals']).squeeze()
-        current_rewards = torch.cat(self.storage['r']).squeeze()
+        current_terminals = self.storage.order('terminals').squeeze()
+        current_rewards = self.storage.order('r').squeeze()
         self.reward_buffer.extend(current_rewards[current_terminals == True].tolist())
 
         if len(self.reward_buffer) >= self.curriculum_buffer_len:
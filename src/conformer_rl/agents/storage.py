@@ -6,11 +6,21 @@ Storage utility class for agents.
 
 """
 
+import numpy as np
 import torch
 
+from typing import Any, Optional, Sequence, Union
+
 class Storage:
     """Saves and stores experiences from the agent.
 
+    Tensors appended with the same key are written into a buffer of shape ``(rollout + 1, *item_shape)``, which is
+    allocated on the first append and reused after each :meth:`reset` as long as the shape, dtype and device of the
+    items do not change, so that no memory is allocated while sampling and :meth:`order` does not need to stack the items.
+    Lists with one item per worker, such as observations, are packed into object arrays of shape ``(rollout + 1, workers)`` in
+    the same way. Tensors attached to the autograd graph, as sampled by A2C agents, and items that do not fit the buffer of
+    their key within an iteration are kept in lists instead.
+
     Parameters
     ----------
     rollout : int
@@ -18,13 +28,20 @@ class Storage:
     workers : int
         The number of workers used for sampling by the agent.
 
+    Attributes
+    ----------
+    storage : dict from str to torch.Tensor, numpy.ndarray or list
+        The items stored since the last reset for each key, as views of the buffers or as lists.
+
     """
     def __init__(self, rollout: int, workers: int):
         self.storage = {}
         self.rollout = rollout
         self.workers = workers
+        self._buffers = {}
+        self._counts = {}
 
-    def __getitem__(self, key: str) -> list:
+    def __getitem__(self, key: str) -> Union[torch.Tensor, np.ndarray, list]:
         """Returns all batched items in storage with the given `key`.
 
         :meta public:
@@ -36,9 +53,9 @@ class Storage:
 
         Returns
         -------
-        list
-            A list of all the items with the associated `key` 
-            previously appended to the storage.
+        torch.Tensor, numpy.ndarray or list
+            The items with the associated `key` previously appended to the storage, indexed by the order
+            in which they were appended.
 
 
         """
@@ -53,9 +70,55 @@ class Storage:
             The items to be appended.
         """
         for key, val in data.items():
-            self.storage.setdefault(key, []).append(val)
-
-    def order(self, key:str) -> list:
+            count = self._counts.get(key, 0)
+            if isinstance(self.storage.get(key), list) or count > self.rollout:
+                self._append_to_list(key, val)
+                continue
+            buffer = self._buffer(key, val)
+            if buffer is None:
+                self._append_to_list(key, val)
+                continue
+            if torch.is_tensor(buffer):
+                buffer[count].copy_(val)
+            else:
+                buffer[count, :] = _packed(val)
+            self._counts[key] = count + 1
+            self.storage[key] = buffer[:count + 1]
+
+    def _buffer(self, key: str, val: Any) -> Optional[Union[torch.Tensor, np.ndarray]]:
+        """Returns the buffer of `key` if `val` fits it, allocating it at the start of an iteration if necessary, or None if `val`
+        must be kept in a list.
+        """
+        buffer = self._buffers.get(key)
+        if torch.is_tensor(val):
+            if val.requires_grad and torch.is_grad_enabled():
+                return None
+            fits = torch.is_tensor(buffer) and buffer.shape[1:] == val.shape and buffer.dtype == val.dtype and buffer.device == val.device
+            shape = val.shape
+            allocate = lambda: torch.empty((self.rollout + 1, *shape), dtype=val.dtype, device=val.device)
+        elif isinstance(val, (list, tuple)) and len(val) == self.workers:
+            fits = isinstance(buffer, np.ndarray)
+            allocate = lambda: np.empty((self.rollout + 1, self.workers), dtype=object)
+        else:
+            return None
+
+        if fits:
+            return buffer
+        if self._counts.get(key, 0) > 0:
+            # the items of this iteration do not have a common shape
+            return None
+        self._buffers[key] = allocate()
+        return self._buffers[key]
+
+    def _append_to_list(self, key: str, val: Any) -> None:
+        items = self.storage.setdefault(key, [])
+        if not isinstance(items, list):
+            # the items are copied out of the buffer, which is overwritten in the next iteration
+            items = self.storage[key] = [item.clone() if torch.is_tensor(item) else list(item) for item in items]
+        items.append(val)
+        self._counts[key] = len(items)
+
+    def order(self, key:str) -> Union[torch.Tensor, list]:
         """Splits each batch of items associated with `key` by worker, and then
         orders the items into a list sorted firstly by worker and secondly by the
         order the items were appended to storage.
@@ -67,8 +130,9 @@ class Storage:
 
         Returns
         -------
-        list
-            The list of the items, split by batch and ordered.
+        torch.Tensor or list
+            The items, split by batch and ordered. Tensors are returned as a single tensor
+            whose second to last dimension indexes the ordered items.
 
         Notes
         -----
@@ -89,21 +153,39 @@ class Storage:
 
         The purpose of this ordering is to maintain chronologically consecutive blocks of rollout samples,
         which is useful for agents with recursive components.
+
+        For items kept in buffers, the ordering is a transposition of the buffer followed by a single copy.
         """
-        if torch.is_tensor(self.storage[key][0]):
-            ordered = torch.stack(self.storage[key][:self.rollout], -2)
+        items = self.storage[key]
+        if torch.is_tensor(items):
+            ordered = items[:self.rollout].movedim(0, -2)
+            shape = ordered.shape
+            return ordered.reshape(*shape[:-3], self.rollout * self.workers, shape[-1])
+        elif isinstance(items, np.ndarray):
+            return items[:self.rollout].T.reshape(-1).tolist()
+        elif torch.is_tensor(items[0]):
+            ordered = torch.stack(items[:self.rollout], -2)
             shape = ordered.shape
             ordered = ordered.view(*shape[:-3], self.rollout * self.workers, shape[-1])
             return ordered
         else:
             ordered = []
             for i in range(self.workers):
-                ordered += [self.storage[key][j][i] for j in range(self.rollout)]
+                ordered += [items[j][i] for j in range(self.rollout)]
             return ordered
 
 
     def reset(self) -> None:
         """Empties the storage.
 
+        The buffers are kept for the next iteration.
         """
-        self.storage = {}
\ No newline at end of file
+        self.storage = {}
+        self._counts = {}
+
+def _packed(items: Sequence) -> np.ndarray:
+    # avoids numpy interpreting tuples, such as observations of graphs and torsions, as additional dimensions
+    packed = np.empty(len(items), dtype=object)
+    for i, item in enumerate(items):
+        packed[i] = item
+    return packed
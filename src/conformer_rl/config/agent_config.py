@@ -37,16 +37,46 @@ class Config:
     save_interval : int, required by all agents
         How often (in environment steps) to save neural network parameters. If set to 0,
         parameters will not be saved.
+    checkpoint_interval : int
+        How often (in environment steps) to save a checkpoint of the complete state of the agent to
+        ``data_dir/checkpoints/tag.checkpoint``, from which training can be resumed with
+        :meth:`~conformer_rl.agents.base_agent.BaseAgent.load_checkpoint`. Each checkpoint replaces the previous one. If set to 0,
+        checkpoints will not be saved. Defaults to 0.
     eval_interval : int, required by all agents
         How often to evaluate the agent on the eval environment.
     eval_episodes : int, required by all agents
         How many episodes to evaluate the agent during each evaluation.
     recurrence : int, required by recurrent agents
         Number of steps taken before resetting recurrent states when training agent/updating network weights.
+    recurrent_sequence_training : bool
+        Whether the recurrent PPO agent evaluates all `recurrence` steps of the sequences in a minibatch with a single call to the network,
+        passing the steps through the recurrent units as a sequence, instead of calling the network once for each step. Only applies to the
+        networks accepting several consecutive steps for each recurrent state, :class:`~conformer_rl.models.RTGN_recurrent.RTGNRecurrent` and
+        :class:`~conformer_rl.models.RTGN_GAT_recurrent.RTGNGatRecurrent`. Other networks are always called once for each step. Defaults to ``True``.
     optimization_epochs : int
         Number of epochs for training each minibatch. Used for PPO and PPORecurrent agents.
     mini_batch_size : int
         Size of each mini batch to train on. Used for PPO and PPORecurrent agents.
+    double_buffer_sampling : bool
+        Whether to split the workers into two groups during sampling, so that the network runs on the observations of one group
+        while the environments of the other group are being stepped. Requires a training environment supporting ``step_async`` and
+        ``step_wait`` for subsets of the environments, such as the ``'simple'``, ``'batched'`` and ``'shared_memory'`` backends of
+        :func:`~conformer_rl.environments.environment_wrapper.Task`. Defaults to ``False``.
+    straggler_tolerant_sampling : bool
+        Whether to collect the samples of each sampling iteration from whichever workers finish their steps first, instead of
+        stepping all workers in lockstep. Used by non-recurrent agents, and takes precedence over `double_buffer_sampling`. Recurrent agents
+        raise a ``ValueError`` if it is set.
+        Requires a training environment supporting ``step_async`` and ``step_wait_any``, such as the ``'threads'``, ``'batched'`` and
+        ``'shared_memory'`` backends of :func:`~conformer_rl.environments.environment_wrapper.Task`. Defaults to ``False``.
+    lite_train_info : bool
+        Whether the training environment is set to the ``'lite'`` info mode (see
+        :meth:`~conformer_rl.environments.conformer_env.ConformerEnv.set_info_mode`), which skips copying the conformers of each episode
+        into the info dicts, since these are not logged during training. Requires training and evaluation environments implementing
+        ``set_info_mode``, such as :class:`~conformer_rl.environments.conformer_env.ConformerEnv`. Defaults to ``False``.
+    overlapped_sampling : bool
+        Whether to collect the samples of each iteration in a background thread while training on the samples of the previous
+        iteration, with weights one update behind the trained weights. Used by :class:`~conformer_rl.agents.PPO.PPO_agent.PPOAgent`.
+        Defaults to ``False``.
 
     discount : float, required by all agents.
         Discount factor (often denoted by γ) used for advantage estimation.
@@ -55,6 +85,17 @@ class Config:
         SARSA update.
     gae_lambda : float, required by all agents if `use_gae` is ``True``
         The λ parameter used by the generalized advantage estimator (gae). See [1]_ for details.
+    advantage_dtype : torch.dtype, required by all agents
+        The dtype in which the advantages and returns are computed. Defaults to ``torch.float32``.
+    autocast_dtype : torch.dtype or None
+        If not ``None``, the network is run under ``torch.autocast`` with this dtype, such as ``torch.bfloat16`` on CPUs with
+        native bfloat16 support, when sampling and in the forward passes of training. The action distributions, values and recurrent
+        states output by the networks in :mod:`conformer_rl.models`, as well as the losses and advantages, remain in float32.
+        Defaults to ``None``.
+    compile_inference : bool
+        Whether to compile the network for sampling and evaluation with
+        :meth:`~conformer_rl.models.inference.InferenceMixin.compile_inference`, if it supports it. Compilation takes
+        place during the first sampling steps and is repeated for new input shapes, so it pays off for long training runs. Defaults to ``False``.
     entropy_weight : float, required by all agents
         Coefficient for the entropy when calculating total loss.
     value_loss_coefficient : float, required by all agents
@@ -63,6 +104,8 @@ class Config:
         Max norm for clipping gradients for neural network.
     ppo_ratio_clip : float, required by PPO and PPORecurrent agents.
         Clipping parameter ε for PPO algorithm, see [2]_ for details.
+    importance_weight_clip : float, required by the :class:`~conformer_rl.agents.actor_learner.ActorLearnerPPOAgent`
+        Truncation threshold for the importance weights correcting the advantages of samples collected by actors with outdated weights.
 
     curriculum_agent_buffer_len : int, required by all curriculum agents
         The number of most recent completed episodes in which to evaluate the agent on for curriculum learning.
@@ -111,20 +154,30 @@ class Config:
         self.rollout_length = 20
         self.max_steps = 50000
         self.save_interval = 0
+        self.checkpoint_interval = 0
         self.eval_interval = 0
         self.eval_episodes = 1
         self.recurrence = 2
+        self.recurrent_sequence_training = True
         self.optimization_epochs = 4
         self.mini_batch_size = 24
+        self.double_buffer_sampling = False
+        self.straggler_tolerant_sampling = False
+        self.lite_train_info = False
+        self.overlapped_sampling = False
 
         # training hyperparameters
         self.discount = 0.9999
         self.use_gae = True
         self.gae_lambda = 0.95
+        self.advantage_dtype = torch.float32
+        self.autocast_dtype = None
+        self.compile_inference = False
         self.entropy_weight = 0.001
         self.value_loss_weight = 0.25
         self.gradient_clip = 0.5
         self.ppo_ratio_clip = 0.2
+        self.importance_weight_clip = 1.0
 
         # curriculum hyperparameters
         self.curriculum_agent_buffer_len = 20
@@ -29,6 +29,44 @@ class MolConfig:
     pruning_thresh : float, required for environments that use pruning.
         The minimum allowed TFD (torsional fingerprint deviation) between conformers when pruning.
 
+    relax_mode : str
+        How conformers are relaxed with MMFF after each action. One of:
+
+        * ``'fast'``: relaxation is limited by ``relax_max_iters`` and ignores non-bonded interactions beyond
+          ``relax_non_bonded_thresh``. Intended for training.
+        * ``'exact'``: conformers are relaxed with all non-bonded interactions until convergence (up to ``relax_exact_max_iters`` iterations).
+          Intended for evaluation.
+
+        In both modes, the energy of the relaxed conformer used for the reward is evaluated with the full MMFF force field, like
+        :func:`~conformer_rl.utils.chem_utils.get_conformer_energy` and the normalizing parameters ``E0`` and ``Z0``, unless
+        ``relax_cutoff_energy`` is set.
+    relax_max_iters : int
+        Maximum number of MMFF iterations for relaxing a conformer in ``'fast'`` mode.
+    relax_exact_max_iters : int
+        Maximum number of MMFF iterations for relaxing a conformer in ``'exact'`` mode.
+    relax_force_tol : float
+        Convergence tolerance on the gradient for relaxation.
+    relax_energy_tol : float
+        Convergence tolerance on the energy change between iterations for relaxation.
+    relax_non_bonded_thresh : float
+        Threshold (in angstroms) for excluding long-range non-bonded interactions during relaxation in ``'fast'`` mode.
+    relax_restrain_torsions : bool
+        Whether the torsions set by the action are restrained to their new angles during relaxation.
+    relax_torsion_force_constant : float
+        Force constant of the torsion restraints used if ``relax_restrain_torsions`` is ``True``.
+    relax_cutoff_energy : bool
+        Whether the energy of relaxed conformers used for the reward is evaluated with the force field used for relaxing them, which
+        ignores non-bonded interactions beyond the non-bonded threshold of the relaxation, instead of the full MMFF force field. This
+        saves an energy evaluation per step, but the rewards are then inconsistent with ``E0`` and ``Z0`` computed with the full force field.
+    action_cache_size : int
+        Maximum number of outcomes of discrete actions cached by
+        :class:`~conformer_rl.environments.environment_components.action_mixins.DiscreteActionMixin`.
+        When an action is repeated from the same starting geometry, the cached relaxed coordinates and energy are reused
+        instead of relaxing the conformer again. If set to 0, no outcomes are cached.
+    action_cache_decimals : int
+        Number of decimals (in angstroms) to which the starting geometry is rounded when looking up cached action outcomes.
+        Starting geometries that agree up to this precision share their cached outcome.
+
     References
     ----------
     .. [1] `TorsionNet paper <https://arxiv.org/abs/2006.07078>`_
@@ -47,3 +85,23 @@ class MolConfig:
 
         # Parameters used for pruning 
         self.pruning_thresh = 0.05
+
+        # Parameters for MMFF relaxation of conformers
+        self.relax_mode = 'fast'
+        self.relax_max_iters = 500
+        self.relax_exact_max_iters = 10000
+        self.relax_force_tol = 1e-4
+        self.relax_energy_tol = 1e-6
+        self.relax_non_bonded_thresh = 10.
+        self.relax_restrain_torsions = False
+        self.relax_torsion_force_constant = 100.
+        self.relax_cutoff_energy = False
+
+        # Cache of discrete action outcomes
+        self.action_cache_size = 0
+        self.action_cache_decimals = 2
+
+    def __setstate__(self, state):
+        # fill in defaults for attributes missing from configs pickled by older versions
+        self.__init__()
+        self.__dict__.update(state)
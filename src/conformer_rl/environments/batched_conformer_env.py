@@ -0,0 +1,171 @@
+"""
+Batched_conformer_env
+=====================
+"""
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from rdkit.Chem import AllChem
+
+from conformer_rl.environments.curriculum_conformer_env import CurriculumConformerEnv
+from conformer_rl.environments.simple_vec_env import reset_env, add_step_timings
+from conformer_rl.environments.environment_components.action_mixins import MMFFRelaxationMixin
+from conformer_rl.utils import timed
+
+from typing import Any, Callable, List, Tuple
+
+class BatchedConformerEnv:
+    """Vector environment that relaxes the conformers of all of its environments together on native threads.
+
+    All wrapped environments must be conformer environments whose action handler inherits from
+    :class:`~conformer_rl.environments.environment_components.action_mixins.MMFFRelaxationMixin`, such as the
+    pre-built environments in :mod:`~conformer_rl.environments.environments`. In each step, the actions of all environments
+    are first applied to their conformers, which are then relaxed concurrently with ``MMFFOptimizeMoleculeConfs``, which releases the GIL.
+    The relaxed coordinates, energies and convergence statuses are handed to the environments, which then compute their observations
+    and rewards as usual, so that the results are identical to stepping the environments separately.
+
+    Environments with an action cache (see :meth:`~conformer_rl.environments.environment_components.action_mixins.DiscreteActionMixin.lookup_action`)
+    look up each action before its torsions are set, so that cached outcomes are neither relaxed nor submitted to the threads.
+
+    The relaxations can also be started with :meth:`step_async` and collected with :meth:`step_wait` for a subset of the
+    environments, so that the caller can run other work, such as inference on the observations of the remaining environments,
+    while the conformers are being relaxed.
+
+    After each reset, environments supporting it prefetch the starting state of their next episode in the background (see
+    :meth:`~conformer_rl.environments.curriculum_conformer_env.CurriculumConformerEnv.prefetch_reset`). The total time spent by each
+    environment on resets is accumulated in the ``reset_wait_times`` attribute.
+
+    The step timings reported by the environments (see :meth:`~conformer_rl.environments.conformer_env.ConformerEnv.step`) include the
+    time spent on setting the torsions and relaxing the conformers outside of the environments, and the time spent on resets (``'reset'``).
+
+    Parameters
+    ----------
+    env_fns : list of callables returning :class:`~conformer_rl.environments.conformer_env.ConformerEnv`
+        Functions for constructing each environment.
+    num_threads : int
+        The number of threads used for relaxing the conformers. If set to 0, the number of CPUs of the system is used.
+
+    Notes
+    -----
+    The conformers are relaxed one molecule per call rather than as the conformers of a single molecule, since for a molecule with
+    several conformers RDKit selects the non-bonded interactions within ``relax_non_bonded_thresh`` for all conformers based on the
+    first conformer, which would change the relaxed geometries.
+
+    ``MMFFOptimizeMoleculeConfs`` does not support custom convergence tolerances or torsion restraints, so the environments must use the
+    default ``relax_force_tol`` and ``relax_energy_tol`` and must not set ``relax_restrain_torsions``.
+    """
+    def __init__(self, env_fns: List[Callable[[], Any]], num_threads: int = 0):
+        self.envs = [fn() for fn in env_fns]
+        self.num_envs = len(env_fns)
+        self.num_threads = num_threads or os.cpu_count()
+        self.pool = ThreadPoolExecutor(max_workers=self.num_threads)
+        self.pending = {}
+        self.reset_wait_times = np.zeros(self.num_envs)
+
+        for env in self.envs:
+            env = env.unwrapped
+            if not isinstance(env, MMFFRelaxationMixin) or isinstance(env, CurriculumConformerEnv):
+                raise ValueError('BatchedConformerEnv requires non-curriculum conformer environments using MMFFRelaxationMixin')
+            self._relaxation_params(env.config)
+
+    def step(self, actions: List[Any]) -> Tuple[tuple, np.ndarray, np.ndarray, tuple]:
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions: List[Any], indices: List[int] = None) -> None:
+        """Applies the actions to the environments with the given `indices` (all environments if not specified) and starts
+        relaxing their conformers in the background.
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        for i, action in zip(indices, actions):
+            env = self.envs[i].unwrapped
+            timings = {}
+            if self._lookup_action(env, action):
+                self.pending[i] = (action, None, timings)
+                continue
+            with timed(timings, 'torsions'):
+                env._set_torsions(env.conf, action)
+            self.pending[i] = (action, self.pool.submit(self._timed_relax, env, timings), timings)
+
+    def step_wait(self, indices: List[int] = None) -> Tuple[tuple, np.ndarray, np.ndarray, tuple]:
+        """Waits for the relaxations started by :meth:`step_async` for the environments with the given `indices`
+        (all environments if not specified) and finishes their steps, returning the results in the order of `indices`.
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        data = []
+        for i in indices:
+            action, future, timings = self.pending.pop(i)
+            if future is not None:
+                self.envs[i].unwrapped.precomputed_relaxation = future.result()
+                timings['total'] = timings['torsions'] + timings['relaxation']
+            obs, rew, done, info = self.envs[i].step(action)
+            if done:
+                obs, timings['reset'] = self._reset(i)
+            add_step_timings(info, timings)
+            data.append([obs, rew, done, info])
+        obs, rew, done, info = zip(*data)
+        return obs, np.asarray(rew), np.asarray(done), info
+
+    @staticmethod
+    def _relaxation_params(config: Any) -> Tuple[int, float]:
+        if config.relax_restrain_torsions or config.relax_force_tol != 1e-4 or config.relax_energy_tol != 1e-6:
+            raise ValueError('BatchedConformerEnv does not support torsion restraints or custom relaxation tolerances')
+        if config.relax_mode == 'exact':
+            return config.relax_exact_max_iters, 100.
+        elif config.relax_mode == 'fast':
+            return config.relax_max_iters, config.relax_non_bonded_thresh
+        else:
+            raise ValueError(f'Unknown relaxation mode {config.relax_mode}')
+
+    @staticmethod
+    def _lookup_action(env: Any, action: Any) -> bool:
+        """Looks up the outcome of `action` in the action cache of `env`, if it has one, returning whether it was found.
+        """
+        return getattr(env, 'action_cache', None) is not None and hasattr(env, 'lookup_action') and env.lookup_action(action)
+
+    @staticmethod
+    def _relax(env: Any) -> Tuple[np.ndarray, bool, float]:
+        """Relaxes the current conformer of `env` and returns the relaxed positions, convergence status and energy.
+        """
+        max_iters, non_bonded_thresh = BatchedConformerEnv._relaxation_params(env.config)
+        not_converged, energy = AllChem.MMFFOptimizeMoleculeConfs(env.mol, numThreads=1, maxIters=max_iters, nonBondedThresh=non_bonded_thresh)[0]
+        if not env.config.relax_cutoff_energy:
+            energy = env.mmff_context.calc_energy(env.conf)
+        return env.conf.GetPositions(), not_converged == 0, energy
+
+    @staticmethod
+    def _timed_relax(env: Any, timings: dict) -> Tuple[np.ndarray, bool, float]:
+        with timed(timings, 'relaxation'):
+            return BatchedConformerEnv._relax(env)
+
+    def step_wait_any(self) -> Tuple[List[int], tuple, np.ndarray, np.ndarray, tuple]:
+        """Waits until at least one of the relaxations started by :meth:`step_async` has finished and returns the indices
+        and results of all environments whose relaxations have finished.
+        """
+        futures = [future for _, future, _ in self.pending.values()]
+        if None not in futures:
+            wait(futures, return_when=FIRST_COMPLETED)
+        indices = [i for i, (_, future, _) in self.pending.items() if future is None or future.done()]
+        return (indices, *self.step_wait(indices))
+
+    def reset(self) -> list:
+        return [self._reset(i)[0] for i in range(self.num_envs)]
+
+    def _reset(self, i: int) -> Tuple[Any, float]:
+        obs, elapsed = reset_env(self.envs[i])
+        self.reset_wait_times[i] += elapsed
+        return obs, elapsed
+
+    def close(self) -> None:
+        self.pool.shutdown()
+        for env in self.envs:
+            env.close()
+
+    def render(self) -> list:
+        return [env.render() for env in self.envs]
+
+    def env_method(self, method_name: str, *method_args, indices: List[int] = None, **method_kwargs) -> list:
+        """Calls the method with the given name on the environments with the given `indices` (all environments if not specified).
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        return [getattr(self.envs[i], method_name)(*method_args, **method_kwargs) for i in indices]
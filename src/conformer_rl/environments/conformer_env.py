@@ -5,10 +5,11 @@ Conformer_env
 import numpy as np
 import gym
 import copy
+import time
 
 from rdkit.Chem import AllChem as Chem
 from rdkit.Chem import TorsionFingerprints
-from conformer_rl.utils import get_conformer_energy
+from conformer_rl.utils import get_conformer_energy, MMFFContext, TorsionDriver, LRUCache, timed, set_conformer_positions
 from conformer_rl.config import MolConfig
 
 import logging
@@ -34,10 +35,40 @@ class ConformerEnv(gym.Env):
         Used for keeping track of data obtained at each step of an episode for logging.
     episode_info : dict from str to Any
         Used for keeping track of data useful at the end of an episode, such as total_reward, for logging.
+    mmff_context : :class:`~conformer_rl.utils.chem_utils.MMFFContext`
+        Cached MMFF force field of the molecule, reused for evaluating conformer energies at every step.
+    torsion_driver : :class:`~conformer_rl.utils.chem_utils.TorsionDriver`
+        Sets the rotatable torsions in ``nonring`` of conformers of the molecule.
+    relaxed_energy : float or None
+        Energy of the current conformer published by the action handler after relaxing the conformer in the current step,
+        or None if the action handler did not publish an energy.
+    relaxation_converged : bool or None
+        Whether the relaxation of the current conformer converged, or None if the action handler did not relax the conformer.
+    precomputed_relaxation : tuple or None
+        Relaxation result for the next step computed outside of the environment, used by the action handler instead of
+        relaxing the conformer itself. See :meth:`~conformer_rl.environments.environment_components.action_mixins.MMFFRelaxationMixin._relax`.
+    info_mode : str
+        How the info dict is returned by :meth:`~ConformerEnv.step`, set by :meth:`~ConformerEnv.set_info_mode`. One of:
+
+        * ``'full'``: a deep copy of the info dict, including the episodic mol object containing all conformers of the episode.
+        * ``'lite'``: a shallow copy of the info dict without the episodic mol object, intended for training environments
+          whose info is not logged.
+    graph_topology : :class:`~conformer_rl.environments.environment_components.molecule_features.GraphTopology` or None
+        Cached graph topology of the molecule used by graph observation handlers, or None if not built yet.
+    action_cache : :class:`~conformer_rl.utils.misc_utils.LRUCache` or None
+        Cache of action outcomes used by action handlers that support it, or None if ``action_cache_size`` of the config is 0.
+    pending_cache_entry : tuple or None
+        Cache key and principal frame of the starting geometry of an action whose outcome was not found in ``action_cache``, under which
+        the outcome is stored once the conformer is relaxed, or None. See
+        :meth:`~conformer_rl.environments.environment_components.action_mixins.DiscreteActionMixin.lookup_action`.
+    step_timings : dict from str to float
+        Time (in seconds) spent in each phase of the current step, recorded with :func:`~conformer_rl.utils.misc_utils.timed`. See :meth:`step`.
     
 
     """
     metadata = {'render.modes': ['human']}
+    # attributes that are derived from the molecule, cache results or are set by gym, which are not part of the state of an episode
+    _derived_attributes = ('config', 'mol', 'conf', 'mmff_context', 'nonring', 'torsion_driver', 'graph_topology', 'action_cache', 'spec')
 
     def __init__(self, mol_config: MolConfig):
         gym.Env.__init__(self)
@@ -49,6 +80,14 @@ class ConformerEnv(gym.Env):
 
         self.step_info = {}
         self.episode_info = {}
+        self.relaxed_energy = None
+        self.relaxation_converged = None
+        self.precomputed_relaxation = None
+        self.info_mode = 'full'
+        self.graph_topology = None
+        self.step_timings = {}
+        self.action_cache = LRUCache(self.config.action_cache_size) if self.config.action_cache_size > 0 else None
+        self.pending_cache_entry = None
 
         self.mol = self.config.mol
 
@@ -58,8 +97,10 @@ class ConformerEnv(gym.Env):
             raise Exception('Unable to embed molecule with conformer using rdkit')
 
         self.conf = self.mol.GetConformer()
+        self.mmff_context = MMFFContext(self.mol)
         nonring, ring = TorsionFingerprints.CalculateTorsionLists(self.mol)
         self.nonring = [list(atoms[0]) for atoms, ang in nonring]
+        self.torsion_driver = TorsionDriver(self.mol, self.nonring)
 
         self.reset()
 
@@ -90,26 +131,60 @@ class ConformerEnv(gym.Env):
         Logged parameters:
 
         * reward (float): the reward for the current step
+        * timings (dict from str to float): the time in seconds spent in each phase of the step. ``'action'`` is the time spent
+          by :meth:`_step`, of which action handlers report ``'torsions'`` for setting the torsions and ``'relaxation'`` for relaxing
+          the conformer, ``'obs'`` the time spent by :meth:`_obs`, ``'reward'`` the time spent by :meth:`_reward`, including pruning, and
+          ``'total'`` the time spent by the entire step. Vector environments may add further phases, such as ``'ipc'``.
         """
+        start = time.perf_counter()
         self.action = action
+        self.relaxed_energy = None
+        self.relaxation_converged = None
+        self.step_timings = {}
 
-        self._step(action)
+        with timed(self.step_timings, 'action'):
+            self._step(action)
         self.current_step += 1
 
         assert(self.mol.GetNumConformers() == 1)
 
-        obs = self._obs()
-        reward = self._reward()
+        with timed(self.step_timings, 'obs'):
+            obs = self._obs()
+        with timed(self.step_timings, 'reward'):
+            reward = self._reward()
         self.step_info['reward'] = reward
         self.total_reward += reward
         done = self._done()
-        info = copy.deepcopy(self._info())
+        self.step_timings['total'] = time.perf_counter() - start
+        self.step_info['timings'] = dict(self.step_timings)
+        if self.info_mode == 'full':
+            info = copy.deepcopy(self._info())
+        else:
+            info = {key: {k: v for k, v in val.items() if k != 'mol'} if isinstance(val, dict) else val for key, val in self._info().items()}
 
         logging.info(f"step {self.current_step} reward {reward}")
 
 
         return obs, reward, done, info
         
+    def set_info_mode(self, mode: str) -> str:
+        """Sets how the info dict is returned by :meth:`~ConformerEnv.step`.
+
+        Parameters
+        ----------
+        mode : str
+            Either ``'full'`` or ``'lite'``. See the ``info_mode`` attribute.
+
+        Returns
+        -------
+        str
+            The previous info mode.
+        """
+        if mode not in ('full', 'lite'):
+            raise ValueError(f'Unknown info mode {mode}')
+        previous_mode, self.info_mode = self.info_mode, mode
+        return previous_mode
+
     def reset(self) -> object:
         """Resets the environment and returns the observation of the environment.
         """
@@ -127,6 +202,27 @@ class ConformerEnv(gym.Env):
 
         return obs
 
+    def get_state(self) -> dict:
+        """Returns the state of the environment in the current episode, from which :meth:`set_state` restores it.
+
+        The state consists of the coordinates of the current conformer, the attributes modified by :meth:`step` and :meth:`reset`,
+        such as ``current_step``, ``episode_info`` and the attributes of the reward handlers, and the state of the global Numpy random
+        number generator, which may be specific to the process of the environment.
+        """
+        state = {key: copy.deepcopy(value) for key, value in vars(self).items() if key not in self._derived_attributes and not key.startswith('_')}
+        state['positions'] = self.conf.GetPositions()
+        state['numpy_random_state'] = np.random.get_state()
+        return state
+
+    def set_state(self, state: dict) -> None:
+        """Restores the state of the environment returned by :meth:`get_state`, for an environment created with the same configuration.
+        """
+        state = dict(state)
+        set_conformer_positions(self.conf, state.pop('positions'))
+        np.random.set_state(state.pop('numpy_random_state'))
+        for key, value in state.items():
+            setattr(self, key, copy.deepcopy(value))
+
     def _step(self, action: Any) -> None:
         """Does not modify molecule.
 
@@ -143,6 +239,16 @@ class ConformerEnv(gym.Env):
         """
         return self.mol
 
+    def _get_energy(self) -> float:
+        """Returns the energy of the current conformer of the molecule.
+
+        The energy published by the action handler in ``relaxed_energy`` is used if available. Otherwise,
+        the energy is evaluated with the cached force field.
+        """
+        if self.relaxed_energy is not None:
+            return self.relaxed_energy
+        return get_conformer_energy(self.mol, mmff_context=self.mmff_context)
+
     def _reward(self) -> float:
         """Returns :math:`e^{-1 * energy}` where :math:`energy` is the
         energy of the current conformer of the molecule.
@@ -153,7 +259,7 @@ class ConformerEnv(gym.Env):
 
         * energy (float): the energy of the current conformer
         """
-        energy = get_conformer_energy(self.mol)
+        energy = self._get_energy()
         reward =  np.exp(-1. * energy)
 
         self.step_info['energy'] = energy
@@ -4,8 +4,10 @@ Curriculum Conformer_env
 """
 
 import logging
-from typing import List
+from typing import List, Tuple
 import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from rdkit.Chem import AllChem as Chem
@@ -14,6 +16,8 @@ import gym
 
 from conformer_rl.config import MolConfig
 from conformer_rl.environments.conformer_env import ConformerEnv
+from conformer_rl.environments.environment_components.molecule_features import GraphTopology
+from conformer_rl.utils import MMFFContext, TorsionDriver, LRUCache
 
 class CurriculumConformerEnv(ConformerEnv):
     """Base interface for building conformer generation environments with support for curriculum learning.
@@ -41,27 +45,43 @@ class CurriculumConformerEnv(ConformerEnv):
         One plus the maximum index in which a molecule/task from the input list of ``mol_configs`` can be selected to be trained on.
         This attribute will be increased as the agent gets better at the current tasks in the curriculum and is ready to move on to
         more difficult tasks.
+    episode_index : int
+        The index in ``configs`` of the molecule of the current episode.
+    reset_wait_time : float
+        Time (in seconds) spent by the last call to :meth:`reset` on preparing the starting state of the episode, or on waiting for it
+        if it was prefetched with :meth:`prefetch_reset`.
+
+    Notes
+    -----
+    Each episode runs on a copy of the molecule of the selected configuration, so that the starting state of the next episode
+    can be prepared while the current episode is running.
     """
+    _derived_attributes = ConformerEnv._derived_attributes + ('configs',)
 
     def __init__(self, mol_configs: List[MolConfig]):
         gym.Env.__init__(self)
         logging.debug('initializing curriculum conformer environment')
         self.configs = copy.deepcopy(mol_configs)
         self.curriculum_max_index = 1
-
+        self.precomputed_relaxation = None
+        self.info_mode = 'full'
+        self.graph_topology = None
+        self.reset_wait_time = 0.
+        self._prefetch_executor = None
+        self._prefetched_episode = None
+
+        # a single cache is shared by all molecules, since the keys include the starting geometry
         self.config = self.configs[0]
-        self.mol = self.config.mol
-        self.mol.RemoveAllConformers()
-        if Chem.EmbedMolecule(self.mol, randomSeed=self.config.seed, useRandomCoords=True) == -1:
-            raise Exception('Unable to embed molecule with conformer using rdkit')
-        self.conf = self.mol.GetConformer()
-        nonring, ring = TorsionFingerprints.CalculateTorsionLists(self.mol)
-        self.nonring = [list(atoms[0]) for atoms, ang in nonring]
+        self.action_cache = LRUCache(self.config.action_cache_size) if self.config.action_cache_size > 0 else None
+        self.pending_cache_entry = None
 
         self.reset()
 
     def reset(self) -> object:
         """Resets the environment and returns the observation of the environment.
+
+        If the starting state of the episode was prefetched with :meth:`prefetch_reset` at the current curriculum level,
+        it is used instead of preparing a new one.
         """
         logging.debug('reset called')
 
@@ -70,27 +90,16 @@ class CurriculumConformerEnv(ConformerEnv):
         self.step_info = {}
         self.episode_info = {}
 
-        # set index for the next molecule based on curriculum
-        if self.curriculum_max_index == 1:
-            index = 0
+        start = time.perf_counter()
+        if self._prefetched_episode is not None and self._prefetched_episode[0] == self.curriculum_max_index:
+            episode = self._prefetched_episode[1].result()
         else:
-            p = 0.5 * np.ones(self.curriculum_max_index) / (self.curriculum_max_index - 1)
-            p[-1] = 0.5
-            index = np.random.choice(self.curriculum_max_index, p=p)
-
-        logging.debug(f'Current Curriculum Molecule Index: {index}')
+            episode = self._prepare_episode(self._select_index(), self.graph_topology is not None)
+        self._prefetched_episode = None
+        self.reset_wait_time = time.perf_counter() - start
 
-        # set up current molecule
-        mol_config = self.configs[index]
-        self.config = mol_config
-        self.max_steps = mol_config.num_conformers
-        self.mol = mol_config.mol
-        self.mol.RemoveAllConformers()
-        if Chem.EmbedMolecule(self.mol, randomSeed=self.config.seed, useRandomCoords=True) == -1:
-            raise Exception('Unable to embed molecule with conformer using rdkit')
-        self.conf = self.mol.GetConformer()
-        nonring, ring = TorsionFingerprints.CalculateTorsionLists(self.mol)
-        self.nonring = [list(atoms[0]) for atoms, ang in nonring]
+        self._set_episode(episode)
+        logging.debug(f'Current Curriculum Molecule Index: {self.episode_index}')
 
         self.episode_info['mol'] = Chem.Mol(self.mol)
         self.episode_info['mol'].RemoveAllConformers()
@@ -98,6 +107,80 @@ class CurriculumConformerEnv(ConformerEnv):
         obs = self._obs()
         return obs
 
+    def _set_episode(self, episode: Tuple) -> None:
+        """Sets up the molecule of an episode prepared by :meth:`_prepare_episode` as the current molecule.
+        """
+        self.episode_index, self.mol, self.mmff_context, self.nonring, self.torsion_driver, graph_topology = episode
+        self.config = self.configs[self.episode_index]
+        self.max_steps = self.config.num_conformers
+        self.conf = self.mol.GetConformer()
+        if graph_topology is not None:
+            self.graph_topology = graph_topology
+
+    def prefetch_reset(self) -> None:
+        """Starts preparing the starting state of the next episode in a background thread.
+
+        The molecule of the next episode is selected immediately, and a copy of it is embedded together with its torsions,
+        force field and, if the environment uses graph observations, graph topology, so that the next call to :meth:`reset`
+        only needs to wait for the preparation to finish. If the curriculum level changes before the next reset, the prefetched
+        starting state is discarded.
+        """
+        self._prefetch(self._select_index())
+
+    def _prefetch(self, index: int) -> None:
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        future = self._prefetch_executor.submit(self._prepare_episode, index, self.graph_topology is not None)
+        self._prefetched_episode = (self.curriculum_max_index, future)
+
+    def get_state(self) -> dict:
+        """Returns the state of the environment in the current episode, from which :meth:`set_state` restores it.
+
+        In addition to the state returned by :meth:`ConformerEnv.get_state`, the state includes the curriculum level, the index of the
+        molecule of the current episode and the index of the molecule of the prefetched episode, if any.
+        """
+        state = super().get_state()
+        if self._prefetched_episode is not None:
+            level, future = self._prefetched_episode
+            state['prefetched_episode'] = (level, future.result()[0])
+        return state
+
+    def set_state(self, state: dict) -> None:
+        """Restores the state of the environment returned by :meth:`get_state`, for an environment created with the same configurations.
+
+        The molecule of the current episode, and of the prefetched episode if any, are embedded again.
+        """
+        state = dict(state)
+        prefetched_episode = state.pop('prefetched_episode', None)
+        self._set_episode(self._prepare_episode(state['episode_index'], self.graph_topology is not None))
+        super().set_state(state)
+        self._prefetched_episode = None
+        if prefetched_episode is not None:
+            level, index = prefetched_episode
+            self._prefetch(index)
+            self._prefetched_episode = (level, self._prefetched_episode[1])
+
+    def _select_index(self) -> int:
+        """Selects the index of the molecule for the next episode based on the curriculum.
+        """
+        if self.curriculum_max_index == 1:
+            return 0
+        p = 0.5 * np.ones(self.curriculum_max_index) / (self.curriculum_max_index - 1)
+        p[-1] = 0.5
+        return np.random.choice(self.curriculum_max_index, p=p)
+
+    def _prepare_episode(self, index: int, build_graph_topology: bool) -> Tuple:
+        """Embeds a copy of the molecule with the given `index` and builds its torsions, force field and optionally graph topology.
+        """
+        mol_config = self.configs[index]
+        mol = Chem.Mol(mol_config.mol)
+        mol.RemoveAllConformers()
+        if Chem.EmbedMolecule(mol, randomSeed=mol_config.seed, useRandomCoords=True) == -1:
+            raise Exception('Unable to embed molecule with conformer using rdkit')
+        nonring, ring = TorsionFingerprints.CalculateTorsionLists(mol)
+        nonring = [list(atoms[0]) for atoms, ang in nonring]
+        graph_topology = GraphTopology(mol) if build_graph_topology else None
+        return index, mol, MMFFContext(mol), nonring, TorsionDriver(mol, nonring), graph_topology
 
     def increase_level(self):
         """Updates the ``curriculum_max_index`` attribute after obtaining signal from the agent that a favorable
@@ -5,10 +5,63 @@ Action_mixins
 Pre-built action handlers.
 """
 
+import hashlib
+import numpy as np
 from rdkit import Chem
 from typing import List
 
-class ContinuousActionMixin:
+from conformer_rl.utils import optimize_conformer, set_conformer_positions, principal_frame, timed
+
+class MMFFRelaxationMixin:
+    """Relaxes the current conformer with MMFF according to the relaxation parameters of the
+    :class:`~conformer_rl.config.mol_config.MolConfig` used by the environment.
+    """
+
+    def _relax(self) -> None:
+        """Relaxes the current conformer and publishes its energy and convergence status through
+        the ``relaxed_energy`` and ``relaxation_converged`` attributes.
+
+        If the relaxation was already computed outside of the environment (for example by
+        :class:`~conformer_rl.environments.batched_conformer_env.BatchedConformerEnv`), the ``precomputed_relaxation``
+        attribute holds a tuple of the relaxed atom positions, the convergence status and the energy, which are
+        used instead of relaxing the conformer again.
+
+        Notes
+        -----
+        Logged parameters:
+
+        * converged (bool): whether the MMFF relaxation of the conformer converged
+        """
+        if self.precomputed_relaxation is not None:
+            positions, self.relaxation_converged, self.relaxed_energy = self.precomputed_relaxation
+            self.precomputed_relaxation = None
+            set_conformer_positions(self.conf, positions)
+            self.step_info['converged'] = self.relaxation_converged
+            return
+
+        config = self.config
+        if config.relax_mode == 'exact':
+            max_iters, non_bonded_thresh = config.relax_exact_max_iters, 100.
+        elif config.relax_mode == 'fast':
+            max_iters, non_bonded_thresh = config.relax_max_iters, config.relax_non_bonded_thresh
+        else:
+            raise ValueError(f'Unknown relaxation mode {config.relax_mode}')
+
+        self.relaxation_converged, self.relaxed_energy = optimize_conformer(
+            self.mol,
+            confId=self.mol.GetNumConformers() - 1,
+            mmff_context=self.mmff_context,
+            max_iters=max_iters,
+            force_tol=config.relax_force_tol,
+            energy_tol=config.relax_energy_tol,
+            non_bonded_thresh=non_bonded_thresh,
+            restrained_torsions=self.nonring if config.relax_restrain_torsions else None,
+            torsion_force_constant=config.relax_torsion_force_constant,
+            cutoff_energy=config.relax_cutoff_energy
+        )
+        self.step_info['converged'] = self.relaxation_converged
+
+class ContinuousActionMixin(MMFFRelaxationMixin):
     """For each torsion of the molecule, modifies the torsion given an angle from a continuous range.
     """
 
@@ -26,14 +79,23 @@ class ContinuousActionMixin:
         Logged parameters:
 
         * conf: the current generated conformer is saved to the episodic mol object.
+        * converged (bool): whether the MMFF relaxation of the conformer converged
+
+        If ``precomputed_relaxation`` is set, the torsions were already set by whoever relaxed the conformer, so they are not set again.
         """
-        conf = self.conf
-        for idx, tors in enumerate(self.nonring):
-            Chem.rdMolTransforms.SetDihedralDeg(conf, *tors, float(action[idx]))
-        Chem.AllChem.MMFFOptimizeMolecule(self.mol, maxIters=500, nonBondedThresh=10., confId=self.mol.GetNumConformers() - 1)
+        if self.precomputed_relaxation is None:
+            with timed(self.step_timings, 'torsions'):
+                self._set_torsions(self.conf, action)
+        with timed(self.step_timings, 'relaxation'):
+            self._relax()
         self.episode_info['mol'].AddConformer(self.conf, assignId=True)
+
+    def _set_torsions(self, conf: Chem.Conformer, action: List[float]) -> None:
+        """Sets the torsion angles of `conf` to the angles (in degrees) given by `action`.
+        """
+        self.torsion_driver.set_torsions(conf, np.asarray(action, dtype=float))
     
-class DiscreteActionMixin:
+class DiscreteActionMixin(MMFFRelaxationMixin):
     """For each torsion of the molecule, modifies the torsion given an angle from a discrete set of possible angles.
     """
 
@@ -50,9 +112,62 @@ class DiscreteActionMixin:
         Logged parameters:
         
         * conf: the current generated conformer is saved to the episodic mol object.
+        * converged (bool): whether the MMFF relaxation of the conformer converged
+        * action_cache_hits (int): the total number of steps whose outcome was found in ``action_cache``, if the cache is enabled
+        * action_cache_misses (int): the total number of steps whose outcome was not found in ``action_cache``, if the cache is enabled
+
+        If ``action_cache`` is not None, the outcome of the action is looked up with :meth:`lookup_action` before setting the torsions,
+        unless the conformer was already relaxed outside of the environment.
+
+        If ``precomputed_relaxation`` is set, the torsions were already set by whoever relaxed the conformer, so they are not set again.
+        """
+        if self.action_cache is not None and self.precomputed_relaxation is None:
+            self.lookup_action(action)
+        if self.precomputed_relaxation is None:
+            with timed(self.step_timings, 'torsions'):
+                self._set_torsions(self.conf, action)
+        with timed(self.step_timings, 'relaxation'):
+            self._relax()
+
+        if self.pending_cache_entry is not None:
+            key, centroid, rotation = self.pending_cache_entry
+            self.pending_cache_entry = None
+            positions = (self.conf.GetPositions() - centroid) @ rotation.T
+            self.action_cache.put(key, (positions, self.relaxation_converged, self.relaxed_energy))
+        if self.action_cache is not None:
+            self.step_info['action_cache_hits'] = self.action_cache.hits
+            self.step_info['action_cache_misses'] = self.action_cache.misses
+        self.episode_info['mol'].AddConformer(self.conf, assignId=True)
+
+    def lookup_action(self, action: List[int]) -> bool:
+        """Looks up the outcome of `action` from the current conformer in ``action_cache``, which must not be None.
+
+        The outcome is looked up by the starting geometry of the conformer and the action. The starting geometry is compared in its principal
+        frame (see :func:`~conformer_rl.utils.chem_utils.principal_frame`), rounded to ``action_cache_decimals`` decimals, since relaxing the
+        conformer also moves and rotates it. If found, the cached relaxed coordinates and energy are set as ``precomputed_relaxation``, so that
+        the next step uses them instead of setting the torsions and relaxing the conformer. Otherwise, the outcome of the next step is stored in
+        the cache once the conformer is relaxed, whether by the environment or outside of it.
+
+        Vector environments relaxing conformers outside of the environments, such as
+        :class:`~conformer_rl.environments.batched_conformer_env.BatchedConformerEnv`, call this method before setting the torsions.
+
+        Returns
+        -------
+        bool
+            Whether the outcome was found in the cache.
+        """
+        centroid, rotation = principal_frame(self.conf.GetPositions())
+        frame = np.round((self.conf.GetPositions() - centroid) @ rotation.T, self.config.action_cache_decimals) + 0. # avoid negative zeros
+        key = (hashlib.blake2b(frame.tobytes(), digest_size=16).digest(), tuple(int(a) for a in action))
+        outcome = self.action_cache.get(key)
+        if outcome is None:
+            self.pending_cache_entry = (key, centroid, rotation)
+            return False
+        positions, converged, energy = outcome
+        self.precomputed_relaxation = (positions @ rotation + centroid, converged, energy)
+        return True
+
+    def _set_torsions(self, conf: Chem.Conformer, action: List[int]) -> None:
+        """Sets each torsion angle of `conf` to -180 plus 60 times the corresponding element of `action` degrees.
         """
-        for idx, tors in enumerate(self.nonring):
-            ang = -180 + 60 * action[idx]
-            Chem.rdMolTransforms.SetDihedralDeg(self.conf, *tors, float(ang))
-        Chem.AllChem.MMFFOptimizeMolecule(self.mol, maxIters=500, nonBondedThresh=10., confId=self.mol.GetNumConformers() - 1)
-        self.episode_info['mol'].AddConformer(self.conf, assignId=True)
\ No newline at end of file
+        self.torsion_driver.set_torsions(conf, -180. + 60. * np.asarray(action, dtype=float))
\ No newline at end of file
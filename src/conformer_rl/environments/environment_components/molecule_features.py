@@ -4,6 +4,8 @@ Molecule_features
 Helper functions for extracting features from molecules conformers
 to generate graph representations in :mod:`conformer_rl.environments.environment_components.obs_mixins`.
 """
+import numpy as np
+import torch
 from rdkit import Chem
 from typing import List
 
@@ -64,4 +66,48 @@ def atom_type_CO(atom: Chem.Atom) -> List[bool]:
     atom_feats = [
         anum == 'C', anum == 'O',
     ]
-    return atom_feats
\ No newline at end of file
+    return atom_feats
+
+class GraphTopology:
+    """Parts of the graph representation of a molecule which do not depend on its conformer.
+
+    Built once per molecule, so that observations only need to gather the coordinates of the heavy atoms
+    from the current conformer.
+
+    Parameters
+    ----------
+    mol : rdkit Mol
+        The molecule, including hydrogens.
+
+    Attributes
+    ----------
+    mol : rdkit Mol
+        The molecule the topology was built for.
+    heavy_atoms : np.ndarray of int
+        Indices in `mol` of the atoms kept by ``Chem.RemoveHs``, in the order of the atoms of the molecule without hydrogens.
+    edge_index : torch.Tensor of shape (2, 2 * num_bonds)
+        Pairs of bonded atoms of the molecule without hydrogens, as generated by :func:`get_bond_pairs`.
+    edge_attr : torch.Tensor of shape (2 * num_bonds, 6)
+        Features of the bond of each pair in `edge_index`, as generated by :func:`bond_type`.
+    atom_types : torch.Tensor of shape (num_heavy_atoms, 2)
+        Features of each atom of the molecule without hydrogens, as generated by :func:`atom_type_CO`.
+    """
+    def __init__(self, mol: Chem.Mol):
+        self.mol = mol
+        mol = Chem.Mol(mol)
+        for atom in mol.GetAtoms():
+            atom.SetIntProp('full_mol_idx', atom.GetIdx())
+        mol = Chem.rdmolops.RemoveHs(mol)
+        self.heavy_atoms = np.array([atom.GetIntProp('full_mol_idx') for atom in mol.GetAtoms()], dtype=int)
+
+        edge_attributes = []
+        for bond in mol.GetBonds():
+            edge_attributes += [bond_type(bond), bond_type(bond)]
+        self.edge_index = torch.tensor(get_bond_pairs(mol), dtype=torch.long)
+        self.edge_attr = torch.tensor(edge_attributes, dtype=torch.float).reshape(-1, 6)
+        self.atom_types = torch.tensor([atom_type_CO(atom) for atom in mol.GetAtoms()], dtype=torch.float).reshape(-1, 2)
+
+    def heavy_atom_positions(self, conf: Chem.Conformer) -> np.ndarray:
+        """Returns the coordinates of the heavy atoms of `conf`, a conformer of `mol`, as a float32 array of shape (num_heavy_atoms, 3).
+        """
+        return np.asarray(conf.GetPositions(), dtype=np.float32)[self.heavy_atoms]
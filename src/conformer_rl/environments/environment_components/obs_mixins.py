@@ -7,120 +7,103 @@ Pre-built observation handlers.
 import numpy as np
 import torch
 
-from rdkit import Chem
-
-from torch_geometric.data import Data, Batch
-from torch_geometric.transforms import Distance, NormalizeScale, Center, NormalizeRotation
+from torch_geometric.data import Data
 from conformer_rl.environments.environment_components import molecule_features
 
 from typing import List, Tuple
 
-class GraphObsMixin:
+def normalize_positions(positions: np.ndarray) -> torch.Tensor:
+    """Centers coordinates and rotates them onto their principal axes.
+
+    Performs the same tensor operations as applying the ``Center`` and ``NormalizeRotation`` transforms of PyTorch Geometric
+    to a float32 array of shape (num_atoms, 3), so that the results (including the order and signs of the principal axes) are identical,
+    but without creating and transforming ``Data`` objects.
+    """
+    pos = torch.from_numpy(positions)
+    pos = pos - pos.mean(dim=-2, keepdim=True)
+    centered = pos - pos.mean(dim=0, keepdim=True)
+    _, v = torch.linalg.eig(torch.matmul(centered.t(), centered))
+    return torch.matmul(pos, v.real)
+
+class GraphTopologyMixin:
+    """Caches the parts of the graph representation of the molecule which do not change between steps in the
+    ``graph_topology`` attribute, see :class:`~conformer_rl.environments.environment_components.molecule_features.GraphTopology`.
+    """
+    def _graph_topology(self) -> molecule_features.GraphTopology:
+        """Returns the graph topology of the current molecule, building it if the molecule has changed.
+        """
+        if self.graph_topology is None or self.graph_topology.mol is not self.mol:
+            self.graph_topology = molecule_features.GraphTopology(self.mol)
+        return self.graph_topology
+
+class GraphObsMixin(GraphTopologyMixin):
     """Represents molecule as a PyTorch Geometric graph where no information is included for each (node) and each edge
     is represented by a 6-tuple as generated by :func:`~conformer_rl.environments.environment_components.molecule_features.bond_type`.
     """
-    def _obs(self) -> Tuple[Batch, List[List[int]]]:
+    def _obs(self) -> Tuple[Data, List[List[int]]]:
         """
         returns
         -------
-        Tuple[Batch, List[List[int]]
-            The Batch object contains the Pytorch Geometric graph representing the molecule. The list of lists of integers
+        Tuple[Data, List[List[int]]
+            The Data object contains the Pytorch Geometric graph representing the molecule. The list of lists of integers
             is a list of all the torsions of the molecule, where each torsion is represented by a list of four integers, where the integers
             are the indices of the four atoms making up the torsion.
         """
 
-        mol = Chem.rdmolops.RemoveHs(self.mol)
-        conf = mol.GetConformer()
-        atoms = mol.GetAtoms()
-        bonds = mol.GetBonds()
-
-        node_features = [[] for atom in atoms]
-        edge_indices = molecule_features.get_bond_pairs(mol)
-        edge_attributes = []
-        for bond in bonds:
-            edge_attributes += [molecule_features.bond_type(bond), molecule_features.bond_type(bond)]
+        topology = self._graph_topology()
+        pos = normalize_positions(topology.heavy_atom_positions(self.mol.GetConformer()))
 
         data = Data(
-                    x=torch.tensor(node_features, dtype=torch.float),
-                    edge_index=torch.tensor(edge_indices, dtype=torch.long),
-                    edge_attr=torch.tensor(edge_attributes,dtype=torch.float),
-                    pos=torch.Tensor(conf.GetPositions())
+                    x=pos,
+                    edge_index=topology.edge_index,
+                    edge_attr=topology.edge_attr,
+                    pos=pos
                 )
-
-        data = Center()(data)
-        data = NormalizeRotation()(data)
-        data.x = data.pos
-        data = Batch.from_data_list([data])
         return data, self.nonring
 
-class AtomTypeGraphObsMixin:
+class AtomTypeGraphObsMixin(GraphTopologyMixin):
     """Represents molecule as a PyTorch Geometric graph where each node contains information about the atom's element.
     """
-    def _obs(self) -> Tuple[Batch, List[List[int]]]:
+    def _obs(self) -> Tuple[Data, List[List[int]]]:
         """
         returns
         -------
-        Tuple[Batch, List[List[int]]
-            The Batch object contains the Pytorch Geometric graph representing the molecule. The list of lists of integers
+        Tuple[Data, List[List[int]]
+            The Data object contains the Pytorch Geometric graph representing the molecule. The list of lists of integers
             is a list of all the torsions of the molecule, where each torsion is represented by a list of four integers, where the integers
             are the indices of the four atoms making up the torsion.
         """
-        mol = Chem.rdmolops.RemoveHs(self.mol)
-        conf = mol.GetConformer()
-        atoms = mol.GetAtoms()
-        bonds = mol.GetBonds()
-
-        node_features = [molecule_features.atom_type_CO(atom) for atom in atoms]
-        edge_indices = molecule_features.get_bond_pairs(mol)
-        edge_attributes = []
-        for bond in bonds:
-            edge_attributes += [molecule_features.bond_type(bond), molecule_features.bond_type(bond)]
+        topology = self._graph_topology()
+        pos = normalize_positions(topology.heavy_atom_positions(self.mol.GetConformer()))
 
         data = Data(
-                    x=torch.tensor(node_features, dtype=torch.float),
-                    edge_index=torch.tensor(edge_indices, dtype=torch.long),
-                    edge_attr=torch.tensor(edge_attributes,dtype=torch.float),
-                    pos=torch.Tensor(conf.GetPositions())
+                    x=topology.atom_types,
+                    edge_index=topology.edge_index,
+                    edge_attr=topology.edge_attr,
+                    pos=pos
                 )
-
-        data = Center()(data)
-        data = NormalizeRotation()(data)
-        data = Batch.from_data_list([data])
         return data, self.nonring
 
 
-class AtomCoordsTypeGraphObsMixin:
+class AtomCoordsTypeGraphObsMixin(GraphTopologyMixin):
     """Represents molecule as a PyTorch Geometric graph where each node contains information about the atom's element and three-dimensional coordinates.
     """
-    def _obs(self) -> Tuple[Batch, List[List[int]]]:
+    def _obs(self) -> Tuple[Data, List[List[int]]]:
         """
         returns
         -------
-        Tuple[Batch, List[List[int]]
-            The Batch object contains the Pytorch Geometric graph representing the molecule. The list of lists of integers
+        Tuple[Data, List[List[int]]
+            The Data object contains the Pytorch Geometric graph representing the molecule. The list of lists of integers
             is a list of all the torsions of the molecule, where each torsion is represented by a list of four integers, where the integers
             are the indices of the four atoms making up the torsion.
         """
-        mol = Chem.rdmolops.RemoveHs(self.mol)
-        conf = mol.GetConformer()
-        atoms = mol.GetAtoms()
-        bonds = mol.GetBonds()
-
-        node_features = [molecule_features.atom_type_CO(atom) + molecule_features.atom_coords(atom, conf) for atom in atoms]
-        edge_indices = molecule_features.get_bond_pairs(mol)
-        edge_attributes = []
-        for bond in bonds:
-            edge_attributes += [molecule_features.bond_type(bond), molecule_features.bond_type(bond)]
+        topology = self._graph_topology()
+        pos = normalize_positions(topology.heavy_atom_positions(self.mol.GetConformer()))
 
         data = Data(
-                    x=torch.tensor(node_features, dtype=torch.float),
-                    edge_index=torch.tensor(edge_indices, dtype=torch.long),
-                    edge_attr=torch.tensor(edge_attributes,dtype=torch.float),
-                    pos=torch.Tensor(conf.GetPositions())
+                    x=torch.cat([topology.atom_types, pos], dim=1),
+                    edge_index=topology.edge_index,
+                    edge_attr=topology.edge_attr,
+                    pos=pos
                 )
-
-        data = Center()(data)
-        data = NormalizeRotation()(data)
-        data.x[:,-3:] = data.pos
-        data = Batch.from_data_list([data])
         return data, self.nonring
\ No newline at end of file
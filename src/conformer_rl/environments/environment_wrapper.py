@@ -10,19 +10,34 @@ import numpy as np
 # documentation for SubprocVecEnv: https://github.com/DLR-RM/stable-baselines3/blob/master/stable_baselines3/common/vec_env/subproc_vec_env.py
 from stable_baselines3.common.vec_env.subproc_vec_env import SubprocVecEnv
 from .simple_vec_env import SimpleVecEnv
+from .batched_conformer_env import BatchedConformerEnv
+from .shared_memory_vec_env import SharedMemoryVecEnv
+from .thread_vec_env import ThreadVecEnv
 
 from typing import Union
 
 
-def _make_env(env_id, seed, rank, **kwargs):
+class PrefetchResetWrapper(gym.Wrapper):
+    """Starts prefetching the starting state of the next episode after each reset of the wrapped environment (see
+    :meth:`~conformer_rl.environments.curriculum_conformer_env.CurriculumConformerEnv.prefetch_reset`), for vector environments
+    which reset their environments themselves, such as ``SubprocVecEnv``.
+    """
+    def reset(self, **kwargs):
+        obs = self.env.reset(**kwargs)
+        self.env.prefetch_reset()
+        return obs
+
+def _make_env(env_id, seed, rank, prefetch_reset=False, **kwargs):
     def _thunk():
         np.random.seed(seed + rank)
         env = gym.make(env_id, **kwargs)
+        if prefetch_reset and hasattr(env, 'prefetch_reset'):
+            env = PrefetchResetWrapper(env)
         return env
 
     return _thunk
 
-def Task(name: str, concurrency: bool=False, num_envs: int=1, seed: int=np.random.randint(int(1e5)), **kwargs) -> Union[SubprocVecEnv, SimpleVecEnv]:
+def Task(name: str, concurrency: bool=False, num_envs: int=1, seed: int=np.random.randint(int(1e5)), backend: str=None, num_threads: int=0, **kwargs) -> Union[SubprocVecEnv, SimpleVecEnv, BatchedConformerEnv, SharedMemoryVecEnv, ThreadVecEnv]:
     """Returns a wrapper for wrapping multiple environments.
 
     Parameters
@@ -30,15 +45,49 @@ def Task(name: str, concurrency: bool=False, num_envs: int=1, seed: int=np.rando
     name : str
         The name of the environment, as registered using the ``gym.register`` method.
     concurrency : bool
-        Whether or not the environments should be run in parallel across multiple CPU's.
+        Whether or not the environments should be run in parallel across multiple CPU's. Ignored if `backend` is specified.
     num_envs : bool
         The number of environments to be wrapped.
     seed : bool
         Seed for initializing the environments.
+    backend : str, optional
+        The type of wrapper to be used. One of:
+
+        * ``'simple'``: :class:`~conformer_rl.environments.simple_vec_env.SimpleVecEnv`, which steps the environments sequentially.
+        * ``'subproc'``: ``SubprocVecEnv``, which runs each environment in a separate process.
+        * ``'batched'``: :class:`~conformer_rl.environments.batched_conformer_env.BatchedConformerEnv`, which relaxes the conformers of all environments
+          concurrently on native threads within a single process.
+        * ``'shared_memory'``: :class:`~conformer_rl.environments.shared_memory_vec_env.SharedMemoryVecEnv`, which runs each environment in a
+          separate process and transfers the coordinates of graph observations through shared memory.
+        * ``'threads'``: :class:`~conformer_rl.environments.thread_vec_env.ThreadVecEnv`, which steps the environments on a thread pool
+          within a single process.
+
+        If not specified, ``'subproc'`` is used if `concurrency` is ``True`` and ``'simple'`` otherwise.
+
+        All backends start prefetching the starting state of the next episode after each reset of environments supporting it (see
+        :meth:`~conformer_rl.environments.curriculum_conformer_env.CurriculumConformerEnv.prefetch_reset`). With the ``'subproc'`` backend,
+        such environments are wrapped in :class:`PrefetchResetWrapper` for this purpose, and their reset times are not recorded.
+    num_threads : int
+        The number of threads used by the ``'batched'`` and ``'threads'`` backends. If set to 0, the number of CPUs of the system is used.
 
     Returns
     -------
     A wrapper for the environment(s).
     """
-    envs = [_make_env(name, seed, i, **kwargs) for i in range(num_envs)]
-    return SubprocVecEnv(envs) if concurrency else SimpleVecEnv(envs)
\ No newline at end of file
+    if backend is None:
+        backend = 'subproc' if concurrency else 'simple'
+    # the other backends prefetch the starting states themselves when resetting their environments
+    envs = [_make_env(name, seed, i, prefetch_reset=backend == 'subproc', **kwargs) for i in range(num_envs)]
+
+    if backend == 'simple':
+        return SimpleVecEnv(envs)
+    elif backend == 'subproc':
+        return SubprocVecEnv(envs)
+    elif backend == 'batched':
+        return BatchedConformerEnv(envs, num_threads=num_threads)
+    elif backend == 'shared_memory':
+        return SharedMemoryVecEnv(envs)
+    elif backend == 'threads':
+        return ThreadVecEnv(envs, num_threads=num_threads)
+    else:
+        raise ValueError(f'Unknown backend {backend}')
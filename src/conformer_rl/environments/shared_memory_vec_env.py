@@ -0,0 +1,227 @@
+"""
+Shared_memory_vec_env
+=====================
+"""
+import multiprocessing as mp
+import pickle
+from multiprocessing.connection import wait
+import numpy as np
+import torch
+from torch_geometric.data import Data
+
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+from conformer_rl.environments.simple_vec_env import reset_env, add_step_timings
+from conformer_rl.utils import timed
+
+from typing import Any, Callable, List, Tuple
+
+# fields of a graph observation which change in every step and are transferred through shared memory
+_DYNAMIC_FIELDS = ('x', 'pos')
+
+
+class _ObservationEncoder:
+    """Writes the coordinates and node features of graph observations into a shared buffer and the rest of the
+    observation into a message, which contains the topology of the graph only if it has changed since the last observation.
+    """
+    def __init__(self, buffer: Any):
+        self.buffer = np.frombuffer(buffer, dtype=np.float32)
+        self.topology = None
+
+    def encode(self, obs: Any) -> tuple:
+        if not (isinstance(obs, tuple) and len(obs) == 2 and isinstance(obs[0], Data)):
+            return ('pickle', obs)
+        data, nonring = obs
+        arrays = {key: data[key] for key in _DYNAMIC_FIELDS if key in data}
+        if sum(array.numel() for array in arrays.values()) > len(self.buffer) \
+            or any(array.dtype != torch.float for array in arrays.values()):
+            return ('pickle', obs)
+
+        offset, shapes = 0, []
+        for key, array in arrays.items():
+            self.buffer[offset:offset + array.numel()] = array.detach().reshape(-1).numpy()
+            offset += array.numel()
+            shapes.append((key, tuple(array.shape)))
+
+        # the static parts of the observation are cached by the observation handlers, so they are only sent when they are replaced
+        topology = {key: data[key] for key in data.keys() if key not in _DYNAMIC_FIELDS}
+        if self.topology is not None and self.topology[1] is nonring and self.topology[0].keys() == topology.keys() \
+            and all(self.topology[0][key] is value for key, value in topology.items()):
+            return ('shared', shapes, None)
+        self.topology = (topology, nonring)
+        return ('shared', shapes, self.topology)
+
+
+class _ObservationDecoder:
+    """Reassembles the observations written by an :class:`_ObservationEncoder` in a worker process.
+    """
+    def __init__(self, buffer: Any):
+        self.buffer = np.frombuffer(buffer, dtype=np.float32)
+        self.topology = None
+
+    def decode(self, message: tuple) -> Any:
+        if message[0] == 'pickle':
+            return message[1]
+        _, shapes, topology = message
+        if topology is not None:
+            self.topology = topology
+        fields, nonring = self.topology
+
+        offset, arrays = 0, {}
+        for key, shape in shapes:
+            size = int(np.prod(shape))
+            arrays[key] = torch.from_numpy(self.buffer[offset:offset + size].reshape(shape).copy())
+            offset += size
+        return Data(**fields, **arrays), nonring
+
+
+def _worker(remote: Any, parent_remote: Any, env_fn_wrapper: CloudpickleWrapper, buffer: Any) -> None:
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    encoder = _ObservationEncoder(buffer)
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                obs, reward, done, info = env.step(data)
+                timings = {}
+                if done:
+                    obs, timings['reset'] = reset_env(env)
+                with timed(timings, 'ipc'):
+                    message = encoder.encode(obs)
+                add_step_timings(info, timings)
+                remote.send((message, reward, done, info, timings.get('reset', 0.)))
+            elif cmd == 'reset':
+                obs, reset_wait_time = reset_env(env)
+                remote.send((encoder.encode(obs), reset_wait_time))
+            elif cmd == 'render':
+                remote.send(env.render())
+            elif cmd == 'env_method':
+                remote.send(getattr(env, data[0])(*data[1], **data[2]))
+            elif cmd == 'close':
+                env.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f'`{cmd}` is not implemented in the worker')
+        except (EOFError, KeyboardInterrupt):
+            break
+
+
+class SharedMemoryVecEnv:
+    """Vector environment running each environment in a separate process, which transfers graph observations through shared memory.
+
+    Observations of the form ``(data, torsions)``, where ``data`` is a PyTorch Geometric ``Data`` object as returned by the
+    observation handlers in :mod:`~conformer_rl.environments.environment_components.obs_mixins`, are split into
+    the node features and coordinates (the ``x`` and ``pos`` fields), which each worker writes as float32 into its own shared buffer, and
+    the remaining fields and the torsions. Since the observation handlers cache the latter for each molecule, they are only sent through the
+    pipe when they are replaced by new objects, such as after switching the molecule. The main process then reassembles the observation from
+    the shared buffer and its copy of the topology, so that only rewards, dones and infos are pickled in each step.
+
+    Observations of other types, or too large for the shared buffer, are pickled through the pipe instead.
+
+    Besides :meth:`step`, the environments can be stepped asynchronously with :meth:`step_async` and :meth:`step_wait`, which
+    may be restricted to a subset of the workers, so that the caller can work on the observations of some workers while the others
+    are still computing their steps.
+
+    After each reset, environments supporting it prefetch the starting state of their next episode in the background (see
+    :meth:`~conformer_rl.environments.curriculum_conformer_env.CurriculumConformerEnv.prefetch_reset`). The total time spent by each
+    environment on resets is accumulated in the ``reset_wait_times`` attribute.
+
+    The step timings reported by the environments (see :meth:`~conformer_rl.environments.conformer_env.ConformerEnv.step`) include the
+    time spent on resets (``'reset'``) and on encoding the observations in the workers and decoding the results in the main process (``'ipc'``).
+
+    Parameters
+    ----------
+    env_fns : list of callables returning environments
+        Functions for constructing each environment.
+    buffer_size : int
+        Size of the shared buffer of each worker in float32 values.
+    start_method : str, optional
+        The multiprocessing start method. Defaults to ``'forkserver'`` if available and ``'spawn'`` otherwise.
+    """
+    def __init__(self, env_fns: List[Callable[[], Any]], buffer_size: int = 1 << 16, start_method: str = None):
+        self.num_envs = len(env_fns)
+        self.closed = False
+        self.reset_wait_times = np.zeros(self.num_envs)
+        self.pending = set()
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+        ctx = mp.get_context(start_method)
+
+        buffers = [ctx.RawArray('f', buffer_size) for _ in range(self.num_envs)]
+        self.decoders = [_ObservationDecoder(buffer) for buffer in buffers]
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(self.num_envs)])
+        self.processes = []
+        for work_remote, remote, env_fn, buffer in zip(work_remotes, self.remotes, env_fns, buffers):
+            process = ctx.Process(target=_worker, args=(work_remote, remote, CloudpickleWrapper(env_fn), buffer), daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+    def step(self, actions: List[Any]) -> Tuple[tuple, np.ndarray, np.ndarray, tuple]:
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions: List[Any], indices: List[int] = None) -> None:
+        """Sends the actions to the workers with the given `indices` (all workers if not specified) without waiting for the results.
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        for i, action in zip(indices, actions):
+            self.remotes[i].send(('step', action))
+            self.pending.add(i)
+
+    def step_wait(self, indices: List[int] = None) -> Tuple[tuple, np.ndarray, np.ndarray, tuple]:
+        """Waits for and returns the results of the steps started by :meth:`step_async` on the workers with the given `indices`
+        (all workers if not specified), in the order of `indices`.
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        data = []
+        for i in indices:
+            buf = self.remotes[i].recv_bytes()
+            timings = {}
+            with timed(timings, 'ipc'):
+                message, rew, done, info, reset_wait_time = pickle.loads(buf)
+                obs = self.decoders[i].decode(message)
+            add_step_timings(info, timings)
+            self.reset_wait_times[i] += reset_wait_time
+            data.append([obs, rew, done, info])
+        self.pending.difference_update(indices)
+        obs, rew, done, info = zip(*data)
+        return obs, np.asarray(rew), np.asarray(done), info
+
+    def step_wait_any(self) -> Tuple[List[int], tuple, np.ndarray, np.ndarray, tuple]:
+        """Waits until at least one of the steps started by :meth:`step_async` has finished and returns the indices
+        and results of all workers whose steps have finished.
+        """
+        ready = wait([self.remotes[i] for i in self.pending])
+        indices = sorted(i for i in self.pending if self.remotes[i] in ready)
+        return (indices, *self.step_wait(indices))
+
+    def reset(self) -> list:
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        messages, reset_wait_times = zip(*[remote.recv() for remote in self.remotes])
+        self.reset_wait_times += reset_wait_times
+        return [decoder.decode(message) for decoder, message in zip(self.decoders, messages)]
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def render(self) -> list:
+        for remote in self.remotes:
+            remote.send(('render', None))
+        return [remote.recv() for remote in self.remotes]
+
+    def env_method(self, method_name: str, *method_args, indices: List[int] = None, **method_kwargs) -> list:
+        """Calls the method with the given name on the environments with the given `indices` (all environments if not specified).
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        for i in indices:
+            self.remotes[i].send(('env_method', (method_name, method_args, method_kwargs)))
+        return [self.remotes[i].recv() for i in indices]
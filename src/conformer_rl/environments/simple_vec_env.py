@@ -1,24 +1,71 @@
+import time
 import numpy as np
 
+
+def reset_env(env):
+    """Resets `env` and returns its observation together with the time spent on the reset. If the environment supports it,
+    it then starts prefetching the starting state of its next episode in the background (see
+    :meth:`~conformer_rl.environments.curriculum_conformer_env.CurriculumConformerEnv.prefetch_reset`).
+    """
+    start = time.perf_counter()
+    obs = env.reset()
+    elapsed = time.perf_counter() - start
+    prefetch_reset = getattr(env, 'prefetch_reset', None)
+    if prefetch_reset is not None:
+        prefetch_reset()
+    return obs, elapsed
+
+def add_step_timings(info, timings):
+    """Adds the time (in seconds) spent by a vector environment on each phase in `timings` to the step timings reported by
+    an environment in the ``'timings'`` entry of the step info of `info` (see :meth:`~conformer_rl.environments.conformer_env.ConformerEnv.step`).
+    Environments not reporting step timings are left unchanged.
+    """
+    step_timings = info.get('step_info', {}).get('timings') if isinstance(info, dict) else None
+    if step_timings is not None:
+        for phase, elapsed in timings.items():
+            step_timings[phase] = step_timings.get(phase, 0.) + elapsed
+
 class SimpleVecEnv():
 
     def __init__(self, env_fns):
         self.envs = [fn() for fn in env_fns]
         self.num_envs = len(env_fns)
-        self.actions = None
+        self.actions = {}
+        self.reset_wait_times = np.zeros(self.num_envs)
 
     def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions, indices=None):
+        indices = range(self.num_envs) if indices is None else indices
+        for i, action in zip(indices, actions):
+            self.actions[i] = action
+
+    def step_wait(self, indices=None):
+        indices = range(self.num_envs) if indices is None else indices
         data = []
-        for i in range(self.num_envs):
-            obs, rew, done, info = self.envs[i].step(actions[i])
+        for i in indices:
+            obs, rew, done, info = self.envs[i].step(self.actions.pop(i))
             if done:
-                obs = self.envs[i].reset()
+                obs, elapsed = self._reset(i)
+                add_step_timings(info, {'reset': elapsed})
             data.append([obs, rew, done, info])
         obs, rew, done, info = zip(*data)
         return obs, np.asarray(rew), np.asarray(done), info
 
+    def step_wait_any(self):
+        i = min(self.actions)
+        obs, rew, done, info = self.step_wait([i])
+        return [i], obs, rew, done, info
+
     def reset(self):
-        return [env.reset() for env in self.envs]
+        return [self._reset(i)[0] for i in range(self.num_envs)]
+
+    def _reset(self, i):
+        obs, elapsed = reset_env(self.envs[i])
+        self.reset_wait_times[i] += elapsed
+        return obs, elapsed
 
     def close(self):
         for env in self.envs:
@@ -27,5 +74,6 @@ class SimpleVecEnv():
     def render(self):
         return [env.render() for env in self.envs]
 
-    def env_method(self, method_name, *method_args, **method_kwargs):
-        return [getattr(env, method_name)(*method_args, **method_kwargs) for env in self.envs]
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        indices = range(self.num_envs) if indices is None else indices
+        return [getattr(self.envs[i], method_name)(*method_args, **method_kwargs) for i in indices]
@@ -0,0 +1,130 @@
+"""
+Thread_vec_env
+==============
+"""
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from conformer_rl.environments.batched_conformer_env import BatchedConformerEnv
+from conformer_rl.environments.curriculum_conformer_env import CurriculumConformerEnv
+from conformer_rl.environments.simple_vec_env import reset_env, add_step_timings
+from conformer_rl.environments.environment_components.action_mixins import MMFFRelaxationMixin
+from conformer_rl.utils import timed
+
+from typing import Any, Callable, List, Tuple
+
+class ThreadVecEnv:
+    """Vector environment that steps each of its environments on a thread pool within a single process.
+
+    Compared to ``SubprocVecEnv``, the environments share the process of the agent, so that no worker processes need to be
+    started, observations do not need to be pickled, and the molecules and PyTorch are not copied into each worker.
+    Environments can run in parallel whenever they are inside RDKit calls releasing the GIL.
+
+    RDKit's ``ForceField.Minimize`` holds the GIL, so for conformer environments whose action handler inherits from
+    :class:`~conformer_rl.environments.environment_components.action_mixins.MMFFRelaxationMixin` and whose relaxation
+    parameters are supported by :class:`~conformer_rl.environments.batched_conformer_env.BatchedConformerEnv`, each worker
+    thread applies the action and relaxes the conformer with ``MMFFOptimizeMoleculeConfs``, which releases the GIL, before stepping
+    the environment with the precomputed relaxation, unless the outcome of the action is found in the action cache of the environment.
+    The results are identical to stepping the environments separately.
+    Other environments, such as curriculum environments, are stepped as is.
+
+    After each reset, environments supporting it prefetch the starting state of their next episode in the background (see
+    :meth:`~conformer_rl.environments.curriculum_conformer_env.CurriculumConformerEnv.prefetch_reset`). The total time spent by each
+    environment on resets is accumulated in the ``reset_wait_times`` attribute.
+
+    The step timings reported by the environments (see :meth:`~conformer_rl.environments.conformer_env.ConformerEnv.step`) include the
+    time spent by the worker threads on setting the torsions and relaxing the conformers, the time spent on resets (``'reset'``) and
+    the time each step waited for a worker thread (``'queue'``).
+
+    Parameters
+    ----------
+    env_fns : list of callables returning environments
+        Functions for constructing each environment.
+    num_threads : int
+        The size of the thread pool. If set to 0, the number of CPUs of the system is used.
+    """
+    def __init__(self, env_fns: List[Callable[[], Any]], num_threads: int = 0):
+        self.envs = [fn() for fn in env_fns]
+        self.num_envs = len(env_fns)
+        self.num_threads = num_threads or os.cpu_count()
+        self.pool = ThreadPoolExecutor(max_workers=self.num_threads)
+        self.pending = {}
+        self.reset_wait_times = np.zeros(self.num_envs)
+        self.gil_free_relaxation = [self._supports_gil_free_relaxation(getattr(env, 'unwrapped', env)) for env in self.envs]
+
+    @staticmethod
+    def _supports_gil_free_relaxation(env: Any) -> bool:
+        if not isinstance(env, MMFFRelaxationMixin) or isinstance(env, CurriculumConformerEnv):
+            return False
+        try:
+            BatchedConformerEnv._relaxation_params(env.config)
+        except ValueError:
+            return False
+        return True
+
+    def _step_env(self, i: int, action: Any, submitted: float) -> tuple:
+        timings = {'queue': time.perf_counter() - submitted}
+        env = self.envs[i]
+        if self.gil_free_relaxation[i] and not BatchedConformerEnv._lookup_action(env.unwrapped, action):
+            base_env = env.unwrapped
+            with timed(timings, 'torsions'):
+                base_env._set_torsions(base_env.conf, action)
+            with timed(timings, 'relaxation'):
+                base_env.precomputed_relaxation = BatchedConformerEnv._relax(base_env)
+            timings['total'] = timings['torsions'] + timings['relaxation']
+        obs, rew, done, info = env.step(action)
+        if done:
+            obs, timings['reset'] = self._reset(i)
+        add_step_timings(info, timings)
+        return obs, rew, done, info
+
+    def step(self, actions: List[Any]) -> Tuple[tuple, np.ndarray, np.ndarray, tuple]:
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions: List[Any], indices: List[int] = None) -> None:
+        """Starts stepping the environments with the given `indices` (all environments if not specified) on the thread pool.
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        for i, action in zip(indices, actions):
+            self.pending[i] = self.pool.submit(self._step_env, i, action, time.perf_counter())
+
+    def step_wait(self, indices: List[int] = None) -> Tuple[tuple, np.ndarray, np.ndarray, tuple]:
+        """Waits for the steps started by :meth:`step_async` for the environments with the given `indices`
+        (all environments if not specified) and returns their results in the order of `indices`.
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        obs, rew, done, info = zip(*[self.pending.pop(i).result() for i in indices])
+        return obs, np.asarray(rew), np.asarray(done), info
+
+    def step_wait_any(self) -> Tuple[List[int], tuple, np.ndarray, np.ndarray, tuple]:
+        """Waits until at least one of the steps started by :meth:`step_async` has finished and returns the indices
+        and results of all finished environments.
+        """
+        wait(self.pending.values(), return_when=FIRST_COMPLETED)
+        indices = [i for i, future in self.pending.items() if future.done()]
+        return (indices, *self.step_wait(indices))
+
+    def reset(self) -> list:
+        return [self._reset(i)[0] for i in range(self.num_envs)]
+
+    def _reset(self, i: int) -> Tuple[Any, float]:
+        obs, elapsed = reset_env(self.envs[i])
+        self.reset_wait_times[i] += elapsed
+        return obs, elapsed
+
+    def close(self) -> None:
+        self.pool.shutdown()
+        for env in self.envs:
+            env.close()
+
+    def render(self) -> list:
+        return [env.render() for env in self.envs]
+
+    def env_method(self, method_name: str, *method_args, indices: List[int] = None, **method_kwargs) -> list:
+        """Calls the method with the given name on the environments with the given `indices` (all environments if not specified).
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        return [getattr(self.envs[i], method_name)(*method_args, **method_kwargs) for i in indices]
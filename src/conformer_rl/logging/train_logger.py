@@ -2,9 +2,12 @@
 Train_logger
 ============
 """
+import numpy as np
 from torch.utils.tensorboard import SummaryWriter
 from conformer_rl.utils import mkdir
 
+from typing import Sequence
+
 class TrainLogger:
     """Used by agent for logging agent metrics during training.
 
@@ -65,5 +68,19 @@ class TrainLogger:
         if self.use_print:
             print("step:", global_step, key + ":", scalar_value)
 
+    def add_percentiles(self, key: str, values: Sequence[float], global_step: int=None, percentiles: Sequence[float]=(50, 90, 99)) -> None:
+        """Logs percentiles of a collection of values, each as a scalar with the key ``key/p<percentile>``.
 
-
+        Parameters
+        ----------
+        key : str
+            The key prefix associated with the logged percentiles.
+        values : sequence of float
+            The values whose percentiles are logged.
+        global_step : int
+            The current agent step when logging the metric.
+        percentiles : sequence of float
+            The percentiles to be logged.
+        """
+        for percentile, value in zip(percentiles, np.percentile(values, percentiles)):
+            self.add_scalar(f'{key}/p{percentile:g}', value, global_step)
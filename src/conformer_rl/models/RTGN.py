@@ -10,10 +10,12 @@ import torch_geometric.nn as gnn
 import numpy as np
 from typing import List, Tuple, Dict
 
+from conformer_rl.models.inference import InferenceMixin
+from conformer_rl.models.packed_observations import graph_inputs
 from conformer_rl.models.graph_components import MPNN
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
-class RTGN(torch.nn.Module):
+class RTGN(InferenceMixin, torch.nn.Module):
     """Actor-critic neural network using message passing neural network (MPNN) [1]_
     for predicting discrete torsion angles.
 
@@ -48,11 +50,12 @@ class RTGN(torch.nn.Module):
         """
         Parameters
         ----------
-        obs : list of 2-tuples of Pytorch Geometric Batch objects and list of lists of int
-            Each tuple is a single observation (the entire list is a batch). Each Pytorch Geometric Batch object corresponds to
+        obs : list of 2-tuples of Pytorch Geometric Data or Batch objects and list of lists of int
+            Each tuple is a single observation (the entire list is a batch). Each Pytorch Geometric Data or Batch object corresponds to
             the Pytorch Geometric graph representing the molecule. The list of lists of integers
             is a list of all the torsions of the molecule, where each torsion is represented by a list of four integers, where the integers
             are the indices of the four atoms making up the torsion.
+            The observations can also be given as :class:`~conformer_rl.models.packed_observations.PackedObservations`.
         action : batch of torch.Tensor, optional
             If specified, the log probabilities returned by the network will be the log probabilities for the specified
             actions instead of for the newly sampled actions.
@@ -66,34 +69,14 @@ class RTGN(torch.nn.Module):
             * prediction['log_pi_a'] The log probabilities of the actions from the distribution.
 
         """
-        data_list = []
-        nr_list = []
-        for b, nr in obs:
-            data_list += b.to_data_list()
-            nr_list.append(torch.LongTensor(nr))
-
-        data = Batch.from_data_list(data_list)
-        data = data.to(device)
-        N = data.num_graphs
-
-        so_far = 0
-        torsion_batch_idx = []
-        torsion_list_sizes = []
-
-        for i in range(N):
-            nr_list[i] += so_far
-            so_far += int((data.batch == i).sum())
-            torsion_batch_idx.extend([i]*int(nr_list[i].shape[0]))
-            torsion_list_sizes += [nr_list[i].shape[0]]
-
-        nrs = torch.cat(nr_list).to(device)
-        torsion_batch_idx = torch.LongTensor(torsion_batch_idx).to(device)
-        obs = (data, nrs, torsion_batch_idx, torsion_list_sizes)
+        obs = graph_inputs(obs, device)
+        torsion_list_sizes = obs[3]
 
-        logits = self.actor(obs)
-        v = self.critic(obs)
+        logits = self._submodule('actor')(obs)
+        v = self._submodule('critic')(obs)
 
-        dist = torch.distributions.Categorical(logits=logits)
+        # the distribution and the outputs are kept in float32 when the network is run under autocast
+        dist = torch.distributions.Categorical(logits=logits.float())
         if action == None:
             action = dist.sample()
 
@@ -106,7 +89,7 @@ class RTGN(torch.nn.Module):
             'a': action,
             'log_pi_a': log_prob,
             'ent': entropy,
-            'v': v,
+            'v': v.float(),
         }
 
         return prediction
@@ -10,10 +10,12 @@ import numpy as np
 
 from typing import List, Tuple, Dict
 
+from conformer_rl.models.inference import InferenceMixin
+from conformer_rl.models.packed_observations import graph_inputs
 from conformer_rl.models.graph_components import GAT
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
-class RTGNGatRecurrent(torch.nn.Module):
+class RTGNGatRecurrent(InferenceMixin, torch.nn.Module):
     """Actor-critic neural network using graph transformer network (GAT) [1]_
     and long short-term memory (LSTM) for predicting discrete torsion angles.
 
@@ -47,13 +49,16 @@ class RTGNGatRecurrent(torch.nn.Module):
         """
         Parameters
         ----------
-        obs : list of 2-tuple of Pytorch Geometric Batch objects and list of lists of int
-            Each tuple is a single observation (the entire list is a batch). Each Pytorch Geometric Batch object corresponds to
+        obs : list of 2-tuple of Pytorch Geometric Data or Batch objects and list of lists of int
+            Each tuple is a single observation (the entire list is a batch). Each Pytorch Geometric Data or Batch object corresponds to
             the Pytorch Geometric graph representing the molecule. The list of lists of integers
             is a list of all the torsions of the molecule, where each torsion is represented by a list of four integers, where the integers
             are the indices of the four atoms making up the torsion.
+            The observations can also be given as :class:`~conformer_rl.models.packed_observations.PackedObservations`.
         states : 4-tuple of torch.Tensor, optional
             Recurrent states for the LSTM's. If none are specified they are initialized to zeros.
+            If `obs` contains several observations for each of the `states`, they are consecutive steps of the sequences
+            starting from `states`, ordered first by step and then by sequence, and are passed through the LSTM's as a sequence.
         action : batch of torch.Tensor, optional
             If specified, the log probabilities returned by the network will be the log probabilities for the specified
             actions instead of for the newly sampled actions.
@@ -66,32 +71,11 @@ class RTGNGatRecurrent(torch.nn.Module):
             * prediction['entropy'] The entropy of the distribution.
             * prediction['log_pi_a'] The log probabilities of the actions from the distribution.
         states : 4-tuple of torch.Tensor
-            Output recurrent states from LSTM.
+            Output recurrent states from LSTM after the last step.
 
         """
-        data_list = []
-        nr_list = []
-        for b, nr in obs:
-            data_list += b.to_data_list()
-            nr_list.append(torch.LongTensor(nr))
-
-        data = Batch.from_data_list(data_list)
-        data = data.to(device)
-        N = data.num_graphs
-
-        so_far = 0
-        torsion_batch_idx = []
-        torsion_list_sizes = []
-
-        for i in range(N):
-            nr_list[i] += so_far
-            so_far += int((data.batch == i).sum())
-            torsion_batch_idx.extend([i]*int(nr_list[i].shape[0]))
-            torsion_list_sizes += [nr_list[i].shape[0]]
-
-        nrs = torch.cat(nr_list).to(device)
-        torsion_batch_idx = torch.LongTensor(torsion_batch_idx).to(device)
-        obs = (data, nrs, torsion_batch_idx, torsion_list_sizes)
+        obs = graph_inputs(obs, device)
+        torsion_list_sizes = obs[3]
 
         if states:
             hp, cp, hv, cv = states
@@ -101,11 +85,12 @@ class RTGNGatRecurrent(torch.nn.Module):
             policy_states = None
             value_states = None
 
-        logits, (hp, cp) = self.actor(obs, policy_states)
-        v, (hv, cv) = self.critic(obs, value_states)
+        logits, (hp, cp) = self._submodule('actor')(obs, policy_states)
+        v, (hv, cv) = self._submodule('critic')(obs, value_states)
         v = v.squeeze(0)
 
-        dist = torch.distributions.Categorical(logits=logits)
+        # the distribution and the outputs are kept in float32 when the network is run under autocast
+        dist = torch.distributions.Categorical(logits=logits.float())
         if action == None:
             action = dist.sample()
 
@@ -118,10 +103,10 @@ class RTGNGatRecurrent(torch.nn.Module):
             'a': action,
             'log_pi_a': log_prob,
             'ent': entropy,
-            'v': v,
+            'v': v.float(),
         }
 
-        return prediction, (hp, cp, hv, cv)
+        return prediction, (hp.float(), cp.float(), hv.float(), cv.float())
 
 class _RTGNGatCriticRecurrent(torch.nn.Module):
     def __init__(self, action_dim, hidden_dim, node_dim):
@@ -146,8 +131,9 @@ class _RTGNGatCriticRecurrent(torch.nn.Module):
 
         out = self.gat(data)
         pool = self.set2set(out, data.batch)
-        lstm_out, (hx, cx) = self.memory(pool.view(1, N, 2*self.hidden_dim), (hx, cx))
-        v = self.mlp(lstm_out)
+        # the graphs of several consecutive steps of each sequence are ordered by step
+        lstm_out, (hx, cx) = self.memory(pool.view(N // hx.shape[1], hx.shape[1], 2*self.hidden_dim), (hx, cx))
+        v = self.mlp(lstm_out.view(1, N, -1))
 
         return v, (hx, cx)
 
@@ -174,7 +160,8 @@ class _RTGNGatActorRecurrent(torch.nn.Module):
 
         out = self.gat(data)
         pool = self.set2set(out, data.batch)
-        lstm_out, (hx, cx) = self.memory(pool.view(1,data.num_graphs,-1), (hx, cx))
+        lstm_out, (hx, cx) = self.memory(pool.view(N // hx.shape[1], hx.shape[1], -1), (hx, cx))
+        lstm_out = lstm_out.view(1, N, -1)
 
         lstm_out = torch.index_select(
             lstm_out,
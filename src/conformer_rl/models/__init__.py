@@ -1,4 +1,6 @@
 from .RTGN import RTGN
 from .RTGN_recurrent import RTGNRecurrent
 from .RTGN_GAT import RTGNGat
-from .RTGN_GAT_recurrent import RTGNGatRecurrent
\ No newline at end of file
+from .RTGN_GAT_recurrent import RTGNGatRecurrent
+from .packed_observations import PackedObservations, graph_inputs
+from .inference import InferenceMixin
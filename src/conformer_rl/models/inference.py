@@ -0,0 +1,76 @@
+"""
+Inference
+=========
+"""
+import logging
+
+import torch
+
+from typing import Any
+
+class InferenceMixin:
+    """Adds an inference fast path to actor-critic networks with ``actor`` and ``critic`` submodules.
+
+    :meth:`inference` runs the forward pass under ``torch.inference_mode``, using the compiled versions of the actor and the
+    critic if :meth:`compile_inference` has been called. The compiled submodules share their parameters with the network and are
+    only used in inference mode, so that training always runs the eager submodules.
+
+    The agents in :mod:`conformer_rl.agents` use :meth:`inference` for sampling and evaluation whenever gradients are disabled.
+    """
+    def compile_inference(self, **compile_kwargs: Any) -> bool:
+        """Compiles the actor and the critic with ``torch.compile`` for use by :meth:`inference`.
+
+        Compilation happens lazily on the first calls, and is repeated for inputs of new shapes until the shapes
+        are treated as dynamic.
+
+        Parameters
+        ----------
+        **compile_kwargs
+            Keyword arguments passed to ``torch.compile``, for example ``backend`` or ``mode``.
+
+        Returns
+        -------
+        bool
+            Whether the submodules were compiled. Compilation is skipped with a warning if ``torch.compile`` is not available.
+        """
+        if not hasattr(torch, 'compile'):
+            logging.warning('torch.compile is not available, running inference in eager mode.')
+            return False
+        compile_kwargs.setdefault('dynamic', True)
+        # kept outside of the registered submodules, so that the parameters and state dict of the network are unchanged
+        self.__dict__['_compiled_submodules'] = {name: torch.compile(getattr(self, name), **compile_kwargs) for name in ('actor', 'critic')}
+        return True
+
+    def inference(self, *args: Any, **kwargs: Any) -> Any:
+        """Runs the forward pass of the network for sampling, without recording gradients.
+
+        Takes the same arguments and has the same sampling semantics as ``forward``. The returned tensors are ordinary
+        tensors, which can be modified in place and used in later computations with gradients, unlike tensors created
+        under ``torch.inference_mode``.
+        """
+        with torch.inference_mode():
+            outputs = self(*args, **kwargs)
+        return _ordinary_tensors(outputs)
+
+    def __getstate__(self) -> dict:
+        # copies of the network are not compiled, since the compiled submodules would run the submodules of the original network
+        state = super().__getstate__()
+        state.pop('_compiled_submodules', None)
+        return state
+
+    def _submodule(self, name: str) -> torch.nn.Module:
+        """Returns the submodule `name`, or its compiled version in inference mode if :meth:`compile_inference` has been called.
+        """
+        compiled = self.__dict__.get('_compiled_submodules')
+        if compiled is not None and torch.is_inference_mode_enabled():
+            return compiled[name]
+        return getattr(self, name)
+
+def _ordinary_tensors(outputs: Any) -> Any:
+    if torch.is_tensor(outputs):
+        return outputs.clone() if outputs.is_inference() else outputs
+    if isinstance(outputs, dict):
+        return {key: _ordinary_tensors(value) for key, value in outputs.items()}
+    if isinstance(outputs, (tuple, list)):
+        return type(outputs)(_ordinary_tensors(value) for value in outputs)
+    return outputs
@@ -0,0 +1,150 @@
+"""
+Packed_observations
+===================
+"""
+import numpy as np
+import torch
+from torch_geometric.data import Batch, Data
+
+from typing import Any, Iterator, List, Sequence, Tuple, Union
+
+class PackedObservations:
+    """Graph observations collated once into a single Pytorch Geometric Batch, from which sub-batches are
+    gathered by indexing instead of collating the observations again.
+
+    The networks in :mod:`conformer_rl.models` accept packed observations in place of lists of observations.
+    Iterating over packed observations yields the original observations, so that they can also be passed
+    to networks expecting lists.
+
+    Parameters
+    ----------
+    obs : list of 2-tuples of Pytorch Geometric Data or Batch objects and list of lists of int
+        The observations, each consisting of the graph of a molecule and its torsions, as returned by the
+        environments with graph observations.
+
+    Attributes
+    ----------
+    data : Pytorch Geometric Batch
+        The graphs of all observations.
+    torsions : torch.LongTensor
+        Tensor of shape ``(num_torsions, 4)`` containing the torsions of all observations, indexing the nodes of `data`.
+    torsion_ptr : torch.LongTensor
+        The offsets of the torsions of each observation in `torsions`.
+    """
+    def __init__(self, obs: Sequence[Tuple[Union[Data, Batch], List[List[int]]]]):
+        data_list = []
+        torsions = []
+        for b, nr in obs:
+            data_list += b.to_data_list() if isinstance(b, Batch) else [b]
+            torsions.append(torch.as_tensor(np.asarray(nr), dtype=torch.long).view(-1, 4))
+        self.data = Batch.from_data_list(data_list)
+        self._slices = dict(self.data._slice_dict)
+        self._increments = dict(self.data._inc_dict)
+
+        sizes = torch.tensor([len(nr) for nr in torsions])
+        self.torsion_ptr = _pointer(sizes)
+        self.torsions = torch.cat(torsions) + torch.repeat_interleave(self.data.ptr[:-1], sizes).unsqueeze(-1)
+        self._observations = np.empty(len(obs), dtype=object)
+        for i, o in enumerate(obs):
+            self._observations[i] = o
+
+    @staticmethod
+    def can_pack(obs: Sequence[Any]) -> bool:
+        """Returns whether `obs` is a non-empty list of graph observations that can be packed.
+        """
+        return len(obs) > 0 and all(isinstance(o, tuple) and len(o) == 2 and isinstance(o[0], Data) for o in obs)
+
+    def __len__(self) -> int:
+        return len(self._observations)
+
+    def __iter__(self) -> Iterator[Tuple[Data, List[List[int]]]]:
+        return iter(self._observations)
+
+    def __getitem__(self, indices: Union[Sequence[int], np.ndarray, torch.Tensor]) -> 'PackedObservations':
+        """Gathers the observations at `indices`, in that order, by indexing the tensors of the collated graphs.
+
+        :meta public:
+        """
+        indices = torch.as_tensor(indices, dtype=torch.long).view(-1)
+        data = self.data
+        node_counts = data.ptr[indices + 1] - data.ptr[indices]
+        node_ptr = _pointer(node_counts)
+
+        attributes = {}
+        slices = {}
+        increments = {}
+        for key, value in data.items():
+            if key in ('batch', 'ptr'):
+                continue
+            counts = self._slices[key][indices + 1] - self._slices[key][indices]
+            rows = _ranges(self._slices[key][indices], counts)
+            slices[key] = _pointer(counts)
+            increments[key] = self._increments[key]
+            if not torch.is_tensor(value):
+                attributes[key] = [value[i] for i in rows.tolist()]
+                continue
+            dim = data.__cat_dim__(key, value) % value.dim()
+            value = value.index_select(dim, rows)
+            if torch.is_tensor(increments[key]) and bool(increments[key].any()):
+                # renumbers indices into the nodes of the gathered graphs, such as edge_index
+                increments[key] = node_ptr[:-1]
+                shift = torch.repeat_interleave(node_ptr[:-1] - self._increments[key][indices], counts)
+                value = value + shift.view([-1 if i == dim else 1 for i in range(value.dim())])
+            attributes[key] = value
+
+        packed = PackedObservations.__new__(PackedObservations)
+        packed.data = Batch(batch=torch.repeat_interleave(torch.arange(len(indices)), node_counts), ptr=node_ptr, **attributes)
+        packed._slices = slices
+        packed._increments = increments
+
+        torsion_counts = self.torsion_ptr[indices + 1] - self.torsion_ptr[indices]
+        packed.torsion_ptr = _pointer(torsion_counts)
+        packed.torsions = self.torsions[_ranges(self.torsion_ptr[indices], torsion_counts)] \
+            + torch.repeat_interleave(node_ptr[:-1] - data.ptr[indices], torsion_counts).unsqueeze(-1)
+        packed._observations = self._observations[indices.numpy()]
+        return packed
+
+    def inputs(self, device: torch.device) -> Tuple[Batch, torch.LongTensor, torch.LongTensor, List[int]]:
+        """Returns the inputs of the graph networks in :mod:`conformer_rl.models`, namely the graphs,
+        the torsions, the index of the observation of each torsion and the number of torsions of each observation.
+        """
+        torsion_counts = self.torsion_ptr[1:] - self.torsion_ptr[:-1]
+        torsion_batch_idx = torch.repeat_interleave(torch.arange(len(self)), torsion_counts)
+        return self.data.to(device), self.torsions.to(device), torsion_batch_idx.to(device), torsion_counts.tolist()
+
+def graph_inputs(obs: Union[PackedObservations, Sequence[Tuple[Union[Data, Batch], List[List[int]]]]],
+    device: torch.device) -> Tuple[Batch, torch.LongTensor, torch.LongTensor, List[int]]:
+    """Prepares observations for the graph networks in :mod:`conformer_rl.models`.
+
+    The graphs are collated into a single batch, and the torsions are offset by the index of the first node of their graph
+    using the node offsets of the batch, without iterating over the graphs.
+
+    Parameters
+    ----------
+    obs : PackedObservations or list of 2-tuples of Pytorch Geometric Data or Batch objects and list of lists of int
+        The observations passed to the network.
+    device : torch.device
+        The device of the network.
+
+    Returns
+    -------
+    data : Pytorch Geometric Batch
+        The graphs of the observations.
+    torsions : torch.LongTensor
+        The torsions of all observations as a tensor of shape ``(num_torsions, 4)`` indexing the nodes of `data`.
+    torsion_batch_idx : torch.LongTensor
+        The index of the observation of each torsion.
+    torsion_list_sizes : list of int
+        The number of torsions of each observation.
+    """
+    if not isinstance(obs, PackedObservations):
+        obs = PackedObservations(obs)
+    return obs.inputs(device)
+
+def _pointer(counts: torch.Tensor) -> torch.Tensor:
+    return torch.cat([counts.new_zeros(1), torch.cumsum(counts, 0)])
+
+def _ranges(starts: torch.Tensor, counts: torch.Tensor) -> torch.Tensor:
+    # the concatenation of arange(start, start + count) for each start and count
+    offsets = torch.cumsum(counts, 0) - counts
+    return torch.repeat_interleave(starts - offsets, counts) + torch.arange(int(counts.sum()))
@@ -6,6 +6,7 @@ Chemistry and molecule utility functions.
 """
 import numpy as np
 import bisect
+import math
 from rdkit.Chem import TorsionFingerprints
 import rdkit.Chem.AllChem as Chem
 
@@ -13,9 +14,183 @@ from typing import Tuple, List
 import logging
 
 
-def get_conformer_energies(mol: Chem.Mol) -> List[float]:
+class MMFFContext:
+    """Reusable MMFF force field for evaluating conformer energies of a single molecule.
+
+    The MMFF properties and force field of the molecule are set up once on construction, and energies
+    of any conformer of the molecule (or of any molecule with identical topology, such as a copy holding a
+    different set of conformers) are then evaluated by passing the conformer coordinates to the cached
+    force field, which avoids repeating the sanitization and force field setup for every evaluation.
+
+    Parameters
+    ----------
+    mol : RDKit Mol
+        The molecule for which the force field is built. It must contain at least one conformer.
+    confId : int
+        The id of the conformer used for building the force field.
+
+    Attributes
+    ----------
+    mmff_props : RDKit MMFFMolProperties
+        The MMFF atom typing and parameters of the molecule.
+    ff : RDKit ForceField
+        The cached MMFF force field of the molecule.
+    """
+    def __init__(self, mol: Chem.Mol, confId: int = -1):
+        Chem.MMFFSanitizeMolecule(mol)
+        self.mmff_props = Chem.MMFFGetMoleculeProperties(mol)
+        self.ff = Chem.MMFFGetMoleculeForceField(mol, self.mmff_props, confId=confId)
+
+    def calc_energy(self, conf: Chem.Conformer) -> float:
+        """Returns the MMFF energy of `conf` evaluated with the cached force field.
+        """
+        return self.ff.CalcEnergy(conf.GetPositions().ravel().tolist())
+
+def set_conformer_positions(conf: Chem.Conformer, positions: np.ndarray) -> None:
+    """Sets the coordinates of all atoms in `conf` from an array of shape (num_atoms, 3).
+    """
+    if hasattr(conf, 'SetPositions'):
+        conf.SetPositions(np.ascontiguousarray(positions, dtype=float))
+    else:
+        for i, pos in enumerate(positions):
+            conf.SetAtomPosition(i, [float(x) for x in pos])
+
+def principal_frame(positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the centroid and principal axes of an array of coordinates of shape (num_atoms, 3).
+
+    The principal axes are returned as the rows of a proper rotation matrix `rotation`, so that ``(positions - centroid) @ rotation.T``
+    are the coordinates in a frame that does not depend on the position and orientation of the molecule. The sign of each axis is chosen
+    such that the third moment of the coordinates along the axis is positive, which makes the frame stable under small changes of the coordinates.
+    """
+    centroid = positions.mean(axis=0)
+    centered = positions - centroid
+    _, _, rotation = np.linalg.svd(centered, full_matrices=False)
+    signs = np.sign(((centered @ rotation.T) ** 3).sum(axis=0))
+    signs[signs == 0] = 1.
+    rotation = rotation * signs[:, None]
+    if np.linalg.det(rotation) < 0:
+        rotation[2] *= -1.
+    return centroid, rotation
+
+def _sub(a: List[float], b: List[float]) -> List[float]:
+    return [a[0] - b[0], a[1] - b[1], a[2] - b[2]]
+
+def _dot(a: List[float], b: List[float]) -> float:
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+def _cross(a: List[float], b: List[float]) -> List[float]:
+    return [a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]]
+
+class TorsionDriver:
+    """Sets the torsion angles of conformers of a single molecule with NumPy rotations.
+
+    The atoms moved by each torsion are determined once on construction. Setting the torsions of a conformer then
+    reads its coordinates once, rotates the moving atoms of each torsion in order, and writes the coordinates back once,
+    which gives the same result as calling ``rdMolTransforms.SetDihedralDeg`` for each torsion in turn without searching
+    the molecular graph for every call.
+
+    Internally, the atoms are ordered by a depth-first traversal of the molecule, so that the atoms moved by
+    each torsion form at most two contiguous blocks of the reordered coordinates, which are rotated in place.
+
+    Parameters
+    ----------
+    mol : RDKit Mol
+        The molecule whose conformers are modified.
+    torsions : list of list of int
+        The four atom indices of each torsion. The middle bond of each torsion must not be in a ring.
+
+    Attributes
+    ----------
+    torsions : np.ndarray of shape (num_torsions, 4)
+        The atom indices of each torsion.
+    moving_atoms : list of np.ndarray
+        For each torsion, the indices of the atoms on the side of the third atom of the torsion, which are rotated when setting the torsion.
+    """
+    def __init__(self, mol: Chem.Mol, torsions: List[List[int]]):
+        self.torsions = np.asarray(torsions, dtype=int).reshape(-1, 4)
+        num_atoms = mol.GetNumAtoms()
+        neighbors = [[nbr.GetIdx() for nbr in atom.GetNeighbors()] for atom in mol.GetAtoms()]
+
+        # depth-first preorder of the atoms, with the parent and subtree size of each atom and the block of each fragment
+        order, parent, fragment = [], [-1] * num_atoms, [None] * num_atoms
+        for root in range(num_atoms):
+            if fragment[root] is not None:
+                continue
+            start = len(order)
+            stack = [root]
+            parent[root] = root
+            while stack:
+                atom = stack.pop()
+                order.append(atom)
+                for nbr in reversed(neighbors[atom]):
+                    if parent[nbr] == -1:
+                        parent[nbr] = atom
+                        stack.append(nbr)
+            for atom in order[start:]:
+                fragment[atom] = (start, len(order))
+        position = [0] * num_atoms
+        for idx, atom in enumerate(order):
+            position[atom] = idx
+        size = [1] * num_atoms
+        for atom in reversed(order):
+            if parent[atom] != atom:
+                size[parent[atom]] += size[atom]
+
+        self._order = np.array(order, dtype=int)
+        self._inverse = np.array(position, dtype=int)
+        self._torsion_list = [[position[atom] for atom in tors] for tors in self.torsions.tolist()]
+        self._blocks = []
+        for i, j, k, l in self.torsions.tolist():
+            bond = mol.GetBondBetweenAtoms(j, k)
+            if bond is None or bond.IsInRing():
+                raise ValueError(f'Cannot set torsion {[i, j, k, l]} without a non-ring bond between its middle atoms')
+            if parent[k] == j:
+                # the moving side is the subtree of k
+                self._blocks.append([(position[k], position[k] + size[k])])
+            else:
+                # the moving side is the fragment without the subtree of j
+                start, end = fragment[j]
+                self._blocks.append([block for block in [(start, position[j]), (position[j] + size[j], end)] if block[0] < block[1]])
+        self.moving_atoms = [np.sort(np.concatenate([self._order[start:end] for start, end in blocks])) for blocks in self._blocks]
+
+    def set_torsions(self, conf: Chem.Conformer, angles: List[float]) -> None:
+        """Sets the torsion angles of `conf` to `angles` (in degrees).
+        """
+        pos = conf.GetPositions()[self._order]
+        for (i, j, k, l), blocks, angle in zip(self._torsion_list, self._blocks, np.radians(np.asarray(angles, dtype=float)).tolist()):
+            # the scalar geometry is computed with Python floats, which is much faster than NumPy for 3-vectors
+            pi, pj, pk, pl = pos[i].tolist(), pos[j].tolist(), pos[k].tolist(), pos[l].tolist()
+            b0, b1, b2 = _sub(pj, pi), _sub(pk, pj), _sub(pl, pk)
+            n0, n1 = _cross(b0, b1), _cross(b1, b2)
+            m = _cross(n0, b1)
+            current = -math.atan2(_dot(m, n1) / math.sqrt(_dot(n1, n1) * _dot(m, m)), _dot(n0, n1) / math.sqrt(_dot(n1, n1) * _dot(n0, n0)))
+
+            # Rodrigues rotation about the j -> k axis, applied to row vectors as x @ rot_t + (pk - pk @ rot_t)
+            norm = math.sqrt(_dot(b1, b1))
+            x, y, z = b1[0] / norm, b1[1] / norm, b1[2] / norm
+            theta = angle - current
+            c, s = math.cos(theta), math.sin(theta)
+            t = 1. - c
+            rot_t = [
+                [t * x * x + c, t * x * y + s * z, t * x * z - s * y],
+                [t * x * y - s * z, t * y * y + c, t * y * z + s * x],
+                [t * x * z + s * y, t * y * z - s * x, t * z * z + c]
+            ]
+            shift = [pk[d] - pk[0] * rot_t[0][d] - pk[1] * rot_t[1][d] - pk[2] * rot_t[2][d] for d in range(3)]
+            rot_t = np.array(rot_t)
+            for start, end in blocks:
+                block = pos[start:end]
+                block[:] = block @ rot_t + shift
+        set_conformer_positions(conf, pos[self._inverse])
+
+def get_conformer_energies(mol: Chem.Mol, mmff_context: MMFFContext = None) -> List[float]:
     """Returns a list of energies for each conformer in `mol`.
+
+    If `mmff_context` is given, its cached force field is used instead of building a new force field for each conformer.
     """
+    if mmff_context is not None:
+        return np.asarray([mmff_context.calc_energy(conf) for conf in mol.GetConformers()], dtype=float)
+
     energies = []
     Chem.MMFFSanitizeMolecule(mol)
     mmff_props = Chem.MMFFGetMoleculeProperties(mol)
@@ -26,11 +201,15 @@ def get_conformer_energies(mol: Chem.Mol) -> List[float]:
     
     return np.asarray(energies, dtype=float)
 
-def get_conformer_energy(mol: Chem.Mol, confId: int = None) -> float:
+def get_conformer_energy(mol: Chem.Mol, confId: int = None, mmff_context: MMFFContext = None) -> float:
     """Returns the energy of the conformer with `confId` in `mol`.
+
+    If `mmff_context` is given, its cached force field is used instead of setting up a new force field.
     """
     if confId is None:
         confId = mol.GetNumConformers() - 1
+    if mmff_context is not None:
+        return mmff_context.calc_energy(mol.GetConformer(confId))
     Chem.MMFFSanitizeMolecule(mol)
     mmff_props = Chem.MMFFGetMoleculeProperties(mol)
     ff = Chem.MMFFGetMoleculeForceField(mol, mmff_props, confId=confId)
@@ -38,6 +217,69 @@ def get_conformer_energy(mol: Chem.Mol, confId: int = None) -> float:
 
     return energy
 
+def optimize_conformer(mol: Chem.Mol, confId: int = -1, mmff_context: MMFFContext = None, max_iters: int = 500, force_tol: float = 1e-4, energy_tol: float = 1e-6,
+                       non_bonded_thresh: float = 10., restrained_torsions: List[List[int]] = None, torsion_force_constant: float = 100.,
+                       cutoff_energy: bool = False) -> Tuple[bool, float]:
+    """Relaxes a conformer of `mol` in place with the MMFF force field.
+
+    With the default parameters, performs the same optimization as RDKit's ``MMFFOptimizeMolecule``, but also returns the energy
+    of the relaxed conformer, evaluated like :func:`get_conformer_energy`.
+
+    Parameters
+    ----------
+    mol : RDKit Mol
+        The molecule containing the conformer to be relaxed.
+    confId : int
+        The id of the conformer to be relaxed.
+    mmff_context : :class:`MMFFContext`, optional
+        Cached force field of the molecule. If given, its MMFF properties are reused for setting up the optimization, and its force field
+        for evaluating the energy of the relaxed conformer.
+    max_iters : int
+        The maximum number of optimization iterations.
+    force_tol : float
+        Convergence tolerance on the gradient.
+    energy_tol : float
+        Convergence tolerance on the energy change between iterations.
+    non_bonded_thresh : float
+        Threshold (in angstroms) used for excluding long-range non-bonded interactions.
+    restrained_torsions : list of list of int, optional
+        Torsions (each specified by the indices of its four atoms) to be restrained to their current angles during the relaxation.
+    torsion_force_constant : float
+        Force constant of the torsion restraints.
+    cutoff_energy : bool
+        Whether the energy of the relaxed conformer is evaluated with the force field used for the relaxation, which ignores non-bonded
+        interactions beyond `non_bonded_thresh`, instead of the full force field.
+
+    Returns
+    -------
+    converged : bool
+        Whether the optimization converged within `max_iters` iterations.
+    energy : float
+        The energy of the relaxed conformer. Torsion restraints are not included in the energy.
+    """
+    if mmff_context is not None:
+        mmff_props = mmff_context.mmff_props
+    else:
+        Chem.MMFFSanitizeMolecule(mol)
+        mmff_props = Chem.MMFFGetMoleculeProperties(mol)
+    ff = Chem.MMFFGetMoleculeForceField(mol, mmff_props, nonBondedThresh=non_bonded_thresh, confId=confId)
+    if restrained_torsions:
+        for tors in restrained_torsions:
+            ff.MMFFAddTorsionConstraint(*tors, True, 0., 0., torsion_force_constant)
+    ff.Initialize()
+    not_converged = ff.Minimize(maxIts=max_iters, forceTol=force_tol, energyTol=energy_tol)
+
+    if not cutoff_energy:
+        if mmff_context is not None:
+            energy = mmff_context.calc_energy(mol.GetConformer(confId))
+        else:
+            energy = Chem.MMFFGetMoleculeForceField(mol, mmff_props, confId=confId).CalcEnergy()
+    elif restrained_torsions:
+        energy = Chem.MMFFGetMoleculeForceField(mol, mmff_props, nonBondedThresh=non_bonded_thresh, confId=confId).CalcEnergy()
+    else:
+        energy = ff.CalcEnergy()
+    return not_converged == 0, energy
+
 def prune_last_conformer(mol: Chem.Mol, tfd_thresh: float, energies: List[float]) -> Tuple[Chem.Mol, List[float]]:
     """Prunes the last conformer of the molecule.
 
@@ -86,7 +328,7 @@ def prune_last_conformer(mol: Chem.Mol, tfd_thresh: float, energies: List[float]
 
         return new, [energies[i] for i in keep]
 
-def prune_conformers(mol: Chem.Mol, tfd_thresh: float) -> Chem.Mol:
+def prune_conformers(mol: Chem.Mol, tfd_thresh: float, mmff_context: MMFFContext = None) -> Chem.Mol:
     """Prunes all the conformers in the molecule.
 
     Removes conformers that have a TFD (torsional fingerprint deviation) lower than
@@ -98,6 +340,8 @@ def prune_conformers(mol: Chem.Mol, tfd_thresh: float) -> Chem.Mol:
         The molecule to be pruned.
     tfd_thresh : float
         The minimum threshold for TFD between conformers.
+    mmff_context : :class:`MMFFContext`, optional
+        Cached force field of the molecule used for calculating conformer energies.
 
     Returns
     -------
@@ -107,7 +351,7 @@ def prune_conformers(mol: Chem.Mol, tfd_thresh: float) -> Chem.Mol:
     if tfd_thresh < 0 or mol.GetNumConformers() <= 1:
         return mol
 
-    energies = get_conformer_energies(mol)
+    energies = get_conformer_energies(mol, mmff_context)
     tfd = tfd_matrix(mol)
     sort = np.argsort(energies)  # sort by increasing energy
     keep = []  # always keep lowest-energy conformer
@@ -6,10 +6,16 @@ Miscellaneous utility functions.
 """
 import numpy as np
 import os
+import pickle
+import tempfile
 import torch
 from pathlib import Path
+from collections import OrderedDict
+from contextlib import contextmanager
+import time
 
 from datetime import datetime
+from typing import Any, Dict, Hashable, Iterator
 
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
@@ -39,6 +45,47 @@ def to_np(t: torch.tensor) -> np.array:
     """
     return t.cpu().detach().numpy()
 
+@contextmanager
+def timed(timings: Dict[str, float], key: str) -> Iterator[None]:
+    """Context manager adding the time (in seconds) spent within it to ``timings[key]``.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[key] = timings.get(key, 0.) + time.perf_counter() - start
+
+def discounted_reverse_cumsum(values: torch.Tensor, discounts: torch.Tensor, final: torch.Tensor) -> torch.Tensor:
+    """Computes ``out[t] = values[t] + discounts[t] * out[t + 1]`` along the first dimension, where ``out[T] = final``.
+
+    The recursion is evaluated as a parallel scan in ``ceil(log2(T))`` operations on whole tensors instead of
+    ``T`` sequential steps, which is how returns and GAE advantages are computed for long rollouts.
+
+    Parameters
+    ----------
+    values : torch.Tensor
+        Tensor of shape ``(T, ...)``.
+    discounts : torch.Tensor
+        The discount of each step, broadcastable to the shape of `values`.
+    final : torch.Tensor
+        The value following the last step, broadcastable to ``values.shape[1:]``.
+
+    Returns
+    -------
+    torch.Tensor
+        Tensor with the same shape as `values`.
+    """
+    length = values.shape[0]
+    discounts = discounts.to(values.dtype).expand_as(values)
+    out = torch.cat([values[:-1], values[-1:] + discounts[-1:] * final])
+    offset = 1
+    while offset < length:
+        # out[t] = values[t] + ... + discounts[t] * ... * discounts[t + 2 * offset - 1] * out[t + 2 * offset] after each step
+        out = torch.cat([out[:-offset] + discounts[:-offset] * out[offset:], out[-offset:]])
+        discounts = torch.cat([discounts[:-offset] * discounts[offset:], discounts[-offset:]])
+        offset *= 2
+    return out
+
 def save_model(model: torch.nn.Module, filename: str) -> None:
     """Saves model parameters of a PyTorch neural network to a file.
     """
@@ -50,3 +97,71 @@ def load_model(model: torch.nn.Module, filename: str) -> None:
     """
     state_dict = torch.load(filename)
     model.load_state_dict(state_dict)
+
+def save_state(state: Any, filename: str) -> None:
+    """Pickles `state` to a file atomically.
+
+    The state is written to a temporary file in the directory of `filename`, which then replaces `filename`, so that `filename`
+    holds either its previous contents or the complete new state even if the process is interrupted while writing.
+    The directory of `filename` is created if it does not exist.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    mkdir(directory)
+    fd, temp_filename = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filename) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+def load_state(filename: str) -> Any:
+    """Loads a state saved with :func:`save_state`.
+    """
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry when full, and counts the hits and misses of lookups.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of entries held by the cache.
+
+    Attributes
+    ----------
+    hits : int
+        The number of lookups that found their key.
+    misses : int
+        The number of lookups that did not find their key.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the value stored for `key` and marks it as most recently used, or returns None if `key` is not in the cache.
+        """
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Stores `value` for `key`, evicting the least recently used entry if the cache is full.
+        """
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
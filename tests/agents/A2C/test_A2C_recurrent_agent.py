@@ -48,8 +48,8 @@ def test_train_losses(mocker):
     
 
     agent = A2CRecurrentAgent()
-    agent.returns = [torch.tensor([3., 6, 4]), torch.tensor([2., 7, 13])]
-    agent.advantages = [torch.tensor([11., 5, 17]), torch.tensor([15., 1, 3])]
+    agent.returns = torch.tensor([[3., 6, 4], [2., 7, 13]])
+    agent.advantages = torch.tensor([[11., 5, 17], [15., 1, 3]])
     agent.optimizer = mocker.Mock()
     agent.train_logger = mocker.Mock()
     agent.total_steps = 0
@@ -105,8 +105,8 @@ def test_recurrence(mocker):
     
 
     agent = A2CRecurrentAgent()
-    agent.returns = [torch.tensor([3., 6, 4]), torch.tensor([2., 7, 13])]
-    agent.advantages = [torch.tensor([11., 5, 17]), torch.tensor([15., 1, 3])]
+    agent.returns = torch.tensor([[3., 6, 4], [2., 7, 13]])
+    agent.advantages = torch.tensor([[11., 5, 17], [15., 1, 3]])
     agent.optimizer = mocker.Mock()
     agent.train_logger = mocker.Mock()
     agent.total_steps = 0
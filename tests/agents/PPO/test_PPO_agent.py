@@ -1,4 +1,5 @@
 import conformer_rl
+import threading
 import torch
 from conformer_rl.agents.PPO.PPO_agent import PPOAgent
 
@@ -14,6 +15,7 @@ def test_step(mocker):
 
     agent = PPOAgent()
     agent.storage = mocker.Mock()
+    agent.config = mocker.Mock(autocast_dtype=None, overlapped_sampling=False)
     agent.step()
 
     agent.storage.reset.assert_called_once()
@@ -22,6 +24,37 @@ def test_step(mocker):
     advantages.assert_called_once()
     train.assert_called_once()
 
+def test_overlapped_step(mocker):
+    mocker.patch('conformer_rl.agents.PPO.PPO_agent.PPOAgent.__init__', mock_init)
+
+    agent = PPOAgent()
+    agent.network = torch.nn.Linear(2, 2)
+    agent.config = mocker.Mock(autocast_dtype=None, overlapped_sampling=True, compile_inference=False, rollout_length=2)
+    agent.num_workers = 3
+    first_storage = agent.storage = mocker.Mock()
+    initial_weight = agent.network.weight.detach().clone()
+
+    samples = []
+    def sample():
+        samples.append((threading.current_thread() is threading.main_thread(), agent.storage, agent.behavior_network.weight.detach().clone()))
+    def optimize(batch):
+        with torch.no_grad():
+            agent.network.weight += 1
+    agent._sample = sample
+    agent._calculate_advantages = mocker.Mock()
+    agent._training_batch = lambda: agent.storage
+    agent._optimize = mocker.Mock(side_effect=optimize)
+
+    agent.step()
+    agent.step()
+
+    # the first samples are collected before training, and the following samples with the weights preceding each update
+    assert [in_main_thread for in_main_thread, _, _ in samples] == [True, False, False]
+    assert [storage for _, storage, _ in samples] == [first_storage, agent.spare_storage, first_storage]
+    for (_, _, weight), expected in zip(samples, [initial_weight, initial_weight, initial_weight + 1]):
+        assert torch.equal(weight, expected)
+    assert [call[0][0] for call in agent._optimize.call_args_list] == [first_storage, agent.spare_storage]
+    assert torch.equal(agent.behavior_network.weight, agent.network.weight)
 
 def test_train1(mocker):
     mocker.patch('conformer_rl.agents.PPO.PPO_agent.PPOAgent.__init__', mock_init)
@@ -40,6 +73,7 @@ def test_train1(mocker):
     config.optimization_epochs = 1
     config.mini_batch_size = 4
     config.ppo_ratio_clip = 0.2
+    config.autocast_dtype = None
 
     network = mocker.Mock()
     network.side_effect = [{
@@ -70,8 +104,8 @@ def test_train1(mocker):
     
 
     agent = PPOAgent()
-    agent.returns = [torch.tensor([3., 6, 4]), torch.tensor([2., 7, 13])]
-    agent.advantages = [torch.tensor([11., 5, 17]), torch.tensor([15., 1, 3])]
+    agent.returns = torch.tensor([[3., 6, 4], [2., 7, 13]])
+    agent.advantages = torch.tensor([[11., 5, 17], [15., 1, 3]])
     agent.optimizer = mocker.Mock()
     agent.train_logger = mocker.Mock()
     agent.total_steps = 0
@@ -110,6 +144,7 @@ def test_train2(mocker):
     config.optimization_epochs = 1
     config.mini_batch_size = 6
     config.ppo_ratio_clip = 0.2
+    config.autocast_dtype = None
 
     network = mocker.Mock()
     network.return_value = {
@@ -133,8 +168,8 @@ def test_train2(mocker):
     
 
     agent = PPOAgent()
-    agent.returns = [torch.tensor([3., 6, 4]), torch.tensor([2., 7, 13])]
-    agent.advantages = [torch.tensor([11., 5, 17]), torch.tensor([15., 1, 3])]
+    agent.returns = torch.tensor([[3., 6, 4], [2., 7, 13]])
+    agent.advantages = torch.tensor([[11., 5, 17], [15., 1, 3]])
     agent.optimizer = mocker.Mock()
     agent.train_logger = mocker.Mock()
     agent.total_steps = 0
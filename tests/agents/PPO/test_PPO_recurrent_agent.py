@@ -1,5 +1,10 @@
 import conformer_rl
+import numpy as np
+import pytest
 import torch
+from conformer_rl.environments.environments import GibbsScorePruningEnv
+from conformer_rl.models import RTGNGatRecurrent
+from conformer_rl.molecule_generation import generate_molecule_config
 from conformer_rl.agents.PPO.PPO_recurrent_agent import PPORecurrentAgent
 
 def mock_init(self):
@@ -15,7 +20,8 @@ def test_init(mocker):
 
     agent = PPORecurrentAgent(config)
 
-def test_train1(mocker):
+@pytest.mark.parametrize('sequence_training', [False, True])
+def test_train1(mocker, sequence_training):
     mocker.patch('conformer_rl.agents.PPO.PPO_recurrent_agent.PPORecurrentAgent.__init__', mock_init)
     backward = mocker.patch('torch.Tensor.backward')
     nn = mocker.patch('conformer_rl.agents.PPO.PPO_recurrent_agent.nn')
@@ -32,6 +38,9 @@ def test_train1(mocker):
     config.optimization_epochs = 1
     config.mini_batch_size = 4
     config.ppo_ratio_clip = 0.2
+    config.autocast_dtype = None
+    # networks other than the RTGN recurrent networks are called once for each step in either case
+    config.recurrent_sequence_training = sequence_training
 
     network = mocker.Mock()
     network.side_effect = [({
@@ -63,8 +72,8 @@ def test_train1(mocker):
     
 
     agent = PPORecurrentAgent()
-    agent.returns = [torch.tensor([3., 6, 4]), torch.tensor([2., 7, 13])]
-    agent.advantages = [torch.tensor([11., 5, 17]), torch.tensor([15., 1, 3])]
+    agent.returns = torch.tensor([[3., 6, 4], [2., 7, 13]])
+    agent.advantages = torch.tensor([[11., 5, 17], [15., 1, 3]])
     agent.optimizer = mocker.Mock()
     agent.train_logger = mocker.Mock()
     agent.total_steps = 0
@@ -105,6 +114,8 @@ def test_train2(mocker):
     config.optimization_epochs = 1
     config.mini_batch_size = 6
     config.ppo_ratio_clip = 0.2
+    config.autocast_dtype = None
+    config.recurrent_sequence_training = False
 
     network = mocker.Mock()
     network.return_value = ({
@@ -128,8 +139,8 @@ def test_train2(mocker):
     
 
     agent = PPORecurrentAgent()
-    agent.returns = [torch.tensor([3., 6, 4]), torch.tensor([2., 7, 13])]
-    agent.advantages = [torch.tensor([11., 5, 17]), torch.tensor([15., 1, 3])]
+    agent.returns = torch.tensor([[3., 6, 4], [2., 7, 13]])
+    agent.advantages = torch.tensor([[11., 5, 17], [15., 1, 3]])
     agent.optimizer = mocker.Mock()
     agent.train_logger = mocker.Mock()
     agent.total_steps = 0
@@ -169,6 +180,8 @@ def test_train1_recurrent(mocker):
     config.optimization_epochs = 1
     config.mini_batch_size = 4
     config.ppo_ratio_clip = 0.2
+    config.autocast_dtype = None
+    config.recurrent_sequence_training = False
 
     network = mocker.Mock()
     network.side_effect = [({
@@ -213,8 +226,8 @@ def test_train1_recurrent(mocker):
     
 
     agent = PPORecurrentAgent()
-    agent.returns = [torch.tensor([3., 6, 4]), torch.tensor([2., 7, 13])]
-    agent.advantages = [torch.tensor([11., 5, 17]), torch.tensor([15., 1, 3])]
+    agent.returns = torch.tensor([[3., 6, 4], [2., 7, 13]])
+    agent.advantages = torch.tensor([[11., 5, 17], [15., 1, 3]])
     agent.optimizer = mocker.Mock()
     agent.train_logger = mocker.Mock()
     agent.total_steps = 0
@@ -237,3 +250,62 @@ def test_train1_recurrent(mocker):
     assert(abs(args_list[3][0][1] - (7.46875)) < 1e-3)
     assert(abs(args_list[4][0][1].item() - 783.80249) < 1e-3)
     assert(backward.call_count == 2)
+
+def test_train_sequences_matches_steps(mocker):
+    mocker.patch('conformer_rl.agents.PPO.PPO_recurrent_agent.PPORecurrentAgent.__init__', mock_init)
+    mocker.patch('conformer_rl.agents.PPO.PPO_recurrent_agent.np.random.permutation', lambda arg: arg)
+
+    env = GibbsScorePruningEnv(generate_molecule_config.test_alkane_config())
+    states = [env.reset()]
+    for _ in range(7):
+        states.append(env.step(np.zeros(len(env.nonring), dtype=int))[0])
+    num_torsions = len(env.nonring)
+
+    torch.manual_seed(0)
+    network = RTGNGatRecurrent(6, 32, node_dim=5)
+    stored = {
+        'states': states,
+        'a': torch.randint(6, (8, num_torsions)),
+        'log_pi_a': -torch.rand(8, num_torsions),
+    }
+    for i in range(4):
+        stored[f'recurrent_states_{i}'] = torch.randn(1, 8, 32)
+    storage = mocker.Mock()
+    storage.order.side_effect = lambda key: stored[key]
+
+    config = mocker.Mock()
+    config.rollout_length = 4
+    config.entropy_weight = 0.01
+    config.value_loss_weight = 0.25
+    config.optimization_epochs = 1
+    config.mini_batch_size = 8
+    config.ppo_ratio_clip = 0.2
+    config.autocast_dtype = None
+    config.gradient_clip = 1e6
+
+    agent = PPORecurrentAgent()
+    agent.returns = torch.randn(4, 2, 1)
+    agent.advantages = torch.randn(4, 2, 1)
+    agent.optimizer = mocker.Mock()
+    agent.total_steps = 0
+    agent.storage = storage
+    agent.config = config
+    agent.network = network
+    agent.recurrence = 2
+    agent.num_recurrent_units = 4
+    agent.num_workers = 2
+
+    results = []
+    for sequence_training in [False, True]:
+        config.recurrent_sequence_training = sequence_training
+        agent.train_logger = mocker.Mock()
+        network.zero_grad()
+        agent._train()
+        losses = [call[0][1] for call in agent.train_logger.add_scalar.call_args_list[1:]]
+        results.append((losses, [param.grad.clone() for param in network.parameters()]))
+
+    (step_losses, step_grads), (sequence_losses, sequence_grads) = results
+    for step_loss, sequence_loss in zip(step_losses, sequence_losses):
+        assert abs(step_loss - sequence_loss) < 1e-5
+    for step_grad, sequence_grad in zip(step_grads, sequence_grads):
+        assert torch.allclose(step_grad, sequence_grad, atol=1e-6)
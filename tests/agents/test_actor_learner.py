@@ -0,0 +1,147 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+import torch
+
+from conformer_rl.agents.actor_learner import ActorLearnerPPOAgent, ActorPool, run_actor, _send
+from conformer_rl.agents.storage import Storage
+from conformer_rl.config import Config
+from conformer_rl.environments.simple_vec_env import SimpleVecEnv
+
+class CounterEnv:
+    def __init__(self):
+        self.state = 0
+
+    def step(self, action):
+        self.state += 1
+        return self.state, 1., self.state == 3, {}
+
+    def reset(self):
+        self.state = 0
+        return self.state
+
+    def close(self):
+        pass
+
+class TinyNetwork(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.logits = torch.nn.Linear(1, 3)
+        self.value = torch.nn.Linear(1, 1)
+
+    def forward(self, states, action=None):
+        x = torch.tensor(states, dtype=torch.float32).view(-1, 1)
+        dist = torch.distributions.Categorical(logits=self.logits(x).unsqueeze(1))
+        if action is None:
+            action = dist.sample()
+        return {'a': action, 'log_pi_a': dist.log_prob(action), 'ent': dist.entropy(), 'v': self.value(x)}
+
+def make_config(pool, tmp_path):
+    config = Config()
+    config.train_env = pool
+    config.network = TinyNetwork()
+    config.optimizer_fn = lambda params: torch.optim.Adam(params, lr=1e-2)
+    config.rollout_length = 3
+    config.mini_batch_size = 4
+    config.data_dir = str(tmp_path)
+    config.use_tensorboard = False
+    return config
+
+def task_fn():
+    return SimpleVecEnv([CounterEnv, CounterEnv])
+
+@pytest.mark.parametrize('address', ['unix', ('localhost', 0)])
+def test_local_actors(address, tmp_path, mocker):
+    pool = ActorPool(str(tmp_path / 'learner.sock') if address == 'unix' else address, num_actors=2)
+    context = multiprocessing.get_context('fork')
+    actors = [context.Process(target=run_actor, args=(pool.address, task_fn, TinyNetwork, pool.authkey)) for _ in range(2)]
+    for actor in actors:
+        actor.start()
+
+    agent = ActorLearnerPPOAgent(make_config(pool, tmp_path))
+    assert agent.num_workers == 4
+    agent.train_logger = mocker.Mock()
+    for _ in range(3):
+        agent.step()
+    assert agent.version == 3
+    assert agent.total_steps >= 3 * 4 * 3
+    lags = [args[0][1] for args in agent.train_logger.add_scalar.call_args_list if args[0][0] == 'policy_lag']
+    assert len(lags) >= 6
+    assert all(0 <= lag <= 2 for lag in lags)
+    returns = [args[0][1] for args in agent.train_logger.add_scalar.call_args_list if args[0][0] == 'episodic_return_train']
+    assert returns and all(r == 3. for r in returns)
+
+    pool.close()
+    for actor in actors:
+        actor.join(timeout=30)
+        assert actor.exitcode == 0
+
+def test_pool_env_method(tmp_path, mocker):
+    pool = ActorPool(str(tmp_path / 'learner.sock'), num_actors=2)
+    pool.connections = ['conn0', 'conn1']
+    pool.senders = [mocker.Mock(), mocker.Mock()]
+    pool.actor_num_envs = [2, 3]
+    pool.num_envs = 5
+
+    # one result for each environment, as for the other vector environments
+    assert pool.env_method('set_state', 'state') == [None] * 5
+    pool.senders[0].submit.assert_called_with(_send, 'conn0', ('env_method', 'set_state', ('state',), {}))
+    pool.senders[1].submit.assert_called_with(_send, 'conn1', ('env_method', 'set_state', ('state',), {}))
+
+    assert pool.env_method('set_state', 'state', indices=[3]) == [None]
+    pool.senders[1].submit.assert_called_with(_send, 'conn1', ('env_method', 'set_state', ('state',), {'indices': [1]}))
+    assert pool.senders[0].submit.call_count == 1
+    pool.listener.close()
+
+def rollout(network, num_envs, version):
+    states = [0] * num_envs
+    trajectories = [[] for _ in range(num_envs)]
+    with torch.no_grad():
+        for _ in range(3):
+            prediction = network(states)
+            for i in range(num_envs):
+                trajectories[i].append(({key: prediction[key][i:i + 1] for key in ('a', 'log_pi_a')}, states[i], 1., states[i] == 2))
+            states = [s + 1 for s in states]
+    return 0, version, trajectories, states, [], [[] for _ in range(num_envs)]
+
+def test_sample_recomputes_predictions(mocker):
+    mocker.patch.object(ActorLearnerPPOAgent, '__init__', lambda self: None)
+    stale_network, network = TinyNetwork(), TinyNetwork()
+    config = mocker.Mock()
+    config.rollout_length = 3
+    config.importance_weight_clip = 1.
+
+    agent = ActorLearnerPPOAgent()
+    agent.config = config
+    agent.network = network
+    agent.num_workers = 2
+    agent.storage = Storage(3, 2)
+    agent.version = 2
+    agent.total_steps = 0
+    agent.train_logger = mocker.Mock()
+    agent.pending_trajectories = []
+    agent.task = mocker.Mock()
+    agent.task.actor_num_envs = [3]
+    agent.task.receive.return_value = rollout(stale_network, 3, 0)
+
+    with torch.no_grad():
+        agent._sample()
+    assert agent.total_steps == 9
+    agent.train_logger.add_scalar.assert_called_once_with('policy_lag', 2, 9)
+    assert len(agent.pending_trajectories) == 1
+
+    storage = agent.storage
+    for step in range(3):
+        actions = storage['a'][step]
+        with torch.no_grad():
+            assert torch.allclose(storage['log_pi_behavior'][step], stale_network([step] * 2, actions)['log_pi_a'])
+            assert torch.allclose(storage['log_pi_a'][step], network([step] * 2, actions)['log_pi_a'])
+            assert torch.allclose(storage['v'][step], network([step] * 2)['v'])
+    assert len(storage['v']) == 4
+
+    weights = agent._importance_weights()
+    expected = (storage.order('log_pi_a') - storage.order('log_pi_behavior')).exp()
+    assert weights.shape == (6, 1)
+    assert torch.allclose(weights, expected.clamp(max=1.))
+    assert weights.max() <= 1.
@@ -1,5 +1,7 @@
 import conformer_rl
 from conformer_rl.agents.base_ac_agent import BaseACAgent
+from conformer_rl.agents.storage import Storage
+from conformer_rl.environments.simple_vec_env import SimpleVecEnv
 import numpy as np
 import pytest
 import torch
@@ -32,6 +34,7 @@ def test_step(mocker):
 
     agent = BaseACAgent()
     agent.storage = storage
+    agent.config = mocker.Mock(autocast_dtype=None)
     agent.step()
 
     conformer_rl.agents.base_ac_agent.BaseACAgent._sample.assert_called_once()
@@ -53,6 +56,8 @@ def test_sample(mocker):
 
     config = mocker.Mock()
     config.rollout_length = 4
+    config.double_buffer_sampling = False
+    config.straggler_tolerant_sampling = False
 
     train_logger = mocker.Mock()
 
@@ -73,6 +78,125 @@ def test_sample(mocker):
     assert(np.array_equal(agent.total_rewards, np.array([0, 0, 4, 4, 0, 4, 4])))
     assert(train_logger.add_scalar.call_count == 12)
 
+class CounterEnv:
+    def __init__(self, offset):
+        self.offset = offset
+        self.count = 0
+
+    def step(self, action):
+        self.count += 1
+        return self.offset + self.count, float(action[0]) + self.count, self.count % (3 + self.offset) == 0, {}
+
+    def reset(self):
+        self.count = 0
+        return self.offset
+
+def counter_network(states):
+    states = torch.tensor(states, dtype=torch.float).unsqueeze(-1)
+    return {'a': 2 * states, 'v': states + 0.5}
+
+def test_sample_double_buffered(mocker):
+    mocker.patch.object(conformer_rl.agents.base_ac_agent.BaseACAgent, '__init__', mock_init)
+
+    samples = []
+    for double_buffer_sampling in [False, True]:
+        config = mocker.Mock()
+        config.rollout_length = 5
+        config.double_buffer_sampling = double_buffer_sampling
+        config.straggler_tolerant_sampling = False
+
+        agent = BaseACAgent()
+        agent.config = config
+        agent.num_workers = 5
+        agent.storage = Storage(5, 5)
+        agent.task = SimpleVecEnv([lambda i=i: CounterEnv(i) for i in range(5)])
+        agent.states = agent.task.reset()
+        agent.total_steps = 0
+        agent.total_rewards = np.zeros(5)
+        agent.train_logger = mocker.Mock()
+        agent.network = counter_network
+
+        agent._sample()
+        samples.append(agent)
+
+    serial, double_buffered = samples
+    assert double_buffered.total_steps == serial.total_steps == 25
+    assert np.array_equal(double_buffered.total_rewards, serial.total_rewards)
+    assert double_buffered.train_logger.add_scalar.call_args_list == serial.train_logger.add_scalar.call_args_list
+    assert list(double_buffered.states) == list(serial.states)
+    for key in ['a', 'v', 'r', 'm', 'terminals']:
+        for x, y in zip(serial.storage[key], double_buffered.storage[key]):
+            assert torch.equal(x, y)
+    assert [list(x) for x in serial.storage['states']] == [list(x) for x in double_buffered.storage['states']]
+
+def test_sample_straggler_tolerant(mocker):
+    mocker.patch.object(conformer_rl.agents.base_ac_agent.BaseACAgent, '__init__', mock_init)
+
+    config = mocker.Mock()
+    config.rollout_length = 4
+    config.straggler_tolerant_sampling = True
+
+    agent = BaseACAgent()
+    agent.config = config
+    agent.num_workers = 3
+    agent.storage = Storage(4, 3)
+    # SimpleVecEnv.step_wait_any always returns the lowest pending worker, so worker 0 finishes first
+    agent.task = SimpleVecEnv([lambda i=i: CounterEnv(10 * i) for i in range(3)])
+    agent.states = agent.task.reset()
+    agent.total_steps = 0
+    agent.total_rewards = np.zeros(3)
+    agent.train_logger = mocker.Mock()
+    agent.network = counter_network
+    agent.worker_trajectories = [[], [], []]
+    agent.in_flight = {}
+
+    with pytest.raises(ValueError):
+        agent._sample()
+
+    with torch.no_grad():
+        agent._sample()
+    assert agent.total_steps == 12
+    assert len(agent.storage['r']) == 4
+    assert len(agent.storage['v']) == 5
+    # each trajectory holds consecutive steps of worker 0, whose episodes end every 3 steps
+    assert agent.storage.order('states') == [0, 1, 2, 0, 1, 2, 0, 1, 2, 0, 1, 2]
+    assert torch.equal(agent.storage.order('m').squeeze(), torch.tensor([1, 1, 0, 1, 1, 0, 1, 1, 0, 1, 1, 0]))
+    assert torch.equal(agent.storage['v'][4], torch.tensor([[1.5], [2.5], [0.5]]))
+    assert agent.storage.order('a').shape == (12, 1)
+    # the other workers are still running their first step and all workers are stepped again while training
+    assert sorted(agent.in_flight) == [0, 1, 2]
+    assert agent.in_flight[1][1] == 10
+
+    agent._calculate_advantages = BaseACAgent._calculate_advantages.__get__(agent)
+    config.use_gae = True
+    config.discount = 0.5
+    config.gae_lambda = 0.5
+    config.advantage_dtype = torch.float32
+    agent._calculate_advantages()
+    assert agent.advantages.shape == (4, 3, 1)
+
+    agent.storage = Storage(4, 3)
+    with torch.no_grad():
+        agent._sample()
+    assert agent.total_steps == 24
+    assert agent.storage.order('states')[:4] == [0, 1, 2, 0]
+    assert agent.train_logger.add_scalar.call_count == 8
+
+    # the steps still running are collected into the incomplete trajectories, e.g. before saving the agent
+    trajectory_lengths = [len(trajectory) for trajectory in agent.worker_trajectories]
+    agent._drain_in_flight()
+    assert agent.in_flight == {}
+    assert agent.total_steps == 27
+    assert [len(trajectory) for trajectory in agent.worker_trajectories] == [length + 1 for length in trajectory_lengths]
+
+def test_merge_predictions():
+    merged = BaseACAgent._merge_predictions([
+        {'a': torch.ones(2, 3), 'v': torch.ones(2, 1)},
+        {'a': torch.ones(1, 2), 'v': torch.zeros(1, 1)}
+    ])
+    assert torch.equal(merged['a'], torch.tensor([[1., 1., 1.], [1., 1., 1.], [1., 1., 0.]]))
+    assert torch.equal(merged['v'], torch.tensor([[1.], [1.], [0.]]))
+
 def test_calculate_advantages_sarsa(mocker):
     mocker.patch.object(conformer_rl.agents.base_ac_agent.BaseACAgent, '__init__', mock_init)
 
@@ -80,7 +204,7 @@ def test_calculate_advantages_sarsa(mocker):
     config.rollout_length = 7
     config.use_gae = False
     config.discount = 0.75
-    
+    config.advantage_dtype = torch.float32
 
     storage = {}
     storage['r'] = torch.tensor([12, 14, 29, 15, 10, 5, 19, 29])
@@ -96,8 +220,8 @@ def test_calculate_advantages_sarsa(mocker):
     agent.prediction = {'v': torch.tensor([2])}
     agent._calculate_advantages()
 
-    assert(torch.sum(torch.abs(torch.tensor([34.8125, 27.75, 28, 20.5, 6, 2, 13.5]).unsqueeze(0) - torch.tensor(agent.advantages))) < 1e-5)
-    assert(torch.sum(torch.abs(torch.tensor([38.8125, 35.75, 29, 22.5, 10, 5, 20.5]).unsqueeze(0) - torch.tensor(agent.returns))) < 1e-5)
+    assert(torch.sum(torch.abs(torch.tensor([34.8125, 27.75, 28, 20.5, 6, 2, 13.5]).unsqueeze(0) - agent.advantages)) < 1e-5)
+    assert(torch.sum(torch.abs(torch.tensor([38.8125, 35.75, 29, 22.5, 10, 5, 20.5]).unsqueeze(0) - agent.returns)) < 1e-5)
 
 def test_calculate_advantages_gae(mocker):
     mocker.patch.object(conformer_rl.agents.base_ac_agent.BaseACAgent, '__init__', mock_init)
@@ -107,7 +231,7 @@ def test_calculate_advantages_gae(mocker):
     config.use_gae = True
     config.gae_lambda = 0.5
     config.discount = 0.75
-    
+    config.advantage_dtype = torch.float32
 
     storage = {}
     storage['r'] = torch.tensor([12, 14, 29, 15, 10, 5, 19, 29])
@@ -122,9 +246,8 @@ def test_calculate_advantages_gae(mocker):
     agent._calculate_advantages()
 
 
-    assert(torch.sum(torch.abs(torch.tensor([38.8125, 35.75, 29, 22.5, 10, 5, 20.5]).unsqueeze(0) - torch.tensor(agent.returns))) < 1e-5)
-    print(agent.advantages)
-    assert(torch.sum(torch.abs(torch.tensor([20.46875, 17.25, 28, 18.25, 6, 2, 13.5]).unsqueeze(0) - torch.tensor(agent.advantages))) < 1e-5)
+    assert(torch.sum(torch.abs(torch.tensor([38.8125, 35.75, 29, 22.5, 10, 5, 20.5]).unsqueeze(0) - agent.returns)) < 1e-5)
+    assert(torch.sum(torch.abs(torch.tensor([20.46875, 17.25, 28, 18.25, 6, 2, 13.5]).unsqueeze(0) - agent.advantages)) < 1e-5)
 
 def test_train(mocker):
     mocker.patch.object(conformer_rl.agents.base_ac_agent.BaseACAgent, '__init__', mock_init)
@@ -134,3 +257,56 @@ def test_train(mocker):
 
 
 
+
+def reference_advantages(storage, final_value, config):
+    # the sequential estimation performed for each step separately
+    advantages, returns = [None] * config.rollout_length, [None] * config.rollout_length
+    adv = torch.zeros_like(final_value)
+    ret = final_value
+    for i in reversed(range(config.rollout_length)):
+        ret = storage['r'][i] + config.discount * storage['m'][i] * ret
+        if not config.use_gae:
+            adv = ret - storage['v'][i]
+        else:
+            td_error = storage['r'][i] + config.discount * storage['m'][i] * storage['v'][i + 1] - storage['v'][i]
+            adv = adv * config.gae_lambda * config.discount * storage['m'][i] + td_error
+        advantages[i] = adv
+        returns[i] = ret
+    return torch.stack(advantages), torch.stack(returns)
+
+@pytest.mark.parametrize('use_gae', [False, True])
+@pytest.mark.parametrize('rollout_length', [1, 5, 300])
+def test_calculate_advantages_matches_sequential(mocker, use_gae, rollout_length):
+    mocker.patch.object(conformer_rl.agents.base_ac_agent.BaseACAgent, '__init__', mock_init)
+
+    config = mocker.Mock()
+    config.rollout_length = rollout_length
+    config.use_gae = use_gae
+    config.gae_lambda = 0.95
+    config.discount = 0.9999
+
+    generator = torch.Generator().manual_seed(rollout_length)
+    storage = Storage(rollout_length, 4)
+    for _ in range(rollout_length):
+        storage.append({
+            'r': torch.rand((4, 1), generator=generator, dtype=torch.float64),
+            'm': (torch.rand((4, 1), generator=generator) > 0.1).long(),
+            'v': torch.randn((4, 1), generator=generator),
+        })
+    final_value = torch.randn((4, 1), generator=generator)
+    storage.append({'v': final_value})
+
+    agent = BaseACAgent()
+    agent.storage = storage
+    agent.num_workers = 4
+    agent.config = config
+    agent.prediction = {'v': final_value}
+    expected_advantages, expected_returns = reference_advantages(storage, final_value.double(), config)
+
+    for dtype, tolerance in [(torch.float64, 1e-10), (torch.float32, 1e-3)]:
+        config.advantage_dtype = dtype
+        agent._calculate_advantages()
+        assert agent.advantages.dtype == agent.returns.dtype == dtype
+        assert agent.advantages.shape == agent.returns.shape == (rollout_length, 4, 1)
+        assert torch.allclose(agent.advantages.double(), expected_advantages, atol=tolerance)
+        assert torch.allclose(agent.returns.double(), expected_returns, atol=tolerance)
@@ -1,5 +1,7 @@
 import conformer_rl
 from conformer_rl.agents.base_ac_agent_recurrent import BaseACAgentRecurrent
+from conformer_rl.agents.storage import Storage
+from conformer_rl.environments.simple_vec_env import SimpleVecEnv
 import numpy as np
 import pytest
 import torch
@@ -19,12 +21,17 @@ def test_init(mocker):
 
     config = mocker.Mock()
     config.recurrence = 10
+    config.straggler_tolerant_sampling = False
 
     agent = BaseACAgentRecurrent(config)
     assert(agent.recurrence == 10)
     assert(agent.num_recurrent_units == 2)
     for state in agent.recurrent_states:
         assert(torch.all(torch.eq(state, torch.zeros(state.shape))))
+
+    config.straggler_tolerant_sampling = True
+    with pytest.raises(ValueError):
+        BaseACAgentRecurrent(config)
     
 def test_step(mocker):
     storage = mocker.Mock()
@@ -35,6 +42,7 @@ def test_step(mocker):
 
     agent = BaseACAgentRecurrent()
     agent.storage = storage
+    agent.config = mocker.Mock(autocast_dtype=None)
     agent.step()
 
     conformer_rl.agents.base_ac_agent_recurrent.BaseACAgentRecurrent._sample.assert_called_once()
@@ -56,6 +64,7 @@ def test_sample(mocker):
 
     config = mocker.Mock()
     config.rollout_length = 4
+    config.double_buffer_sampling = False
 
     train_logger = mocker.Mock()
 
@@ -80,4 +89,58 @@ def test_sample(mocker):
     for idx, done in enumerate([1, 1, 0, 0, 1, 0, 0]):
         if done:
             for i in range(2):
-                assert(torch.all(torch.eq(agent.recurrent_states[i][:, idx], torch.zeros(agent.recurrent_states[i][:, idx].shape))))
\ No newline at end of file
+                assert(torch.all(torch.eq(agent.recurrent_states[i][:, idx], torch.zeros(agent.recurrent_states[i][:, idx].shape))))
+
+class CounterEnv:
+    def __init__(self, offset):
+        self.offset = offset
+        self.count = 0
+
+    def step(self, action):
+        self.count += 1
+        return self.offset + self.count, float(action[0]) + self.count, self.count % (3 + self.offset) == 0, {}
+
+    def reset(self):
+        self.count = 0
+        return self.offset
+
+def counter_network(states, recurrent_states):
+    states = torch.tensor(states, dtype=torch.float).unsqueeze(-1)
+    h, c = recurrent_states
+    h = 0.5 * h + states.unsqueeze(0)
+    c = c + 1
+    return {'a': 2 * states + h[0, :, :1], 'v': states + c[0, :, :1]}, (h, c)
+
+def test_sample_double_buffered(mocker):
+    mocker.patch.object(conformer_rl.agents.base_ac_agent_recurrent.BaseACAgentRecurrent, '__init__', mock_init)
+
+    samples = []
+    for double_buffer_sampling in [False, True]:
+        config = mocker.Mock()
+        config.rollout_length = 6
+        config.double_buffer_sampling = double_buffer_sampling
+
+        agent = BaseACAgentRecurrent()
+        agent.config = config
+        agent.num_workers = 5
+        agent.storage = Storage(6, 5)
+        agent.task = SimpleVecEnv([lambda i=i: CounterEnv(i) for i in range(5)])
+        agent.states = agent.task.reset()
+        agent.total_steps = 0
+        agent.total_rewards = np.zeros(5)
+        agent.train_logger = mocker.Mock()
+        agent.network = counter_network
+        agent.recurrent_states = (torch.zeros(1, 5, 2), torch.zeros(1, 5, 2))
+
+        agent._sample()
+        samples.append(agent)
+
+    serial, double_buffered = samples
+    assert double_buffered.total_steps == serial.total_steps == 30
+    assert np.array_equal(double_buffered.total_rewards, serial.total_rewards)
+    for x, y in zip(serial.recurrent_states, double_buffered.recurrent_states):
+        assert torch.equal(x, y)
+    for key in ['a', 'v', 'r', 'm', 'recurrent_states_0', 'recurrent_states_1']:
+        assert len(serial.storage[key]) == len(double_buffered.storage[key])
+        for x, y in zip(serial.storage[key], double_buffered.storage[key]):
+            assert torch.equal(x, y)
@@ -1,6 +1,7 @@
 import conformer_rl
 from conformer_rl.agents.base_agent import BaseAgent
 import sys
+import torch
 import pytest
 
 
@@ -34,18 +35,27 @@ def test_init(mocker):
     config.use_tensorboard=False
     config.train_env.num_envs = 5
     config.network.parameters.return_value = 'params'
+    config.lite_train_info = True
 
     agent = BaseAgent(config)
     conformer_rl.agents.base_agent.Storage.assert_called_with(7, 5)
     conformer_rl.agents.base_agent.EnvLogger.assert_called_with(unique_tag, data_dir)
     config.optimizer_fn.assert_called_with('params')
     conformer_rl.agents.base_agent.TrainLogger.assert_called_with(unique_tag, data_dir, False, False, False)
+    config.train_env.env_method.assert_called_with('set_info_mode', 'lite')
+
+    # environments without info modes are left alone by default
+    config.train_env.reset_mock()
+    config.lite_train_info = False
+    agent = BaseAgent(config)
+    config.train_env.env_method.assert_not_called()
 
 def test_run_steps(mocker):
 
     config = mocker.Mock()
     config.save_interval = 2
     config.eval_interval = 2
+    config.checkpoint_interval = 3
     config.max_steps = 4
 
     task = mocker.Mock()
@@ -53,25 +63,64 @@ def test_run_steps(mocker):
 
     save = mocker.Mock()
     evaluate = mocker.Mock()
+    save_checkpoint = mocker.Mock()
+    wait_for_checkpoint = mocker.Mock()
     step = mocker.spy(sys.modules[__name__], 'mock_step')
 
     mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, '__init__', mock_init)
     mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'save', save)
     mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'evaluate', evaluate)
+    mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'save_checkpoint', save_checkpoint)
+    mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'wait_for_checkpoint', wait_for_checkpoint)
     mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'step', mock_step)
     mocker.patch('conformer_rl.agents.base_agent.mkdir')
 
     agent = BaseAgent()
     agent.config = config
     agent.task = task
+    agent.checkpoint_path = 'checkpoint'
     agent.run_steps()
 
     assert(step.call_count == 4)
     assert(save.call_count == 2)
+    assert(save_checkpoint.call_count == 2)
+    save_checkpoint.assert_called_with('checkpoint')
+    assert(wait_for_checkpoint.call_count == 1)
     assert(evaluate.call_count == 2)
     assert(task.close.call_count == 1)
     conformer_rl.agents.base_agent.mkdir.assert_called_with('test_dir/models/unique_tag')
 
+def test_run_steps_varying_steps(mocker):
+    config = mocker.Mock()
+    config.save_interval = 2
+    config.eval_interval = 4
+    config.checkpoint_interval = 0
+    config.max_steps = 12
+
+    mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, '__init__', mock_init)
+    save = mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'save')
+    evaluate = mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'evaluate')
+    save_checkpoint = mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'save_checkpoint')
+    mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'wait_for_checkpoint')
+    mocker.patch('conformer_rl.agents.base_agent.mkdir')
+
+    # agents such as the straggler-tolerant ones take a varying number of steps in each iteration
+    steps = iter([3, 2, 4, 3])
+    def step(self):
+        self.total_steps += next(steps)
+    mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, 'step', step)
+
+    agent = BaseAgent()
+    agent.config = config
+    agent.task = mocker.Mock()
+    agent.run_steps()
+
+    # the actions are performed when the steps reach or pass a multiple of their interval: at steps 0, 3, 5 and 9
+    assert [c.args[0] for c in save.call_args_list] == ['test_dir/models/unique_tag/0.model', 'test_dir/models/unique_tag/3.model',
+        'test_dir/models/unique_tag/5.model', 'test_dir/models/unique_tag/9.model']
+    assert evaluate.call_count == 3
+    save_checkpoint.assert_not_called()
+
 def test_save_load(mocker):
     mocker.patch.object(conformer_rl.agents.base_agent.BaseAgent, '__init__', mock_init)
     mocker.patch('conformer_rl.agents.base_agent.save_model')
@@ -97,6 +146,8 @@ def test_save_evaluate(mocker):
     config.eval_episodes = 4
     config.eval_env.reset.return_value = 'reset_state'
     config.eval_env.step.return_value = ('state', 'reward', True, [{'step_info': 'log1', 'episode_info': {'total_rewards': 100}}])
+    config.eval_env.env_method.return_value = ['lite', 'full']
+    config.lite_train_info = True
 
     eval_logger = mocker.Mock()
     train_logger = mocker.Mock()
@@ -112,6 +163,12 @@ def test_save_evaluate(mocker):
     agent.evaluate()
 
     assert(config.eval_env.reset.call_count == 4)
+    # the previous info modes are restored, in case the evaluation environment is also used for training
+    assert config.eval_env.env_method.call_args_list == [
+        mocker.call('set_info_mode', 'full'),
+        mocker.call('set_info_mode', 'lite', indices=[0]),
+        mocker.call('set_info_mode', 'full', indices=[1]),
+    ]
     network.assert_called_with('reset_state')
     conformer_rl.agents.base_agent.to_np.assert_called_with('action')
     eval_logger.log_episode.assert_called_with({'total_rewards': 100})
@@ -124,3 +181,35 @@ def test_unimplemented(mocker):
 
     with pytest.raises(NotImplementedError):
         agent.step()
+
+def test_step_timings(mocker):
+    mocker.patch.object(BaseAgent, '__init__', lambda self: None)
+    agent = BaseAgent()
+    agent.train_logger = mocker.Mock()
+    agent.total_steps = 12
+
+    step_timings = [[], [], []]
+    infos = [{'step_info': {'timings': {'obs': 1., 'total': 3.}}}, {}, {'step_info': {'timings': {'obs': 2., 'total': 5.}}}]
+    agent._record_step_timings(step_timings, [0, 1, 2], infos)
+    agent._record_step_timings(step_timings, [2], [{'step_info': {'timings': {'obs': 4., 'total': 7.}}}])
+    assert step_timings == [[infos[0]['step_info']['timings']], [], [infos[2]['step_info']['timings'], {'obs': 4., 'total': 7.}]]
+
+    agent._log_step_timings(step_timings)
+    calls = {args[0][0]: args[0][1] for args in agent.train_logger.add_percentiles.call_args_list}
+    assert calls == {'step_time/worker_0': [3.], 'step_time/worker_2': [5., 7.], 'step_time/obs': [1., 2., 4.], 'step_time/total': [3., 5., 7.]}
+    assert all(args[0][2] == 12 for args in agent.train_logger.add_percentiles.call_args_list)
+
+def test_autocast(mocker):
+    mocker.patch.object(BaseAgent, '__init__', lambda self: None)
+    agent = BaseAgent()
+    agent.config = mocker.Mock()
+    linear = torch.nn.Linear(4, 4).to(conformer_rl.agents.base_agent.device)
+    x = torch.ones(1, 4).to(conformer_rl.agents.base_agent.device)
+
+    agent.config.autocast_dtype = None
+    with agent._autocast():
+        assert linear(x).dtype == torch.float32
+
+    agent.config.autocast_dtype = torch.bfloat16
+    with agent._autocast():
+        assert linear(x).dtype == torch.bfloat16
@@ -45,3 +45,33 @@ def test_storage():
     storage.reset()
     assert(storage.storage == {})
 
+
+def test_buffers_reused():
+    storage = Storage(2, 3)
+    for _ in range(2):
+        storage.reset()
+        for i in range(3):
+            storage.append({'v': torch.full((3, 1), float(i)), 'states': [(i, j) for j in range(3)]})
+        buffer = storage._buffers['v']
+        assert storage['v'].data_ptr() == buffer.data_ptr()
+        assert len(storage['v']) == 3
+        assert storage['states'][2][1] == (2, 1)
+
+    assert storage.order('v').squeeze(-1).tolist() == [0., 1.] * 3
+    assert storage.order('states') == [(0, 0), (1, 0), (0, 1), (1, 1), (0, 2), (1, 2)]
+    storage.reset()
+    storage.append({'v': torch.zeros((3, 1))})
+    assert storage._buffers['v'] is buffer
+
+def test_list_fallback():
+    storage = Storage(2, 2)
+    weight = torch.ones(1, requires_grad=True)
+    storage.append({'v': torch.ones((2, 1)) * weight, 'a': torch.zeros((2, 3))})
+    storage.append({'v': torch.ones((2, 1)) * 2 * weight, 'a': torch.ones((2, 4))})
+    assert isinstance(storage['v'], list) and isinstance(storage['a'], list)
+    assert storage['a'][0].shape == (2, 3) and storage['a'][1].shape == (2, 4)
+
+    ordered = storage.order('v')
+    assert ordered.squeeze(-1).tolist() == [1., 2., 1., 2.]
+    ordered.sum().backward()
+    assert weight.grad.item() == 6.
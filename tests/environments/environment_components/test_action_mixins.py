@@ -1,10 +1,14 @@
 import conformer_rl
 from conformer_rl.environments.environment_components.action_mixins import ContinuousActionMixin, DiscreteActionMixin
+from conformer_rl.config import MolConfig
+from conformer_rl.utils import LRUCache
 from rdkit import Chem
+import numpy as np
+import pytest
 
 def test_continuous(mocker):
-    setDihedrals = mocker.patch('conformer_rl.environments.environment_components.action_mixins.Chem.rdMolTransforms.SetDihedralDeg')
-    MMFFOptimize = mocker.patch('conformer_rl.environments.environment_components.action_mixins.Chem.AllChem.MMFFOptimizeMolecule')
+    MMFFOptimize = mocker.patch('conformer_rl.environments.environment_components.action_mixins.optimize_conformer')
+    MMFFOptimize.return_value = (True, 7.)
 
     env = ContinuousActionMixin()
     mol = Chem.MolFromSmiles('CCCCCCCC')
@@ -12,26 +16,33 @@ def test_continuous(mocker):
     Chem.AllChem.EmbedMolecule(mol)
     env.mol = mol
     env.conf = mol.GetConformer()
+    env.mmff_context = None
+    env.precomputed_relaxation = None
+    env.config = MolConfig()
+    env.step_info = {}
+    env.step_timings = {}
     env.episode_info = {}
     env.episode_info['mol'] = mol
     env.nonring = [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]]
+    env.torsion_driver = mocker.Mock()
 
     env._step([123, 456, 789])
-    assert setDihedrals.call_count == 3
-    args_list = setDihedrals.call_args_list
-    assert args_list == [
-        mocker.call(env.conf, 1, 2, 3, 4, 123.),
-        mocker.call(env.conf, 5, 6, 7, 8, 456.),
-        mocker.call(env.conf, 9, 10, 11, 12, 789.)
-    ]
+    env.torsion_driver.set_torsions.assert_called_once()
+    conf, angles = env.torsion_driver.set_torsions.call_args.args
+    assert conf is env.conf
+    assert angles.tolist() == [123., 456., 789.]
 
     MMFFOptimize.assert_called_once()
+    assert env.relaxed_energy == 7.
+    assert env.relaxation_converged
+    assert env.step_info['converged']
+    assert set(env.step_timings) == {'torsions', 'relaxation'}
 
     assert env.episode_info['mol'].GetNumConformers() == 2
 
 def test_discrete(mocker):
-    setDihedrals = mocker.patch('conformer_rl.environments.environment_components.action_mixins.Chem.rdMolTransforms.SetDihedralDeg')
-    MMFFOptimize = mocker.patch('conformer_rl.environments.environment_components.action_mixins.Chem.AllChem.MMFFOptimizeMolecule')
+    MMFFOptimize = mocker.patch('conformer_rl.environments.environment_components.action_mixins.optimize_conformer')
+    MMFFOptimize.return_value = (True, 7.)
 
     env = DiscreteActionMixin()
     mol = Chem.MolFromSmiles('CCCCCCCC')
@@ -39,20 +50,153 @@ def test_discrete(mocker):
     Chem.AllChem.EmbedMolecule(mol)
     env.mol = mol
     env.conf = mol.GetConformer()
+    env.mmff_context = None
+    env.precomputed_relaxation = None
+    env.action_cache = None
+    env.pending_cache_entry = None
+    env.config = MolConfig()
+    env.step_info = {}
+    env.step_timings = {}
     env.episode_info = {}
     env.episode_info['mol'] = mol
     env.nonring = [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]]
+    env.torsion_driver = mocker.Mock()
 
     env._step([0, 2, 3])
-    assert setDihedrals.call_count == 3
-    args_list = setDihedrals.call_args_list
-    assert args_list == [
-        mocker.call(env.conf, 1, 2, 3, 4, -180.),
-        mocker.call(env.conf, 5, 6, 7, 8, -60.),
-        mocker.call(env.conf, 9, 10, 11, 12, 0.)
-    ]
+    env.torsion_driver.set_torsions.assert_called_once()
+    conf, angles = env.torsion_driver.set_torsions.call_args.args
+    assert conf is env.conf
+    assert angles.tolist() == [-180., -60., 0.]
 
     MMFFOptimize.assert_called_once()
+    assert env.relaxed_energy == 7.
+    assert env.relaxation_converged
+    assert env.step_info['converged']
+    assert set(env.step_timings) == {'torsions', 'relaxation'}
 
     assert env.episode_info['mol'].GetNumConformers() == 2
 
+
+def test_relax_modes(mocker):
+    MMFFOptimize = mocker.patch('conformer_rl.environments.environment_components.action_mixins.optimize_conformer')
+    MMFFOptimize.return_value = (False, 7.)
+
+    env = DiscreteActionMixin()
+    env.mol = mocker.Mock()
+    env.mol.GetNumConformers.return_value = 1
+    env.mmff_context = 'context'
+    env.precomputed_relaxation = None
+    env.nonring = [[1, 2, 3, 4]]
+    env.step_info = {}
+    env.step_timings = {}
+    env.config = MolConfig()
+    env.config.relax_max_iters = 20
+    env.config.relax_restrain_torsions = True
+
+    env._relax()
+    MMFFOptimize.assert_called_with(env.mol, confId=0, mmff_context='context', max_iters=20, force_tol=1e-4, energy_tol=1e-6,
+        non_bonded_thresh=10., restrained_torsions=[[1, 2, 3, 4]], torsion_force_constant=100., cutoff_energy=False)
+    assert not env.relaxation_converged
+
+    env.config.relax_mode = 'exact'
+    env.config.relax_restrain_torsions = False
+    env.config.relax_cutoff_energy = True
+    env._relax()
+    MMFFOptimize.assert_called_with(env.mol, confId=0, mmff_context='context', max_iters=10000, force_tol=1e-4, energy_tol=1e-6,
+        non_bonded_thresh=100., restrained_torsions=None, torsion_force_constant=100., cutoff_energy=True)
+
+    env.config.relax_mode = 'unknown'
+    with pytest.raises(ValueError):
+        env._relax()
+
+def test_precomputed_relaxation(mocker):
+    MMFFOptimize = mocker.patch('conformer_rl.environments.environment_components.action_mixins.optimize_conformer')
+
+    env = DiscreteActionMixin()
+    mol = Chem.MolFromSmiles('CCCC')
+    Chem.AllChem.EmbedMolecule(mol)
+    env.conf = mol.GetConformer()
+    env.step_info = {}
+    env.step_timings = {}
+    env.precomputed_relaxation = ([[float(i)] * 3 for i in range(4)], True, 3.)
+
+    env._relax()
+    MMFFOptimize.assert_not_called()
+    assert env.relaxed_energy == 3.
+    assert env.relaxation_converged
+    assert env.precomputed_relaxation is None
+    assert env.conf.GetPositions()[2].tolist() == [2., 2., 2.]
+
+def test_action_cache(mocker):
+    MMFFOptimize = mocker.patch('conformer_rl.environments.environment_components.action_mixins.optimize_conformer')
+    MMFFOptimize.return_value = (True, 7.)
+
+    env = DiscreteActionMixin()
+    mol = Chem.MolFromSmiles('CCCC')
+    Chem.AllChem.EmbedMolecule(mol, randomSeed=0)
+    env.mol = mol
+    env.conf = mol.GetConformer()
+    env.mmff_context = None
+    env.precomputed_relaxation = None
+    env.action_cache = LRUCache(2)
+    env.pending_cache_entry = None
+    env.config = MolConfig()
+    env.step_info = {}
+    env.step_timings = {}
+    env.episode_info = {'mol': Chem.Mol(mol)}
+    env.episode_info['mol'].RemoveAllConformers()
+    env.nonring = [[0, 1, 2, 3]]
+    env.torsion_driver = mocker.Mock()
+    start = env.conf.GetPositions()
+    rotation = np.array([[0., -1., 0.], [1., 0., 0.], [0., 0., 1.]])
+
+    def set_torsions(conf, angles):
+        conf.SetAtomPosition(3, [angles[0], 0., 0.])
+    env.torsion_driver.set_torsions.side_effect = set_torsions
+
+    env._step([1])
+    assert MMFFOptimize.call_count == 1
+    assert env.step_info['action_cache_hits'] == 0
+    assert env.step_info['action_cache_misses'] == 1
+    relaxed = env.conf.GetPositions()
+
+    # same action from the same starting geometry after a rigid motion
+    env.conf.SetPositions(start @ rotation.T + [1., 2., 3.])
+    env.step_info = {}
+    env.step_timings = {}
+    env._step([1])
+    assert MMFFOptimize.call_count == 1
+    assert env.step_info['action_cache_hits'] == 1
+    assert env.step_info['action_cache_misses'] == 1
+    assert env.relaxed_energy == 7.
+    assert np.allclose(env.conf.GetPositions(), relaxed @ rotation.T + [1., 2., 3.])
+
+    # same action from a different starting geometry
+    env._step([1])
+    assert MMFFOptimize.call_count == 2
+    assert env.step_info['action_cache_misses'] == 2
+    assert env.episode_info['mol'].GetNumConformers() == 3
+
+@pytest.mark.parametrize('mixin', [ContinuousActionMixin, DiscreteActionMixin])
+def test_step_precomputed_relaxation(mocker, mixin):
+    MMFFOptimize = mocker.patch('conformer_rl.environments.environment_components.action_mixins.optimize_conformer')
+
+    env = mixin()
+    mol = Chem.MolFromSmiles('CCCC')
+    Chem.AllChem.EmbedMolecule(mol)
+    env.conf = mol.GetConformer()
+    env.action_cache = None
+    env.pending_cache_entry = None
+    env.step_info = {}
+    env.step_timings = {}
+    env.episode_info = {'mol': Chem.Mol(mol)}
+    env.torsion_driver = mocker.Mock()
+    env.precomputed_relaxation = ([[float(i)] * 3 for i in range(4)], True, 3.)
+
+    # the torsions were set before relaxing the conformer outside of the environment
+    env._step([1])
+    env.torsion_driver.set_torsions.assert_not_called()
+    MMFFOptimize.assert_not_called()
+    assert 'torsions' not in env.step_timings
+    assert env.relaxed_energy == 3.
+    assert env.conf.GetPositions()[2].tolist() == [2., 2., 2.]
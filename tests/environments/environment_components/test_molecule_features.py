@@ -1,6 +1,8 @@
-from conformer_rl.environments.environment_components.molecule_features import bond_type, get_bond_pairs, atom_coords, atom_type_CO
+from conformer_rl.environments.environment_components.molecule_features import bond_type, get_bond_pairs, atom_coords, atom_type_CO, GraphTopology
 import pytest
 from rdkit import Chem
+from rdkit.Chem import AllChem
+import numpy as np
 
 
 def test_bond_type():
@@ -47,3 +49,16 @@ def test_atom_type_CO(mocker):
     assert atom_type_CO(carbon) == [1, 0]
     assert atom_type_CO(oxygen) == [0, 1]
 
+
+def test_graph_topology():
+    mol = Chem.AddHs(Chem.MolFromSmiles('[2H]C(O)C=O'))
+    AllChem.EmbedMolecule(mol, randomSeed=0)
+    heavy = Chem.RemoveHs(mol)
+    topology = GraphTopology(mol)
+
+    assert topology.mol is mol
+    assert [mol.GetAtomWithIdx(int(i)).GetSymbol() for i in topology.heavy_atoms] == [atom.GetSymbol() for atom in heavy.GetAtoms()]
+    assert topology.edge_index.tolist() == get_bond_pairs(heavy)
+    assert topology.edge_attr.tolist() == [bond_type(bond) for bond in heavy.GetBonds() for _ in range(2)]
+    assert topology.atom_types.tolist() == [atom_type_CO(atom) for atom in heavy.GetAtoms()]
+    assert np.allclose(topology.heavy_atom_positions(mol.GetConformer()), heavy.GetConformer().GetPositions(), atol=1e-5)
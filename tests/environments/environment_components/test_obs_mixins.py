@@ -1,76 +1,40 @@
-from conformer_rl.environments.environment_components.obs_mixins import GraphObsMixin, AtomTypeGraphObsMixin, AtomCoordsTypeGraphObsMixin
+from conformer_rl.environments.environment_components.obs_mixins import GraphObsMixin, AtomTypeGraphObsMixin, AtomCoordsTypeGraphObsMixin, normalize_positions
+from conformer_rl.environments.environment_components import molecule_features
+from rdkit import Chem
+from rdkit.Chem import AllChem
+from torch_geometric.data import Data
+from torch_geometric.transforms import Center, NormalizeRotation
+import numpy as np
 import torch
 
-def atype(atom):
-    d = {
-        'a1': [1, 0],
-        'a2': [0, 1],
-        'a3': [1, 0]
-    }
-    return d[atom]
-
-def acoords(atom, conf):
-    d = {
-        'a1': [1, 2, 3],
-        'a2': [4, 5, 6],
-        'a3': [7, 8, 9]
-    }
-    return d[atom]
-
-def btype(bond):
-    d = {
-        'b1': [1, 0, 1, 1, 0, 1],
-        'b2': [0, 1, 1, 0, 1, 1]
-    }
-    return d[bond]
-
-def test_GraphObsMixin(mocker):
+def mock_env(mocker, env):
     mol = mocker.Mock()
-    mol.GetConformer.return_value = mol.conf
-    mol.conf.return_value = 'conf'
-    mol.conf.GetPositions.return_value = [[1, 1, 1], [2, 2, 2], [3, 3, 3]]
-    mol.GetAtoms.return_value = ['a1', 'a2', 'a3']
-    mol.GetBonds.return_value = ['b1', 'b2']
-
-    removeHs = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.Chem.rdmolops.RemoveHs')
-    removeHs.return_value = mol
-    bond_type = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.molecule_features.bond_type')
-    bond_type.side_effect = btype
-    atom_coords = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.molecule_features.atom_coords')
-    atom_coords.side_effect = acoords
-    bond_pairs = mocker.patch('conformer_rl.environments.environment_components.molecule_features.get_bond_pairs')
-    bond_pairs.return_value = [[0, 1, 1, 2, 2, 0], [1, 0, 2, 1, 0, 2]]
+    mol.GetConformer.return_value = 'conf'
+
+    topology = mocker.Mock()
+    topology.mol = mol
+    topology.heavy_atom_positions.return_value = np.array([[1., 1, 1], [2, 2, 2], [3, 3, 3]], dtype=np.float32)
+    topology.edge_index = torch.tensor([[0, 1, 1, 2, 2, 0], [1, 0, 2, 1, 0, 2]])
+    topology.edge_attr = torch.tensor([[1., 0, 1, 1, 0, 1], [1., 0, 1, 1, 0, 1], [0., 1, 1, 0, 1, 1], [0., 1, 1, 0, 1, 1]])
+    topology.atom_types = torch.tensor([[1., 0], [0, 1], [1, 0]])
 
-    env = GraphObsMixin()
     env.mol = mol
+    env.graph_topology = topology
     env.nonring = 'nonring'
+    return env
+
+def test_GraphObsMixin(mocker):
+    env = mock_env(mocker, GraphObsMixin())
     data, nonring = env._obs()
 
+    env.graph_topology.heavy_atom_positions.assert_called_with('conf')
     assert torch.sum(torch.abs(data.x - torch.tensor([[1.732, 0, 0], [0, 0, 0], [-1.732, 0, 0]]))) < 1e-2
     assert torch.all(torch.eq(data.edge_index, torch.tensor([[0, 1, 1, 2, 2, 0], [1, 0, 2, 1, 0, 2]])))
     assert torch.all(torch.eq(data.edge_attr, torch.tensor([[1., 0, 1, 1, 0, 1], [1., 0, 1, 1, 0, 1], [0., 1, 1, 0, 1, 1], [0., 1, 1, 0, 1, 1]])))
     assert nonring == 'nonring'
 
 def test_AtomTypeGraphObsMixin(mocker):
-    mol = mocker.Mock()
-    mol.GetConformer.return_value = mol.conf
-    mol.conf.return_value = 'conf'
-    mol.conf.GetPositions.return_value = [[1, 1, 1], [2, 2, 2], [3, 3, 3]]
-    mol.GetAtoms.return_value = ['a1', 'a2', 'a3']
-    mol.GetBonds.return_value = ['b1', 'b2']
-
-    removeHs = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.Chem.rdmolops.RemoveHs')
-    removeHs.return_value = mol
-    atom_type = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.molecule_features.atom_type_CO')
-    atom_type.side_effect = atype
-    bond_type = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.molecule_features.bond_type')
-    bond_type.side_effect = btype
-    bond_pairs = mocker.patch('conformer_rl.environments.environment_components.molecule_features.get_bond_pairs')
-    bond_pairs.return_value = [[0, 1, 1, 2, 2, 0], [1, 0, 2, 1, 0, 2]]
-
-    env = AtomTypeGraphObsMixin()
-    env.mol = mol
-    env.nonring = 'nonring'
+    env = mock_env(mocker, AtomTypeGraphObsMixin())
     data, nonring = env._obs()
 
     assert torch.sum(torch.abs(data.x - torch.tensor([[1, 0], [0, 1], [1, 0]]))) < 1e-2
@@ -80,31 +44,54 @@ def test_AtomTypeGraphObsMixin(mocker):
 
 
 def test_AtomCoordsTypeGraphObsMixin(mocker):
-    mol = mocker.Mock()
-    mol.GetConformer.return_value = mol.conf
-    mol.conf.return_value = 'conf'
-    mol.conf.GetPositions.return_value = [[1, 1, 1], [2, 2, 2], [3, 3, 3]]
-    mol.GetAtoms.return_value = ['a1', 'a2', 'a3']
-    mol.GetBonds.return_value = ['b1', 'b2']
-
-    removeHs = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.Chem.rdmolops.RemoveHs')
-    removeHs.return_value = mol
-    atom_type = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.molecule_features.atom_type_CO')
-    atom_type.side_effect = atype
-    bond_type = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.molecule_features.bond_type')
-    bond_type.side_effect = btype
-    atom_coords = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.molecule_features.atom_coords')
-    atom_coords.side_effect = acoords
-    bond_pairs = mocker.patch('conformer_rl.environments.environment_components.molecule_features.get_bond_pairs')
-    bond_pairs.return_value = [[0, 1, 1, 2, 2, 0], [1, 0, 2, 1, 0, 2]]
-
-    env = AtomCoordsTypeGraphObsMixin()
-    env.mol = mol
-    env.nonring = 'nonring'
+    env = mock_env(mocker, AtomCoordsTypeGraphObsMixin())
     data, nonring = env._obs()
 
     assert torch.sum(torch.abs(data.x - torch.tensor([[1, 0, 1.732, 0, 0], [0, 1, 0, 0, 0], [1, 0, -1.732, 0, 0]]))) < 1e-2
     assert torch.all(torch.eq(data.edge_index, torch.tensor([[0, 1, 1, 2, 2, 0], [1, 0, 2, 1, 0, 2]])))
     assert torch.all(torch.eq(data.edge_attr, torch.tensor([[1., 0, 1, 1, 0, 1], [1., 0, 1, 1, 0, 1], [0., 1, 1, 0, 1, 1], [0., 1, 1, 0, 1, 1]])))
+    assert torch.sum(torch.abs(env.graph_topology.atom_types - torch.tensor([[1., 0], [0, 1], [1, 0]]))) == 0
     assert nonring == 'nonring'
-    
\ No newline at end of file
+
+def test_graph_topology_cache(mocker):
+    topology = mocker.patch('conformer_rl.environments.environment_components.obs_mixins.molecule_features.GraphTopology')
+    env = GraphObsMixin()
+    env.mol = 'mol1'
+    env.graph_topology = None
+    env._graph_topology()
+    topology.assert_called_once_with('mol1')
+    topology.return_value.mol = 'mol1'
+    env._graph_topology()
+    assert topology.call_count == 1
+
+    env.mol = 'mol2'
+    env._graph_topology()
+    assert topology.call_count == 2
+
+def test_real_molecule():
+    mol = Chem.AddHs(Chem.MolFromSmiles('CC(O)C(=O)OCc1ccccc1'))
+    AllChem.EmbedMolecule(mol, randomSeed=0)
+    heavy = Chem.RemoveHs(mol)
+
+    env = AtomCoordsTypeGraphObsMixin()
+    env.mol = mol
+    env.graph_topology = None
+    env.nonring = 'nonring'
+    data, nonring = env._obs()
+
+    expected_x = torch.tensor([molecule_features.atom_type_CO(atom) for atom in heavy.GetAtoms()], dtype=torch.float)
+    assert torch.equal(data.x[:, :2], expected_x)
+    assert torch.equal(data.edge_index, torch.tensor(molecule_features.get_bond_pairs(heavy)))
+    assert data.edge_attr.shape == (2 * heavy.GetNumBonds(), 6)
+    assert torch.allclose(torch.cdist(data.pos, data.pos), torch.cdist(*[torch.tensor(heavy.GetConformer().GetPositions(), dtype=torch.float)] * 2), atol=1e-4)
+
+def test_normalize_positions():
+    rng = np.random.default_rng(0)
+    for num_atoms in [3, 10, 50, 200]:
+        positions = (rng.normal(size=(num_atoms, 3)) * [3., 2., 1.] + 5.).astype(np.float32)
+        expected = NormalizeRotation()(Center()(Data(pos=torch.tensor(positions)))).pos
+        assert torch.equal(normalize_positions(positions), expected)
+
+        positions[:, 2] = 1.
+        expected = NormalizeRotation()(Center()(Data(pos=torch.tensor(positions)))).pos
+        assert torch.equal(normalize_positions(positions), expected)
@@ -5,9 +5,9 @@ from torch._C import BenchmarkExecutionStats
 
 def test_GibbsRewardMixin(mocker):
     super = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.super')
-    get_energy = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.get_conformer_energy')
-    get_energy.return_value = 11
     env = GibbsRewardMixin()
+    env.mmff_context = None
+    env._get_energy = mocker.Mock(return_value=11)
     env.episode_info = {}
     env.step_info = {}
     env.reset()
@@ -35,9 +35,9 @@ def test_GibbsRewardMixin(mocker):
 
 def test_GibbsEndPruningRewardMixin(mocker):
     super = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.super')
-    get_energy = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.get_conformer_energy')
-    get_energy.return_value = 11
     env = GibbsEndPruningRewardMixin()
+    env.mmff_context = None
+    env._get_energy = mocker.Mock(return_value=11)
     env.episode_info = {}
     env.step_info = {}
     mol = Chem.MolFromSmiles('CCCCCCCC')
@@ -74,6 +74,7 @@ def test_GibbsEndPruning_penalty(mocker):
     ]
 
     env = GibbsEndPruningRewardMixin()
+    env.mmff_context = None
     env.backup_mol = None
     env.config = mocker.Mock()
     env.config.E0 = 12.5
@@ -85,9 +86,9 @@ def test_GibbsEndPruning_penalty(mocker):
 
 def test_GibbsPruningRewardMixin(mocker):
     super = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.super')
-    get_energy = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.get_conformer_energy')
-    get_energy.return_value = 11
     env = GibbsPruningRewardMixin()
+    env.mmff_context = None
+    env._get_energy = mocker.Mock(return_value=11)
     env.episode_info = {}
     env.step_info = {}
     mol = Chem.MolFromSmiles('CCCCCCCC')
@@ -117,9 +118,9 @@ def test_GibbsPruningRewardMixin(mocker):
 
 def test_GibbsLogPruningRewardMixin(mocker):
     super = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.super')
-    get_energy = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.get_conformer_energy')
-    get_energy.return_value = 11
     env = GibbsLogPruningRewardMixin()
+    env.mmff_context = None
+    env._get_energy = mocker.Mock(return_value=11)
     env.episode_info = {}
     env.step_info = {}
     mol = Chem.MolFromSmiles('CCCCCCCC')
@@ -144,9 +145,9 @@ def test_GibbsLogPruningRewardMixin(mocker):
 
 def test_GibbsLogPruningRewardMixinUnstable(mocker):
     super = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.super')
-    get_energy = mocker.patch('conformer_rl.environments.environment_components.reward_mixins.get_conformer_energy')
-    get_energy.return_value = -2000
     env = GibbsLogPruningRewardMixin()
+    env.mmff_context = None
+    env._get_energy = mocker.Mock(return_value=-2000)
     env.episode_info = {}
     env.step_info = {}
     mol = Chem.MolFromSmiles('CCCCCCCC')
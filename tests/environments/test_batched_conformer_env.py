@@ -0,0 +1,97 @@
+from conformer_rl.environments.batched_conformer_env import BatchedConformerEnv
+from conformer_rl.environments.environments import GibbsScorePruningEnv
+from conformer_rl.environments.curriculum_conformer_env import CurriculumConformerEnv
+from conformer_rl.molecule_generation.generate_molecule_config import test_alkane_config
+from conformer_rl.utils import get_conformer_energy
+import numpy as np
+import torch
+import pytest
+
+def env_fn(seed, num_conformers=5):
+    def _thunk():
+        config = test_alkane_config()
+        config.seed = seed
+        config.num_conformers = num_conformers
+        return GibbsScorePruningEnv(config)
+    return _thunk
+
+def test_matches_separate_envs():
+    env_fns = [env_fn(seed) for seed in range(3)]
+    batched = BatchedConformerEnv(env_fns, num_threads=2)
+    separate = [fn() for fn in env_fns]
+    assert batched.num_envs == 3
+
+    rng = np.random.default_rng(0)
+    for step in range(6):
+        actions = rng.integers(6, size=(3, len(separate[0].nonring)))
+        obs, rew, done, info = batched.step(actions)
+        for i, env in enumerate(separate):
+            o, r, d, inf = env.step(actions[i])
+            if d:
+                o = env.reset()
+            assert abs(r - rew[i]) < 1e-6
+            assert d == done[i]
+            assert abs(inf['step_info']['energy'] - info[i]['step_info']['energy']) < 1e-6
+            if not d:
+                assert abs(info[i]['step_info']['energy'] - get_conformer_energy(batched.envs[i].mol)) < 1e-6
+            assert inf['step_info']['converged'] == info[i]['step_info']['converged']
+            assert torch.allclose(o[0].x, obs[i][0].x, atol=1e-4)
+
+def test_env_method():
+    batched = BatchedConformerEnv([env_fn(seed) for seed in range(2)])
+    assert batched.env_method('_done') == [False, False]
+    assert len(batched.reset()) == 2
+
+def test_invalid_envs():
+    with pytest.raises(ValueError):
+        BatchedConformerEnv([env_fn(0), lambda: CurriculumConformerEnv([test_alkane_config()])])
+
+    def restrained():
+        config = test_alkane_config()
+        config.relax_restrain_torsions = True
+        return GibbsScorePruningEnv(config)
+    with pytest.raises(ValueError):
+        BatchedConformerEnv([restrained])
+
+def test_step_async():
+    env_fns = [env_fn(seed) for seed in range(4)]
+    batched = BatchedConformerEnv(env_fns, num_threads=2)
+    separate = [fn() for fn in env_fns]
+
+    actions = np.random.default_rng(0).integers(6, size=(4, len(separate[0].nonring)))
+    batched.step_async(actions[:2], indices=[0, 1])
+    batched.step_async(actions[2:], indices=[2, 3])
+    obs, rew, done, info = batched.step_wait(indices=[2, 3])
+    obs0, rew0, _, _ = batched.step_wait(indices=[0, 1])
+    assert len(obs) == 2
+    for i, r in zip([2, 3, 0, 1], list(rew) + list(rew0)):
+        assert abs(separate[i].step(actions[i])[1] - r) < 1e-6
+
+def test_step_timings():
+    batched = BatchedConformerEnv([env_fn(0, num_conformers=1)])
+    obs, rew, done, info = batched.step(np.zeros((1, len(batched.envs[0].nonring)), dtype=int))
+    timings = info[0]['step_info']['timings']
+    assert {'torsions', 'relaxation', 'reset', 'total'} <= set(timings)
+    assert timings['total'] >= timings['relaxation']
+
+def test_action_cache(mocker):
+    def _thunk():
+        config = test_alkane_config()
+        config.seed = 0
+        config.action_cache_size = 4
+        return GibbsScorePruningEnv(config)
+    batched = BatchedConformerEnv([_thunk])
+    action = np.zeros((1, len(batched.envs[0].nonring)), dtype=int)
+    state = batched.env_method('get_state')[0]
+    obs, rew, done, info = batched.step(action)
+    assert (info[0]['step_info']['action_cache_hits'], info[0]['step_info']['action_cache_misses']) == (0, 1)
+
+    # the same action from the same starting geometry is neither relaxed nor submitted to the threads
+    batched.env_method('set_state', state)
+    relax = mocker.patch.object(BatchedConformerEnv, '_relax')
+    batched.step_async(action)
+    indices, obs_cached, rew_cached, done, info = batched.step_wait_any()
+    relax.assert_not_called()
+    assert indices == [0]
+    assert (info[0]['step_info']['action_cache_hits'], info[0]['step_info']['action_cache_misses']) == (1, 1)
+    assert abs(rew_cached[0] - rew[0]) < 1e-6
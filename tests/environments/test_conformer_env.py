@@ -1,6 +1,9 @@
 from conformer_rl.environments.conformer_env import ConformerEnv
+from conformer_rl.environments.environments import GibbsScorePruningEnv
 from conformer_rl.molecule_generation.generate_molecule_config import test_alkane_config
 from rdkit import Chem
+import numpy as np
+import pickle
 import pytest
 
 def test_conformer_env(mocker):
@@ -53,6 +56,54 @@ def test_step(mocker):
     obs, reward, done, info = env.step(180)
     assert abs(reward - 0.006738) < 1e-4
 
+def test_published_energy(mocker):
+    energy = mocker.patch('conformer_rl.environments.conformer_env.get_conformer_energy')
+    energy.return_value = 5
+
+    def publish(self, action):
+        self.relaxed_energy = 3
+
+    config = test_alkane_config()
+    env = ConformerEnv(config)
+    mocker.patch.object(ConformerEnv, '_step', publish)
+
+    obs, reward, done, info = env.step(180)
+    assert abs(reward - 0.049787) < 1e-4
+    energy.assert_not_called()
+
+def test_info_mode(mocker):
+    config = test_alkane_config()
+    config.num_conformers = 3
+    env = ConformerEnv(config)
+
+    for i in range(3):
+        obs, reward, done, info = env.step(180)
+    assert info['episode_info']['mol'].GetNumConformers() == 3
+    assert info['episode_info']['mol'] is not env.episode_info['mol']
+
+    env.reset()
+    assert env.set_info_mode('lite') == 'full'
+    for i in range(3):
+        obs, reward, done, info = env.step(180)
+    assert 'mol' not in info['episode_info']
+    assert info['episode_info']['total_rewards'] == env.total_reward
+    assert info['step_info']['reward'] == reward
+    assert info['step_info'] is not env.step_info
+
+    with pytest.raises(ValueError):
+        env.set_info_mode('none')
+
+    # subclasses may return info entries which are not dicts
+    class CustomInfoEnv(ConformerEnv):
+        def _info(self):
+            info = super()._info()
+            info['custom'] = 5
+            return info
+    env = CustomInfoEnv(config)
+    env.set_info_mode('lite')
+    obs, reward, done, info = env.step(180)
+    assert info['custom'] == 5
+    assert info['step_info']['reward'] == reward
 
 def test_exception(mocker):
     embed = mocker.patch('conformer_rl.environments.conformer_env.Chem.EmbedMolecule')
@@ -69,3 +120,28 @@ def test_exception(mocker):
 
 
     
+
+def test_step_timings():
+    env = ConformerEnv(test_alkane_config())
+    obs, reward, done, info = env.step(180)
+    timings = info['step_info']['timings']
+    assert set(timings) == {'action', 'obs', 'reward', 'total'}
+    assert timings['total'] >= timings['action'] + timings['obs'] + timings['reward']
+    obs, reward, done, info2 = env.step(180)
+    assert info2['step_info']['timings'] is not timings
+
+def test_state():
+    config = test_alkane_config()
+    env = GibbsScorePruningEnv(config)
+    num_torsions = len(env.nonring)
+    env.step(np.zeros(num_torsions, dtype=int))
+    state = pickle.loads(pickle.dumps(env.get_state()))
+    assert 'mol' not in state and state['current_step'] == 1
+
+    expected = [env.step(np.full(num_torsions, i)) for i in range(1, 4)]
+    restored = GibbsScorePruningEnv(config)
+    restored.set_state(state)
+    for (obs, reward, done, info), (restored_obs, restored_reward, restored_done, restored_info) in zip(expected, [restored.step(np.full(num_torsions, i)) for i in range(1, 4)]):
+        assert reward == restored_reward and done == restored_done
+        assert np.allclose(obs[0].x, restored_obs[0].x)
+        assert info['step_info']['energy'] == restored_info['step_info']['energy']
@@ -0,0 +1,73 @@
+from conformer_rl.environments.curriculum_conformer_env import CurriculumConformerEnv
+from conformer_rl.environments.environments import GibbsScorePruningCurriculumEnv
+from conformer_rl.molecule_generation import generate_molecule_config
+from conformer_rl.molecule_generation.generate_molecule_config import config_from_smiles
+import numpy as np
+
+def mol_configs():
+    configs = [generate_molecule_config.test_alkane_config(), config_from_smiles('CCCCCC', num_conformers=3)]
+    for config in configs:
+        config.seed = 0
+    return configs
+
+def test_reset():
+    env = CurriculumConformerEnv(mol_configs())
+    assert env.mol is not env.configs[0].mol
+    assert env.mol.GetNumConformers() == 1
+    assert env.configs[0].mol.GetNumAtoms() == env.mol.GetNumAtoms()
+    assert env.reset_wait_time > 0.
+    assert len(env.nonring) == len(env.torsion_driver.moving_atoms)
+
+def test_prefetch_reset(mocker):
+    env = CurriculumConformerEnv(mol_configs())
+    positions = env.mol.GetConformer().GetPositions()
+    env.prefetch_reset()
+    prepare = mocker.spy(env, '_prepare_episode')
+    mol = env._prefetched_episode[1].result()[1]
+
+    env.reset()
+    prepare.assert_not_called()
+    assert env.mol is mol
+    assert env._prefetched_episode is None
+    # the starting state is the same as when preparing it during the reset
+    assert np.allclose(env.mol.GetConformer().GetPositions(), positions)
+
+def test_prefetch_discarded_after_level_change(mocker):
+    env = CurriculumConformerEnv(mol_configs())
+    env.prefetch_reset()
+    mol = env._prefetched_episode[1].result()[1]
+    env.increase_level()
+    prepare = mocker.spy(env, '_prepare_episode')
+
+    env.reset()
+    prepare.assert_called_once()
+    assert env.mol is not mol
+
+def test_prefetch_graph_topology():
+    env = GibbsScorePruningCurriculumEnv(mol_configs())
+    env.prefetch_reset()
+    env.reset()
+    topology = env.graph_topology
+    assert topology.mol is env.mol
+    env._obs()
+    assert env.graph_topology is topology
+
+def test_state():
+    env = GibbsScorePruningCurriculumEnv(mol_configs())
+    env.increase_level()
+    np.random.seed(1)
+    while env.episode_index == 0:
+        env.reset()
+    env.step(np.zeros(len(env.nonring), dtype=int))
+    env.prefetch_reset()
+    state = env.get_state()
+
+    expected = [env.step(np.full(len(env.nonring), 1)) for _ in range(2)] + [env.reset()]
+    restored = GibbsScorePruningCurriculumEnv(mol_configs())
+    restored.set_state(state)
+    assert restored.curriculum_max_index == 2 and restored.episode_index == state['episode_index'] == 1
+    results = [restored.step(np.full(len(restored.nonring), 1)) for _ in range(2)] + [restored.reset()]
+    for (obs, reward, done, _), (restored_obs, restored_reward, restored_done, _) in zip(expected[:2], results[:2]):
+        assert reward == restored_reward and done == restored_done
+        assert np.allclose(obs[0].x, restored_obs[0].x)
+    assert np.allclose(expected[2][0].x, results[2][0].x)
@@ -1,4 +1,6 @@
-from conformer_rl.environments.environment_wrapper import Task
+from conformer_rl.environments.environment_wrapper import Task, PrefetchResetWrapper
+from conformer_rl.molecule_generation.generate_molecule_config import test_alkane_config
+import pytest
 
 def test_task_simple(mocker):
     simple_env = mocker.patch('conformer_rl.environments.environment_wrapper.SimpleVecEnv')
@@ -18,3 +20,41 @@ def test_task_parallel(mocker):
 
     subproc_env.assert_called()
 
+
+def test_task_batched(mocker):
+    batched_env = mocker.patch('conformer_rl.environments.environment_wrapper.BatchedConformerEnv')
+    env = Task('CartPole-v0', num_envs = 5, backend='batched', num_threads=4)
+
+    batched_env.assert_called()
+    assert batched_env.call_args.kwargs['num_threads'] == 4
+
+def test_task_invalid_backend():
+    with pytest.raises(ValueError):
+        Task('CartPole-v0', num_envs = 5, backend='unknown')
+
+def test_task_shared_memory(mocker):
+    shared_memory_env = mocker.patch('conformer_rl.environments.environment_wrapper.SharedMemoryVecEnv')
+    env = Task('CartPole-v0', num_envs = 5, backend='shared_memory')
+
+    shared_memory_env.assert_called()
+
+def test_task_threads(mocker):
+    thread_env = mocker.patch('conformer_rl.environments.environment_wrapper.ThreadVecEnv')
+    env = Task('CartPole-v0', num_envs = 5, backend='threads', num_threads=3)
+
+    thread_env.assert_called()
+    assert thread_env.call_args.kwargs['num_threads'] == 3
+
+def test_task_parallel_prefetch_reset(mocker):
+    subproc_env = mocker.patch('conformer_rl.environments.environment_wrapper.SubprocVecEnv')
+    Task('GibbsScorePruningCurriculumEnv-v0', concurrency=True, num_envs=1, mol_configs=[test_alkane_config()], disable_env_checker=True)
+
+    # SubprocVecEnv resets the environments in its workers, so the environments prefetch the next episode themselves
+    env = subproc_env.call_args.args[0][0]()
+    assert isinstance(env, PrefetchResetWrapper)
+    env.reset()
+    assert env.unwrapped._prefetched_episode is not None
+
+    simple_env = mocker.patch('conformer_rl.environments.environment_wrapper.SimpleVecEnv')
+    Task('GibbsScorePruningCurriculumEnv-v0', num_envs=1, mol_configs=[test_alkane_config()], disable_env_checker=True)
+    assert not isinstance(simple_env.call_args.args[0][0](), PrefetchResetWrapper)
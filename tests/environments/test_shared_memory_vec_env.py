@@ -0,0 +1,126 @@
+from conformer_rl.environments.shared_memory_vec_env import SharedMemoryVecEnv, _ObservationEncoder, _ObservationDecoder
+from conformer_rl.environments.environments import GibbsScorePruningEnv
+from conformer_rl.molecule_generation.generate_molecule_config import test_alkane_config
+from torch_geometric.data import Data
+import multiprocessing as mp
+import numpy as np
+import torch
+
+def env_fn(seed):
+    def _thunk():
+        config = test_alkane_config()
+        config.seed = seed
+        config.num_conformers = 5
+        return GibbsScorePruningEnv(config)
+    return _thunk
+
+class DummyEnv:
+    def __init__(self):
+        self.count = 0
+
+    def step(self, action):
+        self.count += 1
+        return np.full(3, self.count), float(action), self.count % 2 == 0, {'count': self.count}
+
+    def reset(self):
+        return np.zeros(3)
+
+    def close(self):
+        pass
+
+def test_matches_separate_envs():
+    env_fns = [env_fn(seed) for seed in range(2)]
+    vec_env = SharedMemoryVecEnv(env_fns)
+    separate = [fn() for fn in env_fns]
+    assert vec_env.num_envs == 2
+
+    for obs, o in zip(vec_env.reset(), [env.reset() for env in separate]):
+        assert torch.equal(obs[0].x, o[0].x)
+        assert torch.equal(obs[0].edge_index, o[0].edge_index)
+
+    rng = np.random.default_rng(0)
+    for step in range(7):
+        actions = rng.integers(6, size=(2, len(separate[0].nonring)))
+        obs, rew, done, info = vec_env.step(actions)
+        for i, env in enumerate(separate):
+            o, r, d, inf = env.step(actions[i])
+            if d:
+                o = env.reset()
+            assert r == rew[i]
+            assert d == done[i]
+            assert torch.equal(o[0].x, obs[i][0].x)
+            assert torch.equal(o[0].pos, obs[i][0].pos)
+            assert torch.equal(o[0].edge_attr, obs[i][0].edge_attr)
+            assert o[1] == obs[i][1]
+
+    assert vec_env.env_method('_done') == [False, False]
+    vec_env.close()
+
+def test_step_timings():
+    vec_env = SharedMemoryVecEnv([env_fn(0)])
+    vec_env.reset()
+    obs, rew, done, info = vec_env.step(np.zeros((1, len(env_fn(0)().nonring)), dtype=int))
+    timings = info[0]['step_info']['timings']
+    assert {'ipc', 'obs', 'total'} <= set(timings)
+    assert timings['ipc'] > 0.
+    vec_env.close()
+
+def test_pickle_fallback():
+    vec_env = SharedMemoryVecEnv([DummyEnv, DummyEnv])
+    assert np.array_equal(vec_env.reset()[1], np.zeros(3))
+    obs, rew, done, info = vec_env.step([1., 2.])
+    assert np.array_equal(obs[0], np.ones(3))
+    assert list(rew) == [1., 2.]
+    obs, rew, done, info = vec_env.step([1., 2.])
+    assert list(done) == [True, True]
+    assert np.array_equal(obs[0], np.zeros(3))
+    assert info[1] == {'count': 2}
+    vec_env.close()
+
+def test_step_async():
+    vec_env = SharedMemoryVecEnv([DummyEnv, DummyEnv, DummyEnv])
+    vec_env.reset()
+    vec_env.step_async([1., 2.], indices=[1, 2])
+    vec_env.step_async([3.], indices=[0])
+    obs, rew, done, info = vec_env.step_wait(indices=[1, 2])
+    assert list(rew) == [1., 2.]
+    obs, rew, done, info = vec_env.step_wait(indices=[0])
+    assert list(rew) == [3.]
+    vec_env.close()
+
+def test_step_wait_any():
+    vec_env = SharedMemoryVecEnv([DummyEnv, DummyEnv])
+    vec_env.reset()
+    vec_env.step_async([1., 2.])
+    finished = []
+    while len(finished) < 2:
+        indices, obs, rew, done, info = vec_env.step_wait_any()
+        finished += indices
+        assert list(rew) == [float(i + 1) for i in indices]
+    assert sorted(finished) == [0, 1]
+    vec_env.close()
+
+def test_topology_sent_once():
+    buffer = mp.RawArray('f', 20)
+    encoder, decoder = _ObservationEncoder(buffer), _ObservationDecoder(buffer)
+    edge_index = torch.tensor([[0, 1], [1, 0]])
+    nonring = [[0, 1, 2, 3]]
+
+    message = encoder.encode((Data(x=torch.rand(2, 3), edge_index=edge_index), nonring))
+    assert message[2] is not None
+    decoder.decode(message)
+
+    x = torch.rand(2, 3)
+    message = encoder.encode((Data(x=x, edge_index=edge_index), nonring))
+    assert message[2] is None
+    data, torsions = decoder.decode(message)
+    assert torch.equal(data.x, x)
+    assert torch.equal(data.edge_index, edge_index)
+    assert torsions == nonring
+
+    message = encoder.encode((Data(x=x, edge_index=edge_index.clone()), nonring))
+    assert message[2] is not None
+
+    # observations too large for the buffer are pickled
+    message = encoder.encode((Data(x=torch.rand(10, 3), edge_index=edge_index), nonring))
+    assert message[0] == 'pickle'
@@ -65,3 +65,37 @@ def test_env():
     
 
 
+def test_step_async():
+    env = SimpleVecEnv([DummyEnv] * 4)
+    env.step_async([1, 1], indices=[2, 3])
+    env.step_async([1, 1], indices=[0, 1])
+    obs, rew, done, info = env.step_wait(indices=[2, 3])
+    assert len(obs) == 2
+    assert env.render() == [0, 0, 1, 1]
+    env.step_wait(indices=[0, 1])
+    assert env.render() == [1, 1, 1, 1]
+
+class PrefetchEnv(DummyEnv):
+    def __init__(self):
+        super().__init__()
+        self.prefetched = 0
+
+    def prefetch_reset(self):
+        self.prefetched += 1
+
+def test_reset_prefetch():
+    env = SimpleVecEnv([PrefetchEnv] * 2)
+    env.reset()
+    assert env.env_method('__getattribute__', 'prefetched') == [1, 1]
+    for i in range(5):
+        env.step([1, 1])
+    assert env.env_method('__getattribute__', 'prefetched') == [2, 2]
+    assert env.reset_wait_times.shape == (2,)
+    assert all(env.reset_wait_times > 0.)
+
+def test_step_wait_any():
+    env = SimpleVecEnv([DummyEnv] * 3)
+    env.step_async([1, 1], indices=[2, 1])
+    indices, obs, rew, done, info = env.step_wait_any()
+    assert indices == [1]
+    assert env.render() == [0, 1, 0]
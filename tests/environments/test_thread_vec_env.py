@@ -0,0 +1,110 @@
+from conformer_rl.environments.thread_vec_env import ThreadVecEnv
+from conformer_rl.environments.batched_conformer_env import BatchedConformerEnv
+from conformer_rl.environments.environments import GibbsScorePruningEnv
+from conformer_rl.environments.curriculum_conformer_env import CurriculumConformerEnv
+from conformer_rl.molecule_generation import generate_molecule_config
+import numpy as np
+import torch
+import time
+
+def env_fn(seed, restrain=False):
+    def _thunk():
+        config = generate_molecule_config.test_alkane_config()
+        config.seed = seed
+        config.num_conformers = 5
+        config.relax_restrain_torsions = restrain
+        return GibbsScorePruningEnv(config)
+    return _thunk
+
+def test_matches_separate_envs():
+    env_fns = [env_fn(0), env_fn(1), env_fn(2, restrain=True)]
+    vec_env = ThreadVecEnv(env_fns, num_threads=2)
+    separate = [fn() for fn in env_fns]
+    assert vec_env.num_envs == 3
+    assert vec_env.gil_free_relaxation == [True, True, False]
+
+    rng = np.random.default_rng(0)
+    for step in range(6):
+        actions = rng.integers(6, size=(3, len(separate[0].nonring)))
+        obs, rew, done, info = vec_env.step(actions)
+        for i, env in enumerate(separate):
+            o, r, d, inf = env.step(actions[i])
+            if d:
+                o = env.reset()
+            assert abs(r - rew[i]) < 1e-6
+            assert d == done[i]
+            assert abs(inf['step_info']['energy'] - info[i]['step_info']['energy']) < 1e-6
+            assert torch.allclose(o[0].x, obs[i][0].x, atol=1e-4)
+    vec_env.close()
+
+def test_step_async():
+    vec_env = ThreadVecEnv([env_fn(seed) for seed in range(3)], num_threads=2)
+    num_torsions = len(vec_env.envs[0].nonring)
+    vec_env.step_async(np.zeros((2, num_torsions), dtype=int), indices=[2, 0])
+    obs, rew, done, info = vec_env.step_wait(indices=[2, 0])
+    assert len(obs) == 2
+    assert vec_env.env_method('_done') == [False, False, False]
+    assert [len(env.episode_info['mol'].GetConformers()) for env in vec_env.envs] == [1, 0, 1]
+
+def test_torsions_set_once(mocker):
+    vec_env = ThreadVecEnv([env_fn(0), env_fn(1, restrain=True)], num_threads=2)
+    spies = [mocker.spy(env, '_set_torsions') for env in vec_env.envs]
+    vec_env.step(np.zeros((2, len(vec_env.envs[0].nonring)), dtype=int))
+    # by the worker thread before relaxing and by the environment, respectively
+    assert [spy.call_count for spy in spies] == [1, 1]
+    vec_env.close()
+
+def test_action_cache(mocker):
+    def _thunk():
+        config = generate_molecule_config.test_alkane_config()
+        config.seed = 0
+        config.action_cache_size = 4
+        return GibbsScorePruningEnv(config)
+    vec_env = ThreadVecEnv([_thunk])
+    action = np.zeros((1, len(vec_env.envs[0].nonring)), dtype=int)
+    state = vec_env.env_method('get_state')[0]
+    obs, rew, done, info = vec_env.step(action)
+    assert (info[0]['step_info']['action_cache_hits'], info[0]['step_info']['action_cache_misses']) == (0, 1)
+
+    vec_env.env_method('set_state', state)
+    relax = mocker.patch.object(BatchedConformerEnv, '_relax')
+    obs, rew_cached, done, info = vec_env.step(action)
+    relax.assert_not_called()
+    assert (info[0]['step_info']['action_cache_hits'], info[0]['step_info']['action_cache_misses']) == (1, 1)
+    assert abs(rew_cached[0] - rew[0]) < 1e-6
+    vec_env.close()
+
+def test_curriculum_env():
+    vec_env = ThreadVecEnv([lambda: CurriculumConformerEnv([generate_molecule_config.test_alkane_config()])])
+    assert vec_env.gil_free_relaxation == [False]
+    vec_env.reset()
+    obs, rew, done, info = vec_env.step(np.zeros((1, len(vec_env.envs[0].nonring)), dtype=int))
+    assert len(obs) == 1
+
+class SleepEnv:
+    def __init__(self, duration):
+        self.duration = duration
+
+    def step(self, action):
+        time.sleep(self.duration)
+        return self.duration, 0., False, {}
+
+    def reset(self):
+        return self.duration
+
+def test_step_wait_any():
+    vec_env = ThreadVecEnv([lambda: SleepEnv(0.5), lambda: SleepEnv(0.)], num_threads=2)
+    assert vec_env.gil_free_relaxation == [False, False]
+    vec_env.step_async([0, 0])
+    indices, obs, rew, done, info = vec_env.step_wait_any()
+    assert indices == [1]
+    assert obs == (0.,)
+    indices, obs, rew, done, info = vec_env.step_wait_any()
+    assert indices == [0]
+
+def test_step_timings():
+    vec_env = ThreadVecEnv([env_fn(0)], num_threads=1)
+    obs, rew, done, info = vec_env.step(np.zeros((1, len(vec_env.envs[0].nonring)), dtype=int))
+    timings = info[0]['step_info']['timings']
+    assert {'queue', 'torsions', 'relaxation', 'obs', 'reward', 'total'} <= set(timings)
+    assert timings['total'] >= timings['relaxation']
@@ -25,3 +25,10 @@ def test_basic(mocker):
 
 
 
+
+def test_add_percentiles(mocker):
+    mocker.patch('conformer_rl.logging.train_logger.mkdir')
+    logger = TrainLogger(tag="tag", use_tensorboard=False, use_print=False)
+    logger.add_percentiles('time', list(range(101)), 7, percentiles=(50, 99.5))
+    assert logger.cache['time/p50'] == [[50.], [7]]
+    assert logger.cache['time/p99.5'] == [[99.5], [7]]
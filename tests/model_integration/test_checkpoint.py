@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import torch
+
+from conformer_rl import utils
+from conformer_rl.agents import PPOAgent, PPORecurrentAgent
+from conformer_rl.config import Config
+from conformer_rl.environments import Task
+from conformer_rl.models import RTGNGat, RTGNGatRecurrent
+
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+from conformer_rl.molecule_generation.generate_molecule_config import config_from_rdkit
+
+def make_agent(agent_class, network_class, mol_config, data_dir, options):
+    config = Config()
+    config.tag = 'checkpoint'
+    config.data_dir = data_dir
+    config.use_tensorboard = False
+    config.network = network_class(6, 32, node_dim=5)
+    config.num_workers = 2
+    config.rollout_length = 3
+    config.recurrence = 3
+    config.optimization_epochs = 2
+    config.mini_batch_size = 3
+    for key, value in options.items():
+        setattr(config, key, value)
+    config.optimizer_fn = lambda params: torch.optim.Adam(params, lr=1e-3, eps=1e-5)
+    config.train_env = Task('GibbsScorePruningEnv-v0', num_envs=config.num_workers, seed=0, mol_config=mol_config, disable_env_checker=True)
+    return agent_class(config)
+
+@pytest.mark.parametrize('agent_class, network_class, options', [
+    (PPORecurrentAgent, RTGNGatRecurrent, {}),
+    (PPOAgent, RTGNGat, {'overlapped_sampling': True}),
+    # the environment steps still running after sampling are collected before saving the checkpoint
+    (PPOAgent, RTGNGat, {'straggler_tolerant_sampling': True}),
+])
+def test_resume(tmp_path, agent_class, network_class, options):
+    utils.set_one_thread()
+    # episodes of 4 steps end within the rollouts, so that the states of finished episodes are reset
+    mol_config = config_from_rdkit(generate_branched_alkane(8), num_conformers=4, calc_normalizers=False)
+    filename = str(tmp_path / 'agent.checkpoint')
+
+    agent = make_agent(agent_class, network_class, mol_config, str(tmp_path), options)
+    agent.step()
+    agent.save_checkpoint(filename)
+    agent.wait_for_checkpoint()
+    for _ in range(2):
+        agent.step()
+
+    resumed = make_agent(agent_class, network_class, mol_config, str(tmp_path), options)
+    resumed.load_checkpoint(filename)
+    for _ in range(2):
+        resumed.step()
+
+    assert resumed.total_steps == agent.total_steps
+    assert np.array_equal(resumed.total_rewards, agent.total_rewards)
+    for key, value in agent.network.state_dict().items():
+        assert torch.equal(resumed.network.state_dict()[key], value)
+    for state, resumed_state in zip(agent.states, resumed.states):
+        assert torch.equal(state[0].x, resumed_state[0].x)
+    if agent_class is PPORecurrentAgent:
+        for recurrent_state, resumed_recurrent_state in zip(agent.recurrent_states, resumed.recurrent_states):
+            assert torch.equal(recurrent_state, resumed_recurrent_state)
@@ -0,0 +1,37 @@
+import torch
+
+from conformer_rl.models import InferenceMixin, RTGN, RTGNGat, RTGNRecurrent
+from tests.models.test_packed_observations import observations
+
+def test_inference():
+    obs = observations()[:4]
+    for network in [RTGN(6, 32, edge_dim=6, node_dim=5), RTGNGat(6, 32, node_dim=5)]:
+        assert isinstance(network, InferenceMixin)
+        prediction = network.inference(obs)
+        assert not prediction['a'].is_inference()
+        assert not prediction['v'].requires_grad
+        expected = network(obs, prediction['a'])
+        assert torch.allclose(prediction['v'], expected['v'], atol=1e-5)
+        assert torch.allclose(prediction['log_pi_a'], expected['log_pi_a'], atol=1e-5)
+
+    network = RTGNRecurrent(6, 32, edge_dim=6, node_dim=5)
+    prediction, states = network.inference(obs)
+    # the recurrent agents reset the states of finished episodes in place
+    states[0][:, 0] = 0
+    expected, expected_states = network(obs, None, prediction['a'])
+    assert torch.allclose(prediction['log_pi_a'], expected['log_pi_a'], atol=1e-5)
+    assert torch.allclose(states[1], expected_states[1], atol=1e-5)
+
+def test_compile_inference():
+    obs = observations()[:4]
+    network = RTGNGat(6, 32, node_dim=5)
+    parameters = list(network.parameters())
+    assert network.compile_inference(backend='eager')
+    assert list(network.parameters()) == parameters
+    assert set(network.state_dict()) == set(RTGNGat(6, 32, node_dim=5).state_dict())
+    assert network._submodule('actor') is network.actor
+
+    prediction = network.inference(obs)
+    expected = network(obs, prediction['a'])
+    assert torch.allclose(prediction['v'], expected['v'], atol=1e-5)
+    assert torch.allclose(prediction['log_pi_a'], expected['log_pi_a'], atol=1e-5)
@@ -0,0 +1,73 @@
+import numpy as np
+import torch
+from torch_geometric.data import Batch
+
+from conformer_rl.environments.environments import GibbsScorePruningEnv
+from conformer_rl.models import PackedObservations, RTGN, RTGNGat, RTGNGatRecurrent, graph_inputs
+from conformer_rl.molecule_generation.generate_alkanes import generate_branched_alkane
+from conformer_rl.molecule_generation.generate_molecule_config import config_from_rdkit
+
+def observations():
+    obs = []
+    for num_atoms in [5, 8, 11]:
+        env = GibbsScorePruningEnv(config_from_rdkit(generate_branched_alkane(num_atoms), num_conformers=4))
+        o = env.reset()
+        obs += [o, (Batch.from_data_list([o[0]]), o[1])]
+        o, _, _, _ = env.step(np.zeros(len(env.nonring), dtype=int))
+        obs.append(o)
+    return obs
+
+def test_gather():
+    obs = observations()
+    packed = PackedObservations(obs)
+    assert len(packed) == len(obs)
+    assert list(packed) == obs
+
+    indices = np.array([8, 0, 3, 3, 5])
+    sub = packed[indices]
+    expected = Batch.from_data_list([obs[i][0] if not isinstance(obs[i][0], Batch) else obs[i][0].to_data_list()[0] for i in indices])
+    data, torsions, torsion_batch_idx, torsion_list_sizes = sub.inputs(torch.device('cpu'))
+    assert data.num_graphs == 5
+    for key in ['x', 'edge_index', 'edge_attr', 'pos', 'batch', 'ptr']:
+        assert torch.equal(data[key], expected[key])
+    assert torch.equal(torsions, torch.cat([torch.LongTensor(obs[i][1]) + expected.ptr[j] for j, i in enumerate(indices)]))
+    assert torsion_list_sizes == [len(obs[i][1]) for i in indices]
+    assert torch.equal(torsion_batch_idx, torch.repeat_interleave(torch.arange(5), torch.tensor(torsion_list_sizes)))
+    assert list(sub) == [obs[i] for i in indices]
+
+    # gathering from gathered observations
+    subsub = sub[[4, 1]]
+    assert torch.equal(subsub.data.edge_index, packed[[5, 0]].data.edge_index)
+    assert torch.equal(subsub.torsions, packed[[5, 0]].torsions)
+
+def test_networks():
+    obs = observations()
+    packed = PackedObservations(obs)
+    indices = np.array([2, 7, 4])
+    sampled = [obs[i] for i in indices]
+
+    for network in [RTGN(6, 32, edge_dim=6, node_dim=5), RTGNGat(6, 32, node_dim=5)]:
+        prediction = network(sampled)
+        packed_prediction = network(packed[indices], prediction['a'])
+        assert torch.allclose(prediction['v'], packed_prediction['v'], atol=1e-5)
+        assert torch.allclose(prediction['log_pi_a'], packed_prediction['log_pi_a'], atol=1e-5)
+
+    network = RTGNGatRecurrent(6, 32, node_dim=5)
+    prediction, states = network(sampled)
+    packed_prediction, packed_states = network(packed[indices], None, prediction['a'])
+    assert torch.allclose(prediction['log_pi_a'], packed_prediction['log_pi_a'], atol=1e-5)
+    assert all(torch.allclose(s, p, atol=1e-5) for s, p in zip(states, packed_states))
+
+def test_graph_inputs():
+    obs = observations()
+    data, torsions, torsion_batch_idx, torsion_list_sizes = graph_inputs(obs, torch.device('cpu'))
+
+    so_far = 0
+    for i, (b, nr) in enumerate(obs):
+        nr = torch.LongTensor(nr)
+        start = sum(torsion_list_sizes[:i])
+        assert torch.equal(torsions[start:start + len(nr)], nr + so_far)
+        assert torch.equal(torsion_batch_idx[start:start + len(nr)], torch.full((len(nr),), i))
+        assert torsion_list_sizes[i] == len(nr)
+        so_far += int((data.batch == i).sum())
+    assert data.num_graphs == len(obs)
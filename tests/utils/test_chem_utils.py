@@ -1,5 +1,8 @@
 from conformer_rl.utils import chem_utils
 import numpy as np
+import rdkit.Chem.AllChem as Chem
+from rdkit.Chem import rdMolTransforms
+import pytest
 
 def test_tfd_matrix(mocker):
     tf = mocker.patch('conformer_rl.utils.chem_utils.TorsionFingerprints')
@@ -11,4 +14,78 @@ def test_tfd_matrix(mocker):
         [5, 7, 0, 13, 19],
         [9, 11, 13, 0, 21],
         [15, 17, 19, 21, 0]]
-    ))
\ No newline at end of file
+    ))
+def test_mmff_context():
+    mol = Chem.AddHs(Chem.MolFromSmiles('CC(CCC)CCCC(CCCC)CC'))
+    Chem.EmbedMultipleConfs(mol, numConfs=3, randomSeed=0)
+    context = chem_utils.MMFFContext(mol)
+
+    Chem.MMFFOptimizeMolecule(mol, confId=2)
+    assert abs(chem_utils.get_conformer_energy(mol, mmff_context=context) - chem_utils.get_conformer_energy(mol)) < 1e-6
+    assert np.allclose(chem_utils.get_conformer_energies(mol, context), chem_utils.get_conformer_energies(mol))
+
+def test_optimize_conformer():
+    mol = Chem.AddHs(Chem.MolFromSmiles('CC(CCC)CCCC(CCCC)CC'))
+    Chem.EmbedMolecule(mol, randomSeed=0)
+    reference = Chem.Mol(mol)
+    Chem.MMFFOptimizeMolecule(reference, maxIters=500, nonBondedThresh=10.)
+
+    converged, energy = chem_utils.optimize_conformer(mol)
+    assert converged
+    assert np.allclose(mol.GetConformer().GetPositions(), reference.GetConformer().GetPositions())
+    # the energy is evaluated with the full force field rather than the relaxation force field
+    assert abs(energy - chem_utils.get_conformer_energy(mol)) < 1e-6
+    converged, energy = chem_utils.optimize_conformer(Chem.Mol(reference), mmff_context=chem_utils.MMFFContext(reference))
+    assert abs(energy - chem_utils.get_conformer_energy(mol)) < 1e-6
+
+    mol = Chem.AddHs(Chem.MolFromSmiles('CCCCCCCCCCCCCCCCCCCCCCCCCCCCCC'))
+    Chem.EmbedMolecule(mol, randomSeed=0)
+    reference = Chem.Mol(mol)
+    converged, energy = chem_utils.optimize_conformer(mol, non_bonded_thresh=3., cutoff_energy=True)
+    assert abs(energy - Chem.MMFFOptimizeMoleculeConfs(reference, maxIters=500, nonBondedThresh=3.)[0][1]) < 1e-6
+    assert abs(energy - chem_utils.get_conformer_energy(mol)) > 1e-3
+
+    converged, energy = chem_utils.optimize_conformer(Chem.Mol(reference), max_iters=1)
+    assert not converged
+
+    tors = [0, 1, 2, 3]
+    angle = rdMolTransforms.GetDihedralDeg(mol.GetConformer(), *tors)
+    rdMolTransforms.SetDihedralDeg(mol.GetConformer(), *tors, angle + 60.)
+    converged, energy = chem_utils.optimize_conformer(mol, restrained_torsions=[tors], torsion_force_constant=1e4)
+    diff = rdMolTransforms.GetDihedralDeg(mol.GetConformer(), *tors) - (angle + 60.)
+    assert abs((diff + 180.) % 360. - 180.) < 1.
+
+def test_torsion_driver():
+    mol = Chem.AddHs(Chem.MolFromSmiles('CC(CCC)CCCC(CCCC)CC(c1ccccc1)O'))
+    Chem.EmbedMolecule(mol, randomSeed=0)
+    nonring = [list(atoms[0]) for atoms, ang in chem_utils.TorsionFingerprints.CalculateTorsionLists(mol)[0]]
+    driver = chem_utils.TorsionDriver(mol, nonring)
+
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        angles = rng.uniform(-180., 180., len(nonring))
+        expected = Chem.Conformer(mol.GetConformer())
+        conf = Chem.Conformer(mol.GetConformer())
+        for tors, angle in zip(nonring, angles):
+            rdMolTransforms.SetDihedralDeg(expected, *tors, float(angle))
+        driver.set_torsions(conf, angles)
+        assert np.allclose(conf.GetPositions(), expected.GetPositions(), atol=1e-8)
+
+    ring_bond = mol.GetSubstructMatch(Chem.MolFromSmarts('c1ccccc1'))
+    ring_torsion = [ring_bond[0], ring_bond[1], ring_bond[2], ring_bond[3]]
+    with pytest.raises(ValueError):
+        chem_utils.TorsionDriver(mol, [ring_torsion])
+
+def test_principal_frame():
+    mol = Chem.AddHs(Chem.MolFromSmiles('CC(CCC)CCCC(CCCC)CC'))
+    Chem.EmbedMolecule(mol, randomSeed=0)
+    positions = mol.GetConformer().GetPositions()
+    centroid, rotation = chem_utils.principal_frame(positions)
+    assert np.allclose(rotation @ rotation.T, np.eye(3))
+    assert abs(np.linalg.det(rotation) - 1.) < 1e-8
+
+    q, _ = np.linalg.qr(np.random.default_rng(0).normal(size=(3, 3)))
+    q *= np.linalg.det(q)
+    moved = positions @ q.T + [1., -2., 5.]
+    moved_centroid, moved_rotation = chem_utils.principal_frame(moved)
+    assert np.allclose((positions - centroid) @ rotation.T, (moved - moved_centroid) @ moved_rotation.T)
@@ -35,3 +35,49 @@ def test_utils(mocker):
     t.load.assert_called_with("filename")
     
 
+
+def test_lru_cache():
+    cache = misc_utils.LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (2, 1)
+
+def test_discounted_reverse_cumsum():
+    values = torch.tensor([[1., 2.], [3., 4.], [5., 6.]])
+    discounts = torch.tensor([[0.5, 1.], [0., 1.], [0.5, 0.5]])
+    out = misc_utils.discounted_reverse_cumsum(values, discounts, torch.tensor([2., 4.]))
+    assert torch.equal(out, torch.tensor([[2.5, 14.], [3., 12.], [6., 8.]]))
+
+    generator = torch.Generator().manual_seed(0)
+    for length in range(1, 20):
+        values = torch.randn((length, 3), generator=generator, dtype=torch.float64)
+        discounts = torch.rand((length, 3), generator=generator, dtype=torch.float64)
+        expected, following = [], torch.ones(3, dtype=torch.float64)
+        for t in reversed(range(length)):
+            following = values[t] + discounts[t] * following
+            expected.insert(0, following)
+        assert torch.allclose(misc_utils.discounted_reverse_cumsum(values, discounts, torch.ones(3)), torch.stack(expected))
+
+def test_save_state(tmp_path):
+    filename = str(tmp_path / 'checkpoints' / 'state')
+    misc_utils.save_state({'a': torch.ones(2)}, filename)
+    misc_utils.save_state({'a': torch.zeros(2), 'b': 1}, filename)
+    state = misc_utils.load_state(filename)
+    assert torch.equal(state['a'], torch.zeros(2)) and state['b'] == 1
+    assert os.listdir(tmp_path / 'checkpoints') == ['state']
+
+def test_save_state_interrupted(tmp_path, mocker):
+    filename = str(tmp_path / 'state')
+    misc_utils.save_state(1, filename)
+    mocker.patch('conformer_rl.utils.misc_utils.pickle.dump', side_effect=KeyboardInterrupt)
+    try:
+        misc_utils.save_state(2, filename)
+    except KeyboardInterrupt:
+        pass
+    assert misc_utils.load_state(filename) == 1
+    assert os.listdir(tmp_path) == ['state']